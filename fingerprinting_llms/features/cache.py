@@ -0,0 +1,216 @@
+"""
+Incremental on-disk feature cache.
+
+`build_feature_df` in the Burstiness notebooks recomputes every feature of
+every document on each run. `FeatureCache` keeps computed values keyed by
+  - the document: a hash of its series (so renamed or duplicate files share
+    entries, and a rescored document gets new ones), and
+  - the feature function: its name, a version to bump when its code changes,
+    and its parameters,
+and `FeatureCache.build` computes only the (document, feature function) cells
+that are missing, as one corpus-wide call per function on just the missing
+documents, before assembling the DataFrame.
+
+Layout:
+    <cachedir>/<name>-v<version>-<params hash>/<chunk>.npz
+
+Each chunk holds `document_hash` and one column per feature, for the documents
+computed in one run; `compact` merges a function's chunks into one. Entries of
+old versions are never read again and can be deleted with `prune`.
+
+Usage:
+    cache = FeatureCache("data/cache/features")
+    functions = [
+        FeatureFunction("spectral", 1, spectral_features, {"frac_cuts": (0.5, 0.75, 0.9)}),
+        FeatureFunction("wavelet", 1, wavelet_features),
+    ]
+    series = load_many(HUMAN_ROOT_LLAMA, dtype=np.float64, ragged=True)
+    df = cache.build(series, functions)       # indexed by series.paths
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+
+from fingerprinting_llms.features.segments import as_ragged
+from fingerprinting_llms.io.atomic import atomic_write
+from fingerprinting_llms.score.bulk import RaggedArray
+
+logger = logging.getLogger(__name__)
+
+HASH_COLUMN = "document_hash"
+
+
+@dataclass(frozen=True)
+class FeatureFunction:
+    """A corpus-wide feature function and what its output depends on.
+
+    `function(series, **params)` takes a RaggedArray and returns {feature name:
+    one value per document}. Bump `version` whenever the function's code
+    changes its output; `params` are part of the cache key already.
+    """
+
+    name: str
+    version: int | str
+    function: Callable[..., dict[str, np.ndarray]]
+    params: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        """Directory name of this function's entries."""
+        params = json.dumps(self.params, sort_keys=True, default=str)
+        return f"{self.name}-v{self.version}-{hashlib.sha256(params.encode()).hexdigest()[:8]}"
+
+    def __call__(self, series: RaggedArray) -> dict[str, np.ndarray]:
+        return self.function(series, **self.params)
+
+
+def document_hashes(values: np.ndarray, offsets: npt.NDArray[np.int64]) -> list[str]:
+    """SHA-256 (first 16 hex digits) of each document's float64 series."""
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    return [
+        hashlib.sha256(values[start:end].tobytes()).hexdigest()[:16]
+        for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist(), strict=True)
+    ]
+
+
+class FeatureCache:
+    """
+    On-disk feature values keyed by (document hash, feature function).
+
+    Args:
+        cachedir: Directory holding the cache; created if missing.
+    """
+
+    def __init__(self, cachedir: str | Path):
+        self.cachedir = Path(cachedir)
+        self.cachedir.mkdir(parents=True, exist_ok=True)
+
+    def _chunks(self, function: FeatureFunction) -> list[Path]:
+        return sorted((self.cachedir / function.key).glob("*.npz"))
+
+    def load(self, function: FeatureFunction) -> pd.DataFrame:
+        """Every cached value of `function`, indexed by document hash."""
+        frames = []
+        for chunk in self._chunks(function):
+            with np.load(chunk) as z:
+                columns = {name: z[name] for name in z.files if name != HASH_COLUMN}
+                frames.append(pd.DataFrame(columns, index=pd.Index(z[HASH_COLUMN], dtype=str)))
+        if not frames:
+            return pd.DataFrame(index=pd.Index([], dtype=str))
+        df = pd.concat(frames)
+        return df[~df.index.duplicated(keep="last")]
+
+    def _save_chunk(self, function: FeatureFunction, df: pd.DataFrame) -> Path:
+        dirpath = self.cachedir / function.key
+        dirpath.mkdir(parents=True, exist_ok=True)
+        filepath = dirpath / f"{time.time_ns()}-{os.getpid()}.npz"
+        arrays = {HASH_COLUMN: df.index.to_numpy(dtype=str)}
+        arrays |= {str(name): df[name].to_numpy() for name in df.columns}
+        with atomic_write(filepath) as f:
+            np.savez(f, **arrays)
+        return filepath
+
+    def update(
+        self,
+        function: FeatureFunction,
+        values: np.ndarray,
+        offsets: npt.NDArray[np.int64],
+        hashes: Sequence[str],
+    ) -> pd.DataFrame:
+        """Values of `function` for documents `hashes`, computing only uncached ones.
+
+        Returns:
+            DataFrame indexed by document hash (unique, in order of first appearance)
+        """
+        cached = self.load(function)
+        unique = list(dict.fromkeys(hashes))
+        missing = [h for h in unique if h not in cached.index]
+        if missing:
+            first = {h: i for i, h in reversed(list(enumerate(hashes)))}
+            docs = [first[h] for h in missing]
+            series = RaggedArray.from_arrays(
+                [values[offsets[i] : offsets[i + 1]] for i in docs], paths=missing
+            )
+            t_start = time.perf_counter()
+            computed = pd.DataFrame(function(series), index=pd.Index(missing, dtype=str))
+            logger.info(
+                f"Computed {function.key} for {len(missing)} of {len(unique)} documents "
+                f"in {time.perf_counter() - t_start:.2f}s"
+            )
+            self._save_chunk(function, computed)
+            cached = pd.concat([cached, computed]) if len(cached) else computed
+        else:
+            logger.info(f"All {len(unique)} documents cached for {function.key}")
+        return cached.reindex(unique)
+
+    def build(
+        self,
+        series: RaggedArray | Sequence[npt.ArrayLike],
+        functions: Sequence[FeatureFunction],
+        index: Sequence[Any] | None = None,
+    ) -> pd.DataFrame:
+        """Feature DataFrame of `series` for every function, computing only missing cells.
+
+        Args:
+            series: Logprob series, as a RaggedArray or a list of 1D arrays
+            functions: Feature functions; their output columns are concatenated
+            index: Row labels (default: a RaggedArray's paths, else 0..n-1)
+
+        Returns:
+            One row per document of `series`, in order
+
+        Raises:
+            ValueError: if two functions return a feature of the same name.
+        """
+        values, offsets = as_ragged(series)
+        hashes = document_hashes(values, offsets)
+        if index is None and isinstance(series, RaggedArray) and len(series.paths) == len(hashes):
+            index = series.paths
+        frames = [self.update(function, values, offsets, hashes) for function in functions]
+        df = pd.concat(frames, axis=1) if frames else pd.DataFrame(index=hashes)
+        duplicated = df.columns[df.columns.duplicated()].unique().tolist()
+        if duplicated:
+            raise ValueError(f"Features returned by more than one function: {duplicated}")
+        df = df.loc[hashes]
+        df.index = pd.Index(index if index is not None else range(len(hashes)))
+        return df
+
+    def compact(self, function: FeatureFunction) -> int:
+        """Merge the chunks of `function` into one file.
+
+        Returns:
+            int: number of chunks merged
+        """
+        chunks = self._chunks(function)
+        if len(chunks) > 1:
+            self._save_chunk(function, self.load(function))
+            for chunk in chunks:
+                chunk.unlink()
+        return len(chunks)
+
+    def prune(self, functions: Sequence[FeatureFunction]) -> list[str]:
+        """Delete the entries of every other function, version or parameter set.
+
+        Returns:
+            list[str]: keys removed
+        """
+        keep = {function.key for function in functions}
+        removed = []
+        for dirpath in sorted(p for p in self.cachedir.iterdir() if p.is_dir()):
+            if dirpath.name not in keep:
+                shutil.rmtree(dirpath)
+                removed.append(dirpath.name)
+        logger.info(f"Pruned {len(removed)} feature cache entries from {self.cachedir}")
+        return removed
@@ -0,0 +1,183 @@
+"""
+Surprisal-event burstiness features, computed for a whole corpus at once.
+
+Burstiness-EventAnalysis-v1 marks a token as an event when its surprisal is at
+or above a per-document quantile, then describes when events happen: how far
+apart they are and how unevenly they fall into fixed windows. Its functions
+(`probs_to_surprisal`, `event_indicator_from_surprisal`,
+`inter_event_distances`, `fano_factor_event_counts`, `burstiness_index`) run
+per document and per threshold. Here every step is a segment-wise operation on
+the corpus stored end to end (values plus offsets):
+
+  - surprisal of every token, with the notebook's per-document choice between
+    logprobs and probabilities,
+  - one sort of all documents gives the quantile thresholds for every
+    requested quantile,
+  - event positions, inter-event gaps and window counts come from flat index
+    arithmetic and prefix sums, with per-document statistics from bincount.
+
+Usage:
+    series = load_many(HUMAN_ROOT_MIXTRAL, dtype=np.float64, ragged=True)
+    features = event_features(series, quantiles=(0.8, 0.9, 0.95, 0.98))
+"""
+
+import logging
+from collections.abc import Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from fingerprinting_llms.features.segments import (
+    as_ragged,
+    ratio,
+    segment_ids,
+    segment_mean,
+    segment_quantiles,
+    segment_std,
+    segment_sum,
+)
+from fingerprinting_llms.score.bulk import RaggedArray
+
+logger = logging.getLogger(__name__)
+
+EVENT_QUANTILES = (0.8,)
+FANO_WINDOW_SIZES = (32, 64, 128)
+
+
+def surprisal(
+    values: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+    eps: float = 1e-45,
+) -> npt.NDArray[np.float64]:
+    """-log p of every token, as `probs_to_surprisal`.
+
+    A document whose values are all <= 0 is taken as logprobs (surprisal
+    -values); any other as probabilities, clipped to [eps, 1].
+    """
+    values = np.asarray(values, dtype=np.float64)
+    ids = segment_ids(offsets)
+    #   NaN counts as "not <= 0", as in np.all(probs <= 0)
+    not_logprobs = segment_sum((~(values <= 0)).astype(np.float64), offsets, ids) > 0
+    as_probs = not_logprobs[ids]
+    out = -values
+    out[as_probs] = -np.log(np.clip(values[as_probs], eps, 1.0))
+    return out
+
+
+def event_masks(
+    surprisals: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+    quantiles: Sequence[float] = EVENT_QUANTILES,
+) -> npt.NDArray[np.bool_]:
+    """(len(quantiles), n_tokens) event indicators: surprisal >= the document's quantile."""
+    ids = segment_ids(offsets)
+    thresholds = segment_quantiles(surprisals, offsets, quantiles)
+    if len(quantiles) == 0:
+        return np.zeros((0, len(surprisals)), dtype=bool)
+    return np.stack([surprisals >= threshold[ids] for threshold in thresholds])
+
+
+def inter_event_gaps(
+    events: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.int64]]:
+    """Distances between successive events of each document, as (gaps, gap offsets).
+
+    Documents with fewer than 2 events have no gaps.
+    """
+    positions = np.flatnonzero(events)
+    docs = np.searchsorted(offsets, positions, side="right") - 1
+    same = docs[1:] == docs[:-1]
+    gaps = np.diff(positions)[same].astype(np.float64)
+    gap_offsets = np.zeros(len(offsets), dtype=np.int64)
+    np.cumsum(np.bincount(docs[1:][same], minlength=len(offsets) - 1), out=gap_offsets[1:])
+    return gaps, gap_offsets
+
+
+def fano_factors(
+    events: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+    window: int,
+) -> npt.NDArray[np.float64]:
+    """Fano factor (var, ddof=1, / mean) of event counts in non-overlapping windows.
+
+    As `fano_factor_event_counts`: 0 with fewer than 2 windows or no events in them.
+    """
+    lengths = np.diff(offsets)
+    n_windows = lengths // window if window >= 1 else np.zeros_like(lengths)
+    docs = np.repeat(np.arange(len(lengths)), n_windows)
+    first = np.repeat(np.cumsum(n_windows) - n_windows, n_windows)
+    starts = offsets[docs] + window * (np.arange(len(docs)) - first)
+
+    cumulative = np.zeros(len(events) + 1, dtype=np.int64)
+    np.cumsum(events, out=cumulative[1:])
+    counts = (cumulative[starts + window] - cumulative[starts]).astype(np.float64)
+
+    window_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(n_windows, out=window_offsets[1:])
+    mean = segment_mean(counts, window_offsets, docs)
+    variance = segment_std(counts, window_offsets, docs, ddof=1) ** 2
+    fano = ratio(variance, np.nan_to_num(mean))
+    return np.where(n_windows >= 2, fano, 0.0)
+
+
+def event_features(
+    series: RaggedArray | Sequence[npt.ArrayLike],
+    quantiles: Sequence[float] = EVENT_QUANTILES,
+    fano_window_sizes: Sequence[int] = FANO_WINDOW_SIZES,
+) -> dict[str, npt.NDArray[np.float64]]:
+    """Event-burstiness features of every document for every quantile.
+
+    As `event_burstiness_features_from_probs`, per quantile q:
+      - event_fraction_{q}          : fraction of tokens that are events
+      - inter_event_mean_{q}        : mean gap between successive events
+      - inter_event_std_{q}         : std (ddof=1) of the gaps (NaN for a single gap)
+      - inter_event_cv_{q}          : std / mean of the gaps
+      - inter_event_burstiness_{q}  : (std - mean) / (std + mean) of the gaps
+      - fano_w{w}_{q}               : see `fano_factors`
+    Gap statistics are 0 with fewer than 2 events, and every feature is 0 for
+    documents of fewer than 2 tokens.
+    """
+    values, offsets = as_ragged(series)
+    return surprisal_event_features(
+        surprisal(values, offsets), offsets, quantiles, fano_window_sizes
+    )
+
+
+def surprisal_event_features(
+    surprisals: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+    quantiles: Sequence[float] = EVENT_QUANTILES,
+    fano_window_sizes: Sequence[int] = FANO_WINDOW_SIZES,
+) -> dict[str, npt.NDArray[np.float64]]:
+    """`event_features` from precomputed surprisals (see `surprisal`)."""
+    lengths = np.diff(offsets)
+    degenerate = lengths < 2
+    ids = segment_ids(offsets)
+    features: dict[str, npt.NDArray[np.float64]] = {}
+
+    for q, events in zip(quantiles, event_masks(surprisals, offsets, quantiles), strict=True):
+        event_counts = segment_sum(events.astype(np.float64), offsets, ids)
+        gaps, gap_offsets = inter_event_gaps(events, offsets)
+        has_gaps = np.diff(gap_offsets) > 0
+        mean = np.nan_to_num(segment_mean(gaps, gap_offsets))
+        std = segment_std(gaps, gap_offsets, ddof=1)
+        #   A single gap has NaN std, which propagates as in the notebook
+        std = np.where(has_gaps, std, 0.0)
+        spread = std + mean
+        burstiness = np.divide(
+            std - mean, spread, out=np.zeros_like(spread), where=(spread != 0) | np.isnan(spread)
+        )
+
+        columns = {
+            f"event_fraction_{q}": ratio(event_counts, lengths.astype(np.float64)),
+            f"inter_event_mean_{q}": mean,
+            f"inter_event_std_{q}": std,
+            f"inter_event_cv_{q}": np.divide(std, mean, out=np.zeros_like(std), where=mean > 0),
+            f"inter_event_burstiness_{q}": burstiness,
+        }
+        for window in fano_window_sizes:
+            columns[f"fano_w{window}_{q}"] = fano_factors(events, offsets, window)
+        for name, column in columns.items():
+            features[name] = np.where(degenerate, 0.0, column)
+    return features
@@ -0,0 +1,361 @@
+"""
+Feature registry and shared-intermediate evaluation.
+
+The notebooks' `extract_features_from_logp` variants recompute the same
+intermediates in every feature function: the mean-centred series, the FFT power
+spectrum, the surprisal transform, wavelet decompositions, the autocorrelation.
+Here:
+
+  - an `Intermediate` is a named corpus-wide array (or tuple of arrays) computed
+    from other intermediates,
+  - a `FeatureSet` declares the intermediates it reads and computes a group of
+    feature columns from them,
+  - a `FeatureGraph` evaluates intermediates lazily for one corpus and keeps
+    them, so each (intermediate, parameters) is computed at most once however
+    many feature sets use it, and only the intermediates of the requested
+    feature sets are computed.
+
+Intermediates (`INTERMEDIATES`):
+  - series                 : (values, offsets) of the corpus
+  - centered               : (values minus each document's mean, means)
+  - power_spectrum         : (spectra, spectrum offsets) of the centred series
+  - surprisal              : -log p of every token
+  - wavelet_coefficients   : `wavelet_decomposition` of the centred series
+                             (params: wavelet, max_levels, mode)
+  - rolling_prefix         : `RollingPrefix` of the series and centred series
+  - acf                    : `autocorrelation` of the centred series (params: max_lag, method)
+
+Feature sets (`FEATURE_SETS`): spectral, windowed_spectral, wavelet, rolling_cv,
+rolling_sign_change, acf, events; each takes the parameters of the function it
+wraps.
+
+New intermediates and feature sets are added with `register_intermediate` /
+`register_feature_set`; a feature set reads intermediates with
+`graph.get(name, **params)`.
+
+Usage:
+    series = load_many(HUMAN_ROOT_LLAMA, dtype=np.float64, ragged=True)
+    features = compute_features(
+        series,
+        ("spectral", "wavelet", "rolling_cv", "acf"),
+        params={"rolling_cv": {"window_sizes": (8, 16, 32, 64, 128)}},
+    )
+    df = pd.DataFrame(features, index=series.paths)
+
+    graph = FeatureGraph(series)                            # reuse across sweeps
+    for max_lags in ((16,), (32,), (64,)):
+        sweep = compute_features(graph, ("acf",), params={"acf": {"max_lags": max_lags}})
+"""
+
+import logging
+import time
+from collections.abc import Callable, Mapping, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+from fingerprinting_llms.features.acf import acf_summary, autocorrelation
+from fingerprinting_llms.features.events import (
+    EVENT_QUANTILES,
+    FANO_WINDOW_SIZES,
+    surprisal,
+    surprisal_event_features,
+)
+from fingerprinting_llms.features.rolling import (
+    RollingPrefix,
+    rolling_cv_features,
+    rolling_sign_change_features,
+)
+from fingerprinting_llms.features.segments import as_ragged, segment_center
+from fingerprinting_llms.features.spectral import (
+    FOURIER_FRAC_CUTS,
+    MAX_BATCH_ELEMENTS,
+    power_spectra,
+    spectrum_features,
+    windowed_spectral_features,
+)
+from fingerprinting_llms.features.wavelet import (
+    WAVELETS_TO_TRY,
+    decomposition_features,
+    wavelet_decomposition,
+)
+from fingerprinting_llms.score.bulk import RaggedArray
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Intermediate:
+    """A corpus-wide value computed as `compute(graph, **params)`."""
+
+    name: str
+    inputs: tuple[str, ...]
+    compute: Callable[..., Any]
+
+
+@dataclass(frozen=True)
+class FeatureSet:
+    """Feature columns computed as `compute(graph, **params)` from `inputs`.
+
+    `params` are the defaults, overridden per call of `compute_features`.
+    """
+
+    name: str
+    inputs: tuple[str, ...]
+    compute: Callable[..., dict[str, np.ndarray]]
+    params: dict[str, Any] = field(default_factory=dict)
+
+
+INTERMEDIATES: dict[str, Intermediate] = {}
+FEATURE_SETS: dict[str, FeatureSet] = {}
+
+
+def register_intermediate(intermediate: Intermediate) -> Intermediate:
+    """Add `intermediate` to INTERMEDIATES.
+
+    Raises:
+        ValueError: if the name is taken or an input is not registered.
+    """
+    if intermediate.name in INTERMEDIATES:
+        raise ValueError(f"Intermediate {intermediate.name!r} is already registered")
+    _check_inputs(intermediate.name, intermediate.inputs)
+    INTERMEDIATES[intermediate.name] = intermediate
+    return intermediate
+
+
+def register_feature_set(feature_set: FeatureSet) -> FeatureSet:
+    """Add `feature_set` to FEATURE_SETS.
+
+    Raises:
+        ValueError: if the name is taken or an input is not registered.
+    """
+    if feature_set.name in FEATURE_SETS:
+        raise ValueError(f"Feature set {feature_set.name!r} is already registered")
+    _check_inputs(feature_set.name, feature_set.inputs)
+    FEATURE_SETS[feature_set.name] = feature_set
+    return feature_set
+
+
+def _check_inputs(name: str, inputs: Sequence[str]) -> None:
+    unknown = [i for i in inputs if i not in INTERMEDIATES]
+    if unknown:
+        raise ValueError(f"{name!r} reads unknown intermediates {unknown}")
+
+
+def _freeze(value: Any) -> Any:
+    """Hashable form of a parameter value (lists and dicts become tuples)."""
+    if isinstance(value, Mapping):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class FeatureGraph:
+    """
+    Lazily evaluated intermediates of one corpus.
+
+    Args:
+        series: Logprob series, as a RaggedArray or a list of 1D arrays
+    """
+
+    def __init__(self, series: RaggedArray | Sequence[npt.ArrayLike]):
+        values, offsets = as_ragged(series)
+        self.n_docs = len(offsets) - 1
+        self._values: dict[tuple, Any] = {("series", ()): (values, offsets)}
+        #   Seconds spent per intermediate, in evaluation order
+        self.timings: dict[str, float] = {}
+
+    @property
+    def offsets(self) -> npt.NDArray[np.int64]:
+        return self.get("series")[1]
+
+    def get(self, name: str, **params: Any) -> Any:
+        """Intermediate `name` for `params`, computed on first use.
+
+        Raises:
+            ValueError: for an unknown intermediate.
+        """
+        key = (name, _freeze(params))
+        if key not in self._values:
+            if name not in INTERMEDIATES:
+                raise ValueError(
+                    f"Unknown intermediate {name!r}; choose from {sorted(INTERMEDIATES)}"
+                )
+            t_start = time.perf_counter()
+            self._values[key] = INTERMEDIATES[name].compute(self, **params)
+            label = f"{name}({', '.join(f'{k}={v}' for k, v in sorted(params.items()))})"
+            self.timings[label] = time.perf_counter() - t_start
+            logger.debug(f"Computed {label} in {self.timings[label]:.3f}s")
+        return self._values[key]
+
+
+def compute_features(
+    series: RaggedArray | Sequence[npt.ArrayLike] | FeatureGraph,
+    feature_sets: Sequence[str],
+    params: Mapping[str, Mapping[str, Any]] | None = None,
+) -> dict[str, npt.NDArray[np.float64]]:
+    """Compute the requested feature sets, sharing their intermediates.
+
+    Args:
+        series: Logprob series, or a FeatureGraph to reuse its intermediates
+        feature_sets: Names in FEATURE_SETS
+        params: {feature set: parameter overrides}
+
+    Returns:
+        {feature name: array with one value per document}, in the order of
+        `feature_sets`
+
+    Raises:
+        ValueError: for an unknown feature set, or two sets returning the same feature.
+    """
+    params = params or {}
+    unknown = [name for name in (*feature_sets, *params) if name not in FEATURE_SETS]
+    if unknown:
+        raise ValueError(f"Unknown feature sets {unknown}; choose from {sorted(FEATURE_SETS)}")
+    graph = series if isinstance(series, FeatureGraph) else FeatureGraph(series)
+
+    features: dict[str, npt.NDArray[np.float64]] = {}
+    for name in feature_sets:
+        feature_set = FEATURE_SETS[name]
+        t_start = time.perf_counter()
+        computed = feature_set.compute(graph, **(feature_set.params | dict(params.get(name, {}))))
+        repeated = features.keys() & computed.keys()
+        if repeated:
+            raise ValueError(f"Feature set {name!r} repeats features {sorted(repeated)}")
+        features |= computed
+        logger.info(
+            f"Computed {len(computed)} {name} features of {graph.n_docs} documents "
+            f"in {time.perf_counter() - t_start:.2f}s"
+        )
+    return features
+
+
+# -----------------------------------------------------------------------------
+# Intermediates
+# -----------------------------------------------------------------------------
+def _centered(graph: FeatureGraph) -> tuple[np.ndarray, npt.NDArray[np.float64]]:
+    #   Centred as x - x.mean() per document, so the features match the
+    #   standalone functions exactly
+    values, offsets = graph.get("series")
+    return segment_center(values, offsets, MAX_BATCH_ELEMENTS)
+
+
+def _power_spectrum(graph: FeatureGraph) -> tuple[np.ndarray, npt.NDArray[np.int64]]:
+    centered, _ = graph.get("centered")
+    return power_spectra(centered, graph.offsets, centered=True)
+
+
+def _surprisal(graph: FeatureGraph) -> np.ndarray:
+    return surprisal(*graph.get("series"))
+
+
+def _wavelet_coefficients(
+    graph: FeatureGraph, wavelet: str, max_levels: int = 5, mode: str = "symmetric"
+) -> list:
+    centered, _ = graph.get("centered")
+    return wavelet_decomposition(centered, graph.offsets, wavelet, max_levels, mode)
+
+
+def _rolling_prefix(graph: FeatureGraph) -> RollingPrefix:
+    values, offsets = graph.get("series")
+    return RollingPrefix.from_series(RaggedArray(values, offsets, []), graph.get("centered"))
+
+
+def _acf(graph: FeatureGraph, max_lag: int, method: str = "auto") -> np.ndarray:
+    centered, _ = graph.get("centered")
+    return autocorrelation(RaggedArray(centered, graph.offsets, []), max_lag, method, centered=True)
+
+
+for _intermediate in (
+    Intermediate("series", (), lambda graph: graph.get("series")),
+    Intermediate("centered", ("series",), _centered),
+    Intermediate("power_spectrum", ("centered",), _power_spectrum),
+    Intermediate("surprisal", ("series",), _surprisal),
+    Intermediate("wavelet_coefficients", ("centered",), _wavelet_coefficients),
+    Intermediate("rolling_prefix", ("series", "centered"), _rolling_prefix),
+    Intermediate("acf", ("centered",), _acf),
+):
+    register_intermediate(_intermediate)
+
+
+# -----------------------------------------------------------------------------
+# Feature sets
+# -----------------------------------------------------------------------------
+def _spectral(graph: FeatureGraph, frac_cuts: Sequence[float]) -> dict[str, np.ndarray]:
+    spectra, offsets = graph.get("power_spectrum")
+    return spectrum_features(spectra, offsets, frac_cuts)
+
+
+def _windowed_spectral(graph: FeatureGraph, **params: Any) -> dict[str, np.ndarray]:
+    values, offsets = graph.get("series")
+    return windowed_spectral_features(RaggedArray(values, offsets, []), **params)
+
+
+def _wavelet(
+    graph: FeatureGraph, wavelets: Sequence[str], max_levels: int, mode: str
+) -> dict[str, np.ndarray]:
+    features: dict[str, np.ndarray] = {}
+    for wavelet in wavelets:
+        decomposition = graph.get(
+            "wavelet_coefficients", wavelet=wavelet, max_levels=max_levels, mode=mode
+        )
+        features |= decomposition_features(decomposition, graph.n_docs, wavelet, max_levels)
+    return features
+
+
+def _rolling_cv(graph: FeatureGraph, **params: Any) -> dict[str, np.ndarray]:
+    return rolling_cv_features(graph.get("rolling_prefix"), **params)
+
+
+def _rolling_sign_change(graph: FeatureGraph, **params: Any) -> dict[str, np.ndarray]:
+    return rolling_sign_change_features(graph.get("rolling_prefix"), **params)
+
+
+def _acf_features(
+    graph: FeatureGraph, max_lags: Sequence[int], summary_lags: Sequence[int], method: str
+) -> dict[str, np.ndarray]:
+    acf = graph.get("acf", max_lag=max([*max_lags, *summary_lags, 0]), method=method)
+    return acf_summary(acf, np.diff(graph.offsets), max_lags, summary_lags)
+
+
+def _events(
+    graph: FeatureGraph, quantiles: Sequence[float], fano_window_sizes: Sequence[int]
+) -> dict[str, np.ndarray]:
+    return surprisal_event_features(
+        graph.get("surprisal"), graph.offsets, quantiles, fano_window_sizes
+    )
+
+
+for _feature_set in (
+    FeatureSet("spectral", ("power_spectrum",), _spectral, {"frac_cuts": FOURIER_FRAC_CUTS}),
+    FeatureSet(
+        "windowed_spectral",
+        ("series",),
+        _windowed_spectral,
+        {"window_sizes": (64, 128), "frac_cuts": FOURIER_FRAC_CUTS},
+    ),
+    FeatureSet(
+        "wavelet",
+        ("wavelet_coefficients",),
+        _wavelet,
+        {"wavelets": WAVELETS_TO_TRY, "max_levels": 5, "mode": "symmetric"},
+    ),
+    FeatureSet("rolling_cv", ("rolling_prefix",), _rolling_cv),
+    FeatureSet("rolling_sign_change", ("rolling_prefix",), _rolling_sign_change),
+    FeatureSet(
+        "acf",
+        ("acf",),
+        _acf_features,
+        {"max_lags": (64,), "summary_lags": (2, 4, 8), "method": "auto"},
+    ),
+    FeatureSet(
+        "events",
+        ("surprisal",),
+        _events,
+        {"quantiles": EVENT_QUANTILES, "fano_window_sizes": FANO_WINDOW_SIZES},
+    ),
+):
+    register_feature_set(_feature_set)
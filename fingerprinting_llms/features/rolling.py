@@ -0,0 +1,248 @@
+"""
+Rolling-window statistics of logprob series from prefix sums.
+
+`windowed_cv_features` and `windowed_sign_change_rate_features` (Burstiness
+notebooks) build an `as_strided` view per window size and reduce every window,
+O(n * w) work per size and document, plus a Python loop per window for sign
+changes. `RollingPrefix` instead takes cumulative sums of x, x^2, non-zero
+diffs and sign flips once for a whole corpus; the mean, std and sign-change
+rate of any window is then a difference of two prefix values, so every
+(window size, step) pair costs O(number of windows) on top of one O(n) pass.
+
+Numerics: the prefix sums of x and x^2 restart at every document, so their
+rounding error scales with the document rather than the corpus, and each series
+is shifted by its own mean first (which does not change the std), so sums of x
+stay near 0. Window variances are clipped at 0, and are exactly 0 for constant
+windows (those without a non-zero diff), which rounding would otherwise leave
+slightly positive.
+
+Usage:
+    series = load_many(HUMAN_ROOT_LLAMA, dtype=np.float64, ragged=True)
+    features = rolling_cv_features(series, window_sizes=(16, 32, 64, 128))
+    features |= rolling_sign_change_features(series, window_sizes=(4, 16, 64))
+
+    prefix = RollingPrefix.from_series(series)                # reuse across sweeps
+    docs, starts = prefix.windows(64, step=16)
+    mean, std = prefix.mean_std(starts, 64)
+"""
+
+import logging
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+
+from fingerprinting_llms.features.segments import (
+    as_ragged,
+    equal_length_batches,
+    segment_center,
+    segment_ids,
+    segment_mean,
+    segment_percentiles,
+    segment_rows,
+    segment_std,
+)
+from fingerprinting_llms.features.spectral import MAX_BATCH_ELEMENTS
+from fingerprinting_llms.score.bulk import RaggedArray
+
+logger = logging.getLogger(__name__)
+
+CV_WINDOW_SIZES = (16, 32, 64, 128)
+SIGN_CHANGE_WINDOW_SIZES = (4, 16, 64)
+CV_PERCENTILES = (5, 25, 75)
+_CV_MIN_DENOMINATOR = 1e-8
+
+
+def window_step(window: int, step_fraction: float = 0.25) -> int:
+    """Hop between windows, as in the notebooks: max(1, int(window * step_fraction))."""
+    return max(1, int(window * step_fraction))
+
+
+@dataclass
+class RollingPrefix:
+    """Prefix sums of a ragged corpus, from which window statistics are O(1) each.
+
+    `sums` and `squares` restart at every document: document d's n + 1 entries
+    are at [offsets[d] + d, offsets[d + 1] + d], entry j being the sum over its
+    values [0, j). Element i of the other prefix arrays is the sum over diffs
+    [0, i) of the flat corpus; diff i is values[i + 1] - values[i], and diffs
+    across a document boundary count as zero.
+    """
+
+    offsets: npt.NDArray[np.int64]
+    means: npt.NDArray[np.float64]  # per-document mean
+    sums: npt.NDArray[np.float64]  # of x - mean, per document
+    squares: npt.NDArray[np.float64]  # of (x - mean)^2, per document
+    nonzero: npt.NDArray[np.int64]  # of non-zero diffs
+    flips: npt.NDArray[np.int64]  # of non-zero diffs whose sign differs from the previous one
+    next_nonzero: npt.NDArray[np.int64]  # index of the first non-zero diff at or after i
+
+    @staticmethod
+    def from_series(
+        series: RaggedArray | Sequence[npt.ArrayLike],
+        centered: tuple[np.ndarray, npt.NDArray[np.float64]] | None = None,
+    ) -> "RollingPrefix":
+        """Prefix sums of `series`.
+
+        Args:
+            series: Logprob series
+            centered: (series minus their per-document means, means), as
+                `segment_center` returns, if already computed. Sign changes
+                are still counted on `series`, whose diffs are exact.
+        """
+        values, offsets = as_ragged(series)
+        ids = segment_ids(offsets)
+        centered_values, means = (
+            segment_center(values, offsets, MAX_BATCH_ELEMENTS) if centered is None else centered
+        )
+
+        def prefix(x: np.ndarray) -> np.ndarray:
+            out = np.zeros(len(x) + 1, dtype=x.dtype)
+            np.cumsum(x, out=out[1:])
+            return out
+
+        def document_prefix(x: np.ndarray) -> np.ndarray:
+            out = np.zeros(len(x) + len(offsets) - 1, dtype=x.dtype)
+            for length, batch in equal_length_batches(offsets, MAX_BATCH_ELEMENTS):
+                rows = np.cumsum(segment_rows(x, offsets, batch, length), axis=1)
+                out[(offsets[batch] + batch + 1)[:, None] + np.arange(length)] = rows
+            return out
+
+        #   Diff i lies within a document iff values i and i + 1 do
+        n_diffs = max(len(values) - 1, 0)
+        inside = ids[1:] == ids[:-1] if n_diffs else np.zeros(0, dtype=bool)
+        signs = np.where(inside, np.sign(np.diff(values)), 0.0)
+        nonzero = signs != 0
+        index = np.arange(n_diffs)
+        #   Previous non-zero diff of the same document, if any
+        previous = np.maximum.accumulate(np.where(nonzero, index, -1))
+        previous = np.r_[-1, previous[:-1]] if n_diffs else previous
+        has_previous = (previous >= 0) & (ids[np.maximum(previous, 0)] == ids[:-1][:n_diffs])
+        flips = nonzero & has_previous & (signs != signs[np.maximum(previous, 0)])
+        next_nonzero = np.minimum.accumulate(np.where(nonzero, index, n_diffs)[::-1])[::-1]
+
+        return RollingPrefix(
+            offsets=offsets,
+            means=means,
+            sums=document_prefix(centered_values),
+            squares=document_prefix(centered_values * centered_values),
+            nonzero=prefix(nonzero.astype(np.int64)),
+            flips=prefix(flips.astype(np.int64)),
+            next_nonzero=np.r_[next_nonzero, n_diffs],
+        )
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def windows(
+        self, window: int, step: int
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        """(document, flat start index) of every full window, in document order.
+
+        A document of n values has 1 + (n - window) // step windows, none if
+        n < window or window < 2 (as `rolling_windows` in the notebooks).
+        """
+        lengths = np.diff(self.offsets)
+        counts = np.where((lengths >= window) & (window >= 2), 1 + (lengths - window) // step, 0)
+        docs = np.repeat(np.arange(len(self)), counts)
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        return docs, self.offsets[docs] + step * (np.arange(len(docs)) - first)
+
+    def mean_std(
+        self, starts: npt.NDArray[np.int64], window: int, ddof: int = 1
+    ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        """Mean and std of the windows starting at `starts`."""
+        docs = np.searchsorted(self.offsets, starts, side="right") - 1
+        first, last = starts + docs, starts + docs + window
+        total = self.sums[last] - self.sums[first]
+        squares = self.squares[last] - self.squares[first]
+        constant = self.nonzero[starts + window - 1] == self.nonzero[starts]
+        deviations = np.where(constant, 0.0, np.maximum(squares - total * total / window, 0.0))
+        variance = deviations / (window - ddof)
+        return total / window + self.means[docs], np.sqrt(variance)
+
+    def sign_change_rate(
+        self, starts: npt.NDArray[np.int64], window: int
+    ) -> npt.NDArray[np.float64]:
+        """Fraction of consecutive non-zero diffs with a sign flip, per window.
+
+        As `sign_change_rate_1d`: NaN with fewer than 2 non-zero diffs.
+        """
+        ends = starts + window - 1
+        n_nonzero = self.nonzero[ends] - self.nonzero[starts]
+        flips = self.flips[ends] - self.flips[starts]
+        #   The first non-zero diff's flip is relative to a diff outside the window
+        first = self.next_nonzero[starts]
+        inside = first < ends
+        #   `first` is the end of the corpus when no non-zero diff follows
+        after = np.minimum(first + 1, len(self.flips) - 1)
+        flips = flips - np.where(inside, self.flips[after] - self.flips[first], 0)
+        return np.divide(
+            flips, n_nonzero - 1, out=np.full(len(starts), np.nan), where=n_nonzero >= 2
+        )
+
+
+# -----------------------------------------------------------------------------
+# Notebook features
+# -----------------------------------------------------------------------------
+def _window_offsets(docs: npt.NDArray[np.int64], n_docs: int) -> npt.NDArray[np.int64]:
+    offsets = np.zeros(n_docs + 1, dtype=np.int64)
+    np.cumsum(np.bincount(docs, minlength=n_docs), out=offsets[1:])
+    return offsets
+
+
+def rolling_cv_features(
+    series: RaggedArray | Sequence[npt.ArrayLike] | RollingPrefix,
+    window_sizes: Sequence[int] = CV_WINDOW_SIZES,
+    step_fraction: float = 0.25,
+    percentiles: Sequence[float] = CV_PERCENTILES,
+) -> dict[str, npt.NDArray[np.float64]]:
+    """Mean and percentiles of the local coefficient of variation, per window size.
+
+    The CV of a window is std (ddof=1) / max(|mean|, 1e-8), over windows of
+    `window_size` tokens every `window_step(window_size, step_fraction)`.
+
+    Returns:
+        cv_local_mean_w{w} and cv_local_p{q}_w{w} for each percentile q (NaN
+        for documents without a window). Unlike StatsDeepDive-v2, p75 is the
+        75th percentile (the notebook computed the 25th twice).
+    """
+    prefix = series if isinstance(series, RollingPrefix) else RollingPrefix.from_series(series)
+    features: dict[str, npt.NDArray[np.float64]] = {}
+    for window in window_sizes:
+        docs, starts = prefix.windows(window, window_step(window, step_fraction))
+        mean, std = prefix.mean_std(starts, window)
+        cv = std / np.maximum(np.abs(mean), _CV_MIN_DENOMINATOR)
+        offsets = _window_offsets(docs, len(prefix))
+        features[f"cv_local_mean_w{window}"] = segment_mean(cv, offsets, docs)
+        for q, values in zip(
+            percentiles, segment_percentiles(cv, offsets, percentiles), strict=True
+        ):
+            features[f"cv_local_p{q}_w{window}"] = values
+    return features
+
+
+def rolling_sign_change_features(
+    series: RaggedArray | Sequence[npt.ArrayLike] | RollingPrefix,
+    window_sizes: Sequence[int] = SIGN_CHANGE_WINDOW_SIZES,
+    step_fraction: float = 0.25,
+) -> dict[str, npt.NDArray[np.float64]]:
+    """Mean and std (ddof=1) of the local sign-change rate, per window size.
+
+    Windows without a defined rate (fewer than 2 non-zero diffs) are left out.
+
+    Returns:
+        scr_local_mean_w{w} and scr_local_std_w{w} (NaN without enough windows)
+    """
+    prefix = series if isinstance(series, RollingPrefix) else RollingPrefix.from_series(series)
+    features: dict[str, npt.NDArray[np.float64]] = {}
+    for window in window_sizes:
+        docs, starts = prefix.windows(window, window_step(window, step_fraction))
+        rates = prefix.sign_change_rate(starts, window)
+        defined = np.isfinite(rates)
+        docs, rates = docs[defined], rates[defined]
+        offsets = _window_offsets(docs, len(prefix))
+        features[f"scr_local_mean_w{window}"] = segment_mean(rates, offsets, docs)
+        features[f"scr_local_std_w{window}"] = segment_std(rates, offsets, docs, ddof=1)
+    return features
@@ -0,0 +1,175 @@
+"""
+Segment-wise reductions over ragged corpora.
+
+Feature code works on many variable-length series at once, stored end to end in
+one flat array with offsets (document i is values[offsets[i]:offsets[i + 1]],
+as in `fingerprinting_llms.score.bulk.RaggedArray`). These helpers convert
+inputs to that layout and reduce each segment with whole-array NumPy
+operations instead of a Python loop per document.
+"""
+
+from collections.abc import Iterator, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from fingerprinting_llms.score.bulk import RaggedArray
+
+
+def as_ragged(
+    series: RaggedArray | Sequence[npt.ArrayLike],
+    dtype: npt.DTypeLike = np.float64,
+) -> tuple[np.ndarray, npt.NDArray[np.int64]]:
+    """(values, offsets) of a RaggedArray or a sequence of 1D arrays."""
+    if isinstance(series, RaggedArray):
+        return np.asarray(series.values, dtype=dtype), np.asarray(series.offsets, dtype=np.int64)
+    arrays = [np.asarray(s, dtype=dtype).ravel() for s in series]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in arrays], out=offsets[1:])
+    values = np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+    return values, offsets
+
+
+def segment_ids(offsets: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+    """Segment index of every element."""
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def segment_positions(offsets: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+    """Position of every element within its segment (0, 1, ... per segment)."""
+    return np.arange(offsets[-1]) - np.repeat(offsets[:-1], np.diff(offsets))
+
+
+def equal_length_batches(
+    offsets: npt.NDArray[np.int64],
+    max_elements: int,
+) -> Iterator[tuple[int, npt.NDArray[np.int64]]]:
+    """(length, segment indices) for groups of non-empty segments of one length.
+
+    Groups hold at most `max_elements` values (but at least one segment), so
+    each can be gathered into a 2D array with `segment_rows`.
+    """
+    lengths = np.diff(offsets)
+    for length in np.unique(lengths[lengths > 0]).tolist():
+        segments = np.flatnonzero(lengths == length)
+        chunk = max(1, max_elements // length)
+        for start in range(0, len(segments), chunk):
+            yield length, segments[start : start + chunk]
+
+
+def segment_rows(
+    values: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+    segments: npt.NDArray[np.int64],
+    length: int,
+) -> np.ndarray:
+    """The given segments, all of `length` values, as rows of a 2D array."""
+    return values[offsets[segments][:, None] + np.arange(length)]
+
+
+def segment_center(
+    values: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+    max_elements: int,
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """(values minus their segment's mean, segment means); means of empty segments are 0.
+
+    The means are row means of equal-length batches of at most `max_elements`
+    values, which sum as `x.mean()` does, so every segment is centred exactly
+    as the per-document code centres it.
+    """
+    centered = np.empty(len(values), dtype=np.float64)
+    means = np.zeros(len(offsets) - 1, dtype=np.float64)
+    for length, batch in equal_length_batches(offsets, max_elements):
+        rows = segment_rows(values, offsets, batch, length)
+        means[batch] = rows.mean(axis=1)
+        centered[offsets[batch][:, None] + np.arange(length)] = rows - means[batch][:, None]
+    return centered, means
+
+
+def segment_sum(
+    values: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+    ids: npt.NDArray[np.int64] | None = None,
+) -> npt.NDArray[np.float64]:
+    """Sum of each segment (0 for empty segments)."""
+    ids = segment_ids(offsets) if ids is None else ids
+    #   bincount with weights is float64, which numpy's stubs do not capture
+    return np.bincount(ids, weights=values, minlength=len(offsets) - 1).astype(
+        np.float64, copy=False
+    )
+
+
+def segment_mean(
+    values: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+    ids: npt.NDArray[np.int64] | None = None,
+) -> npt.NDArray[np.float64]:
+    """Mean of each segment (NaN for empty segments)."""
+    lengths = np.diff(offsets)
+    sums = segment_sum(values, offsets, ids)
+    return np.divide(sums, lengths, out=np.full(len(lengths), np.nan), where=lengths > 0)
+
+
+def segment_std(
+    values: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+    ids: npt.NDArray[np.int64] | None = None,
+    ddof: int = 0,
+) -> npt.NDArray[np.float64]:
+    """Standard deviation of each segment (NaN where it has <= ddof elements)."""
+    ids = segment_ids(offsets) if ids is None else ids
+    lengths = np.diff(offsets)
+    means = segment_mean(values, offsets, ids)
+    centered = values - means[ids]
+    ss = segment_sum(centered * centered, offsets, ids)
+    return np.sqrt(
+        np.divide(ss, lengths - ddof, out=np.full(len(lengths), np.nan), where=lengths > ddof)
+    )
+
+
+def ratio(num: np.ndarray, den: np.ndarray, default: float = 0.0) -> npt.NDArray[np.float64]:
+    """num / den where den > 0, else `default`."""
+    return np.divide(num, den, out=np.full(np.shape(num), default, dtype=np.float64), where=den > 0)
+
+
+def segment_quantiles(
+    values: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+    quantiles: Sequence[float],
+) -> list[npt.NDArray[np.float64]]:
+    """Quantiles of each segment, exactly as `np.quantile` (NaN for empty segments).
+
+    Sorts all segments together once, then reads every quantile from the
+    sorted values.
+    """
+    lengths = np.diff(offsets)
+    if len(values) == 0:
+        return [np.full(len(lengths), np.nan) for _ in quantiles]
+    ordered = values[np.lexsort((values, segment_ids(offsets)))]
+    starts = offsets[:-1]
+    last = np.maximum(starts + lengths - 1, 0)
+    out = []
+    for q in quantiles:
+        #   np.quantile's "linear" method, including its two-sided interpolation
+        position = (lengths - 1) * q
+        below = np.floor(position).astype(np.int64)
+        weight = position - below
+        lower = ordered[np.minimum(starts + below, last)]
+        upper = ordered[np.minimum(starts + below + 1, last)]
+        value = np.where(
+            weight >= 0.5,
+            upper - (upper - lower) * (1 - weight),
+            lower + (upper - lower) * weight,
+        )
+        out.append(np.where(lengths > 0, value, np.nan))
+    return out
+
+
+def segment_percentiles(
+    values: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+    percentiles: Sequence[float],
+) -> list[npt.NDArray[np.float64]]:
+    """Percentiles of each segment, as `np.percentile` (NaN for empty segments)."""
+    return segment_quantiles(values, offsets, [q / 100 for q in percentiles])
@@ -0,0 +1,253 @@
+"""
+Spectral features of logprob series, computed for many documents at once.
+
+The Burstiness notebooks compute `fourier_power`, `fourier_energy_ratio`,
+`spectral_centroid` and `spectral_slope` (and, in FourierDeepDive, spectral
+entropy and flatness over sliding windows) one document at a time. Here:
+
+  - series of equal length are stacked and transformed with one batched
+    `np.fft.rfft` (each document keeps its own length, so spectra are exactly
+    those of the per-document code),
+  - the power spectra are kept end to end in one flat array, and every feature
+    is a segment-wise reduction over it: all energy-ratio cutoffs come from one
+    pass over per-band energies, the slope from closed-form sums,
+  - sliding windows all share one length, so all windows of all documents are
+    transformed in a single batch.
+
+Every function takes a list of 1D arrays or a `RaggedArray` (see
+`fingerprinting_llms.score.bulk.load_many`) and returns {feature name: array
+with one value per document}, ready for `pd.DataFrame`.
+
+Usage:
+    series = load_many(HUMAN_ROOT_LLAMA, dtype=np.float64)
+    features = spectral_features(series, frac_cuts=(0.5, 0.75, 0.9))
+    features |= windowed_spectral_features(series, window_sizes=(64, 128))
+"""
+
+import logging
+from collections.abc import Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from fingerprinting_llms.features.segments import (
+    as_ragged,
+    equal_length_batches,
+    ratio,
+    segment_ids,
+    segment_mean,
+    segment_positions,
+    segment_rows,
+    segment_sum,
+)
+from fingerprinting_llms.score.bulk import RaggedArray
+
+logger = logging.getLogger(__name__)
+
+FOURIER_FRAC_CUTS = (0.5, 0.75, 0.9)
+#   Largest batch (documents x length) transformed at once, to bound memory
+MAX_BATCH_ELEMENTS = 1 << 22
+_LOG_EPS = 1e-12
+
+
+# -----------------------------------------------------------------------------
+# Power spectra
+# -----------------------------------------------------------------------------
+def power_spectrum(x: npt.ArrayLike) -> npt.NDArray[np.float64]:
+    """Power spectrum |rfft(x - mean)|^2 of one series."""
+    x = np.asarray(x, dtype=np.float64)
+    if x.size == 0:
+        return np.array([], dtype=np.float64)
+    spectrum = np.fft.rfft(x - x.mean())
+    return spectrum.real**2 + spectrum.imag**2
+
+
+def _batched_power(rows: np.ndarray, centered: bool = False) -> np.ndarray:
+    """Power spectra of the rows of a 2D array, each mean-centred unless already `centered`."""
+    if not centered:
+        rows = rows - rows.mean(axis=1, keepdims=True)
+    spectrum = np.fft.rfft(rows, axis=1)
+    return spectrum.real**2 + spectrum.imag**2
+
+
+def power_spectra(
+    values: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+    centered: bool = False,
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.int64]]:
+    """Power spectra of every mean-centred segment, as (flat spectra, spectrum offsets).
+
+    Segments of length n get n // 2 + 1 bins (0 for empty segments).
+    Segments of equal length are transformed together. With `centered`, the
+    segments are already mean-centred (see `segment_center`) and are
+    transformed as they are.
+    """
+    lengths = np.diff(offsets)
+    n_bins = np.where(lengths > 0, lengths // 2 + 1, 0)
+    spectrum_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(n_bins, out=spectrum_offsets[1:])
+    spectra = np.empty(spectrum_offsets[-1], dtype=np.float64)
+
+    for length, batch in equal_length_batches(offsets, MAX_BATCH_ELEMENTS):
+        bins = spectrum_offsets[batch][:, None] + np.arange(length // 2 + 1)
+        spectra[bins] = _batched_power(segment_rows(values, offsets, batch, length), centered)
+    return spectra, spectrum_offsets
+
+
+# -----------------------------------------------------------------------------
+# Features of power spectra
+# -----------------------------------------------------------------------------
+def spectrum_features(
+    spectra: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+    frac_cuts: Sequence[float] = FOURIER_FRAC_CUTS,
+) -> dict[str, npt.NDArray[np.float64]]:
+    """Energy ratios, centroid, slope, entropy and flatness of every spectrum.
+
+    Matches the notebooks' per-document definitions, including their 0 for
+    empty or all-zero spectra:
+      - fft_high_energy_ratio_cut{c} : power in bins >= floor(c * n_bins) / total
+      - spectral_centroid            : power-weighted mean bin index
+      - spectral_slope               : least-squares slope of log(P + 1e-12) on bin index
+      - spectral_entropy             : Shannon entropy of P / total, over log(n_bins)
+      - spectral_flatness            : geometric / arithmetic mean of the positive bins
+    """
+    n_bins = np.diff(offsets)
+    ids = segment_ids(offsets)
+    positions = segment_positions(offsets)
+    bins = positions.astype(np.float64)
+    total = segment_sum(spectra, offsets, ids)
+    features: dict[str, npt.NDArray[np.float64]] = {}
+
+    #   Every cutoff in one pass: the power in each band between consecutive
+    #   cutoffs, then suffix sums over the bands
+    cuts = sorted(frac_cuts)
+    band = np.zeros(len(spectra), dtype=np.int64)
+    for cut in cuts:
+        band += positions >= np.floor(cut * n_bins)[ids]
+    n_bands = len(cuts) + 1
+    band_power = np.bincount(ids * n_bands + band, weights=spectra, minlength=len(n_bins) * n_bands)
+    high_power = np.cumsum(band_power.reshape(-1, n_bands)[:, ::-1], axis=1)[:, ::-1]
+    for j, cut in enumerate(cuts):
+        features[f"fft_high_energy_ratio_cut{cut}"] = ratio(high_power[:, j + 1], total)
+
+    features["spectral_centroid"] = ratio(segment_sum(bins * spectra, offsets, ids), total)
+
+    log_power = np.log(spectra + _LOG_EPS)
+    bins_mean = (n_bins - 1) / 2.0
+    log_mean = segment_mean(log_power, offsets, ids)
+    covariance = segment_sum(
+        (bins - bins_mean[ids]) * (log_power - np.nan_to_num(log_mean)[ids]), offsets, ids
+    )
+    #   sum((w - mean(w))^2) over w = 0 .. n - 1
+    variance = n_bins * (n_bins.astype(np.float64) ** 2 - 1) / 12.0
+    features["spectral_slope"] = np.where(n_bins >= 2, ratio(covariance, variance), 0.0)
+
+    p = np.clip(spectra / np.where(total > 0, total, 1.0)[ids], _LOG_EPS, 1.0)
+    entropy = -segment_sum(p * np.log(p), offsets, ids)
+    max_entropy = np.log(np.maximum(n_bins, 1))
+    features["spectral_entropy"] = np.where(total > 0, ratio(entropy, max_entropy), 0.0)
+
+    positive = spectra > 0
+    n_positive = segment_sum(positive.astype(np.float64), offsets, ids)
+    log_positive = segment_sum(np.log(np.where(positive, spectra, 1.0)), offsets, ids)
+    geometric = np.exp(ratio(log_positive, n_positive))
+    arithmetic = ratio(segment_sum(np.where(positive, spectra, 0.0), offsets, ids), n_positive)
+    flatness = np.clip(ratio(geometric, arithmetic), 0.0, 1.0)
+    features["spectral_flatness"] = np.where(n_positive > 0, flatness, 0.0)
+    return features
+
+
+def spectral_features(
+    series: RaggedArray | Sequence[npt.ArrayLike],
+    frac_cuts: Sequence[float] = FOURIER_FRAC_CUTS,
+) -> dict[str, npt.NDArray[np.float64]]:
+    """Whole-series spectral features of every document (see `spectrum_features`)."""
+    values, offsets = as_ragged(series)
+    spectra, spectrum_offsets = power_spectra(values, offsets)
+    return spectrum_features(spectra, spectrum_offsets, frac_cuts)
+
+
+# -----------------------------------------------------------------------------
+# Windowed features
+# -----------------------------------------------------------------------------
+def _per_document_moments(
+    window_docs: npt.NDArray[np.int64],
+    window_values: np.ndarray,
+    n_docs: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Mean and (population) std of window values per document; 0 without windows."""
+    counts = np.bincount(window_docs, minlength=n_docs).astype(np.float64)
+    mean = ratio(np.bincount(window_docs, weights=window_values, minlength=n_docs), counts)
+    centered = window_values - mean[window_docs]
+    var = ratio(np.bincount(window_docs, weights=centered * centered, minlength=n_docs), counts)
+    return mean, np.sqrt(var)
+
+
+def windowed_spectral_features(
+    series: RaggedArray | Sequence[npt.ArrayLike],
+    window_sizes: Sequence[int] = (64, 128),
+    hop_size: int | None = None,
+    frac_cuts: Sequence[float] = FOURIER_FRAC_CUTS,
+) -> dict[str, npt.NDArray[np.float64]]:
+    """Mean and std across sliding windows of the spectral features of each window.
+
+    Windows of each size start every `hop_size` tokens (default: half the
+    window). A document shorter than the window counts as one window of its
+    own length; windows shorter than 2 tokens are skipped, and a document
+    without windows gets 0 for every feature (as in FourierDeepDive).
+
+    Returns:
+        {feature}_w{size}_mean / _std for the features of `spectrum_features`
+        (energy ratios named fft_energy_ratio_cut{c:.2f}_w{size}_...), and
+        num_windows_w{size}
+    """
+    values, offsets = as_ragged(series)
+    lengths = np.diff(offsets)
+    n_docs = len(lengths)
+    features: dict[str, npt.NDArray[np.float64]] = {}
+
+    for window in window_sizes:
+        hop = hop_size or max(1, window // 2)
+        n_windows = np.where(lengths >= window, (lengths - window) // hop + 1, 0)
+        full_docs = np.repeat(np.arange(n_docs), n_windows)
+        first_window = np.repeat(np.cumsum(n_windows) - n_windows, n_windows)
+        starts = offsets[full_docs] + hop * (np.arange(len(full_docs)) - first_window)
+
+        #   All full windows share one length: one batched transform
+        n_bins = window // 2 + 1
+        spectra = np.empty((len(starts), n_bins), dtype=np.float64)
+        chunk = max(1, MAX_BATCH_ELEMENTS // window)
+        for start in range(0, len(starts), chunk):
+            rows = values[starts[start : start + chunk][:, None] + np.arange(window)]
+            spectra[start : start + chunk] = _batched_power(rows)
+        window_features = spectrum_features(
+            spectra.ravel(), np.arange(len(starts) + 1, dtype=np.int64) * n_bins, frac_cuts
+        )
+
+        #   Documents shorter than the window are one window of their own length
+        short_docs = np.flatnonzero((lengths < window) & (lengths >= 2))
+        if len(short_docs):
+            short_values, short_offsets = as_ragged(
+                [values[offsets[d] : offsets[d + 1]] for d in short_docs.tolist()]
+            )
+            short_features = spectral_features(
+                RaggedArray(short_values, short_offsets, []), frac_cuts
+            )
+            window_features = {
+                name: np.concatenate([window_features[name], short_features[name]])
+                for name in window_features
+            }
+        window_docs = np.concatenate([full_docs, short_docs])
+
+        features[f"num_windows_w{window}"] = np.bincount(window_docs, minlength=n_docs).astype(
+            np.float64
+        )
+        for name, window_values in window_features.items():
+            if name.startswith("fft_high_energy_ratio_cut"):
+                cut = float(name.removeprefix("fft_high_energy_ratio_cut"))
+                name = f"fft_energy_ratio_cut{cut:.2f}"
+            mean, std = _per_document_moments(window_docs, window_values, n_docs)
+            features[f"{name}_w{window}_mean"] = mean
+            features[f"{name}_w{window}_std"] = std
+    return features
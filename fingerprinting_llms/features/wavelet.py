@@ -0,0 +1,235 @@
+"""
+Wavelet features of logprob series, computed for many documents at once.
+
+`extract_features_from_logp` in the Burstiness notebooks calls
+`wavelet_decomp_features` once per wavelet and document: each call re-centres
+the series, runs `pywt.wavedec`, and concatenates the detail coefficients to
+histogram them and take their kurtosis. Here:
+
+  - each series is centred once, and documents of equal length are decomposed
+    together (`pywt.wavedec` along the rows of a 2D batch) for every wavelet,
+  - the detail coefficients of a batch are joined once into a 2D array, and
+    level energies, the 64-bin histogram and the moments are row-wise reductions
+    of it (no per-document concatenation, `np.histogram` or temporary lists),
+  - batches run in a thread or process pool.
+
+Features per wavelet `{w}` (as in the notebooks; NaN where the notebook would
+leave the feature out, e.g. levels a short document does not have):
+  - {w}_wavelet_hf_ratio : detail energy / total energy
+  - {w}_detailL{i}_ratio : energy of detail level i (1 = coarsest) / total energy
+  - {w}_detail_entropy   : entropy of a 64-bin histogram of all detail coefficients
+  - {w}_detail_kurt      : excess kurtosis of all detail coefficients
+
+Usage:
+    series = load_many(HUMAN_ROOT_LLAMA, dtype=np.float64, ragged=True)
+    features = wavelet_features(series, wavelets=WAVELETS_TO_TRY, max_levels=5)
+"""
+
+import logging
+import os
+from collections.abc import Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import numpy.typing as npt
+import pywt
+
+from fingerprinting_llms.features.segments import (
+    as_ragged,
+    equal_length_batches,
+    segment_rows,
+)
+from fingerprinting_llms.features.spectral import MAX_BATCH_ELEMENTS
+from fingerprinting_llms.score.bulk import RaggedArray
+
+logger = logging.getLogger(__name__)
+
+WAVELETS_TO_TRY = ("db2", "db4", "db8", "sym4", "coif1", "bior3.3")
+HISTOGRAM_BINS = 64
+_EPS = 1e-12
+
+
+def wavelet_levels(length: int, wavelet: str | pywt.Wavelet, max_levels: int = 5) -> int:
+    """Decomposition level the notebooks use for a series of `length`."""
+    wavelet = pywt.Wavelet(wavelet) if isinstance(wavelet, str) else wavelet
+    return min(max_levels, max(1, pywt.dwt_max_level(length, wavelet.dec_len)))
+
+
+def feature_names(wavelets: Sequence[str] = WAVELETS_TO_TRY, max_levels: int = 5) -> list[str]:
+    """Every feature `wavelet_features` can return, in order."""
+    names = []
+    for wavelet in wavelets:
+        names.append(f"{wavelet}_wavelet_hf_ratio")
+        names.extend(f"{wavelet}_detailL{i}_ratio" for i in range(1, max_levels + 1))
+        names.extend([f"{wavelet}_detail_entropy", f"{wavelet}_detail_kurt"])
+    return names
+
+
+# -----------------------------------------------------------------------------
+# Detail-coefficient statistics, per row
+# -----------------------------------------------------------------------------
+def _histogram_entropy(detail: np.ndarray, n_bins: int = HISTOGRAM_BINS) -> np.ndarray:
+    """Entropy of the n_bins-bin histogram of each row of `detail`.
+
+    Bins are `np.histogram`'s: equal-width over the row's [min, max] (widened
+    by 0.5 on each side when min == max), the last bin closed.
+    """
+    n_rows = detail.shape[0]
+    lo = detail.min(axis=1)
+    hi = detail.max(axis=1)
+    flat = lo == hi
+    lo = np.where(flat, lo - 0.5, lo)
+    hi = np.where(flat, hi + 0.5, hi)
+    #   Edges as np.linspace computes them, so values on an edge are binned alike
+    edges = np.arange(n_bins + 1) * ((hi - lo) / n_bins)[:, None] + lo[:, None]
+    edges[:, -1] = hi
+
+    index = ((detail - lo[:, None]) * (n_bins / (hi - lo))[:, None]).astype(np.int64)
+    np.clip(index, 0, n_bins - 1, out=index)
+    index += (np.arange(n_rows) * (n_bins + 1))[:, None]
+    edges = edges.ravel()
+    index -= detail < edges[index]
+    index += (detail >= edges[index + 1]) & ((index + 1) % (n_bins + 1) != n_bins)
+    index -= (np.arange(n_rows))[:, None]
+
+    counts = np.bincount(index.ravel(), minlength=n_rows * n_bins).reshape(n_rows, n_bins)
+    #   np.histogram(density=True) / its sum is counts / n, up to 1e-12
+    p = counts / detail.shape[1]
+    return -np.sum(p * np.log(p + _EPS), axis=1)
+
+
+def _excess_kurtosis(detail: np.ndarray) -> np.ndarray:
+    """Excess kurtosis m4 / m2^2 - 3 of each row of `detail` (0 where m2 ~ 0)."""
+    squared = detail - detail.mean(axis=1, keepdims=True)
+    squared *= squared
+    m2 = squared.mean(axis=1)
+    m4 = np.einsum("ij,ij->i", squared, squared) / detail.shape[1]
+    return np.where(m2 > _EPS, m4 / (m2 * m2 + _EPS) - 3.0, 0.0)
+
+
+# -----------------------------------------------------------------------------
+# Batches
+# -----------------------------------------------------------------------------
+def _decompose(rows: np.ndarray, wavelet: pywt.Wavelet, max_levels: int, mode: str) -> list:
+    level = wavelet_levels(rows.shape[1], wavelet, max_levels)
+    return pywt.wavedec(rows, wavelet=wavelet, level=level, mode=mode, axis=1)
+
+
+def _coefficient_features(name: str, coeffs: list[np.ndarray]) -> dict[str, np.ndarray]:
+    """Features of wavelet `name` from the 2D `pywt.wavedec` coefficients of centred rows."""
+    #   One (rows x all detail coefficients) array shared by every statistic
+    detail = np.concatenate(coeffs[1:], axis=1)
+    level_ends = np.cumsum([d.shape[1] for d in coeffs[1:]])[:-1]
+    detail_energy = np.add.reduceat(detail * detail, np.r_[0, level_ends], axis=1)
+    total = np.einsum("ij,ij->i", coeffs[0], coeffs[0]) + detail_energy.sum(axis=1)
+    #   The notebooks return no features at all for a zero-energy series
+    valid = total > 0
+    total = np.where(valid, total, np.nan)
+
+    features = {f"{name}_wavelet_hf_ratio": detail_energy.sum(axis=1) / total}
+    for i in range(len(coeffs) - 1):
+        features[f"{name}_detailL{i + 1}_ratio"] = detail_energy[:, i] / total
+    features[f"{name}_detail_entropy"] = np.where(valid, _histogram_entropy(detail), np.nan)
+    features[f"{name}_detail_kurt"] = np.where(valid, _excess_kurtosis(detail), np.nan)
+    return features
+
+
+def _batch_features(
+    rows: np.ndarray,
+    wavelets: Sequence[str],
+    max_levels: int,
+    mode: str,
+) -> dict[str, np.ndarray]:
+    """Features of the rows of a 2D array of equal-length series (NaN where undefined)."""
+    rows = rows - rows.mean(axis=1, keepdims=True)
+    features: dict[str, np.ndarray] = {}
+    for name in wavelets:
+        coeffs = _decompose(rows, pywt.Wavelet(name), max_levels, mode)
+        features |= _coefficient_features(name, coeffs)
+    return features
+
+
+def wavelet_decomposition(
+    values: np.ndarray,
+    offsets: npt.NDArray[np.int64],
+    wavelet: str,
+    max_levels: int = 5,
+    mode: str = "symmetric",
+) -> list[tuple[npt.NDArray[np.int64], list[np.ndarray]]]:
+    """`pywt.wavedec` coefficients of every document, per batch of equal length.
+
+    Documents are decomposed as given; centre them first for the notebook
+    features (see `decomposition_features`).
+
+    Returns:
+        [(document indices, [cA_n, cD_n, ..., cD_1] as 2D arrays, one row per
+        document)] for each batch
+    """
+    w = pywt.Wavelet(wavelet)
+    return [
+        (batch, _decompose(segment_rows(values, offsets, batch, length), w, max_levels, mode))
+        for length, batch in equal_length_batches(offsets, MAX_BATCH_ELEMENTS)
+    ]
+
+
+def decomposition_features(
+    decomposition: list[tuple[npt.NDArray[np.int64], list[np.ndarray]]],
+    n_docs: int,
+    wavelet: str,
+    max_levels: int = 5,
+) -> dict[str, npt.NDArray[np.float64]]:
+    """Features of `wavelet` from `wavelet_decomposition` of the centred series."""
+    features = {name: np.full(n_docs, np.nan) for name in feature_names([wavelet], max_levels)}
+    for batch, coeffs in decomposition:
+        for name, batch_values in _coefficient_features(wavelet, coeffs).items():
+            features[name][batch] = batch_values
+    return features
+
+
+def wavelet_features(
+    series: RaggedArray | Sequence[npt.ArrayLike],
+    wavelets: Sequence[str] = WAVELETS_TO_TRY,
+    max_levels: int = 5,
+    mode: str = "symmetric",
+    workers: int | None = None,
+    processes: bool = False,
+) -> dict[str, npt.NDArray[np.float64]]:
+    """Wavelet features of every document, for every wavelet.
+
+    Args:
+        series: Logprob series, as a RaggedArray or a list of 1D arrays
+        wavelets: pywt wavelet names
+        max_levels: Deepest decomposition level (fewer for short series)
+        mode: pywt signal extension mode
+        workers: Pool size (default: the number of CPUs)
+        processes: Use a process pool instead of threads
+
+    Returns:
+        {feature name: array with one value per document}, for every name in
+        `feature_names(wavelets, max_levels)`; empty documents get NaN
+
+    Raises:
+        ValueError: for an unknown wavelet name.
+    """
+    for name in wavelets:
+        pywt.Wavelet(name)
+    values, offsets = as_ragged(series)
+    n_docs = len(offsets) - 1
+    features = {name: np.full(n_docs, np.nan) for name in feature_names(wavelets, max_levels)}
+
+    batches = list(equal_length_batches(offsets, MAX_BATCH_ELEMENTS))
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"Wavelet features of {n_docs} documents in {len(batches)} batches")
+    executor: Executor = (
+        ProcessPoolExecutor(max_workers=workers) if processes else ThreadPoolExecutor(workers)
+    )
+    with executor:
+        results = executor.map(
+            _batch_features,
+            (segment_rows(values, offsets, batch, length) for length, batch in batches),
+            *([value] * len(batches) for value in (tuple(wavelets), max_levels, mode)),
+        )
+        for (_, batch), batch_features in zip(batches, results, strict=True):
+            for name, batch_values in batch_features.items():
+                features[name][batch] = batch_values
+    return features
@@ -0,0 +1,60 @@
+"""
+Atomic file writes.
+
+Every writer goes to its own temporary file next to the destination (unique per
+call, so concurrent writers of one path in the same process or in different
+processes never share it), which is flushed, fsynced and renamed into place.
+Readers therefore see either the old file or the complete new one, and a killed
+run never leaves a truncated file behind.
+
+Usage:
+    with atomic_write("data/tokens/doc.npz") as f:
+        np.savez(f, token_ids=token_ids)
+
+    atomic_copy("data/cache/logprobs/ab/abcd.npz", "data/tokens/doc.npz")
+"""
+
+import os
+import shutil
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Literal
+
+
+def temporary_path(filepath: str | Path) -> Path:
+    """A fresh hidden temporary path in the directory of `filepath`."""
+    filepath = Path(filepath)
+    return filepath.with_name(f".{filepath.name}.{os.getpid()}.{uuid.uuid4().hex[:12]}.tmp")
+
+
+@contextmanager
+def atomic_write(filepath: str | Path, mode: Literal["w", "wb"] = "wb") -> Iterator[IO[Any]]:
+    """Open a temporary file that replaces `filepath` when the block exits cleanly.
+
+    The parent directory is created if missing. On an exception the temporary
+    file is removed and `filepath` is left untouched.
+
+    Args:
+        filepath: Destination path
+        mode: "wb" for binary or "w" for text
+    """
+    filepath = Path(filepath)
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    tmp_filepath = temporary_path(filepath)
+    try:
+        #   "x": the name is unique, so an existing file means something is wrong
+        with open(tmp_filepath, mode.replace("w", "x")) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filepath, filepath)
+    finally:
+        tmp_filepath.unlink(missing_ok=True)
+
+
+def atomic_copy(src: str | Path, dst: str | Path) -> None:
+    """Copy `src` to `dst` with `atomic_write`."""
+    with open(src, "rb") as f_src, atomic_write(dst) as f_dst:
+        shutil.copyfileobj(f_src, f_dst)
@@ -0,0 +1,360 @@
+"""
+Corpus catalog.
+
+Subsets of the data (dataset, human vs. LLM, author, source model, grading
+model) used to be selected by directory naming conventions and globs such as
+`data/tokens/hc3/human_llama-graded`. The catalog is a SQLite table with one
+row per output file, written by the preprocessing and scoring CLIs as they
+write outputs (`--catalog`), so selecting a subset is an indexed query instead
+of a filesystem walk.
+
+Each row records:
+  - path, kind            : the output file; "text" (cleaned) or "logprobs" (scored)
+  - source_path           : the input it was made from
+  - dataset, label        : e.g. "hc3", "human" / "llm"
+  - author                : e.g. the Reuters C50 author directory
+  - source_model          : the model that wrote the text (None for human text)
+  - grader                : the model that scored it (logprobs only)
+  - n_tokens, n_chars     : document size
+  - content_hash          : SHA-256 of the (source) text, as in the run manifest
+  - mean_logprob, std_logprob, top1_fraction : summary statistics (logprobs only)
+  - stats                 : JSON of any other per-document statistics
+
+Usage:
+    catalog = Catalog("data/catalog.sqlite")
+    paths = catalog.paths(dataset="hc3", grader="llama70b", min_tokens=64)
+    train = catalog.balanced("label", n=50_000, dataset="hc3", grader="llama70b", seed=0)
+    catalog.counts(("dataset", "label"))
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from collections.abc import Iterable
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+logger = logging.getLogger(__name__)
+
+KIND_TEXT = "text"
+KIND_LOGPROBS = "logprobs"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    path          TEXT PRIMARY KEY,
+    kind          TEXT NOT NULL,
+    source_path   TEXT,
+    dataset       TEXT,
+    label         TEXT,
+    author        TEXT,
+    source_model  TEXT,
+    grader        TEXT,
+    n_tokens      INTEGER,
+    n_chars       INTEGER,
+    content_hash  TEXT,
+    mean_logprob  REAL,
+    std_logprob   REAL,
+    top1_fraction REAL,
+    stats         TEXT,
+    updated_at    REAL
+);
+CREATE INDEX IF NOT EXISTS documents_subset ON documents (kind, dataset, label, grader);
+CREATE INDEX IF NOT EXISTS documents_author ON documents (author);
+CREATE INDEX IF NOT EXISTS documents_source_model ON documents (source_model);
+CREATE INDEX IF NOT EXISTS documents_grader ON documents (grader);
+CREATE INDEX IF NOT EXISTS documents_content_hash ON documents (content_hash);
+"""
+
+#   Columns that `query` and friends accept as equality filters
+FILTER_COLUMNS = ("kind", "dataset", "label", "author", "source_model", "grader", "content_hash")
+
+
+@dataclass
+class CatalogEntry:
+    path: str
+    kind: str
+    source_path: str | None = None
+    dataset: str | None = None
+    label: str | None = None
+    author: str | None = None
+    source_model: str | None = None
+    grader: str | None = None
+    n_tokens: int | None = None
+    n_chars: int | None = None
+    content_hash: str | None = None
+    mean_logprob: float | None = None
+    std_logprob: float | None = None
+    top1_fraction: float | None = None
+    stats: dict = field(default_factory=dict)
+
+
+_ENTRY_COLUMNS = tuple(f.name for f in fields(CatalogEntry))
+
+
+def logprobs_summary(
+    token_probs: npt.ArrayLike, token_ranks: npt.ArrayLike
+) -> dict[str, float | None]:
+    """mean_logprob, std_logprob and top1_fraction of a document, ignoring NaN positions."""
+    probs = np.asarray(token_probs, dtype=np.float64)
+    probs = probs[np.isfinite(probs)]
+    ranks = np.asarray(token_ranks)
+    return {
+        "mean_logprob": float(probs.mean()) if probs.size else None,
+        "std_logprob": float(probs.std()) if probs.size else None,
+        "top1_fraction": float((ranks == 1).mean()) if ranks.size else None,
+    }
+
+
+def _seeded_order(path: str, seed: int) -> int:
+    """Deterministic pseudo-random sort key of `path` for `seed`."""
+    return zlib.crc32(f"{seed}:{path}".encode())
+
+
+class Catalog:
+    """A SQLite catalog of corpus documents (see module docstring)."""
+
+    def __init__(self, filepath: str | Path):
+        self.filepath = Path(filepath)
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        #   Scoring writes from worker threads; sqlite3 serializes access itself
+        self.connection = sqlite3.connect(self.filepath, check_same_thread=False, timeout=60)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(_SCHEMA)
+        self.connection.create_function("seeded_order", 2, _seeded_order, deterministic=True)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "Catalog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    # -------------------------------------------------------------------------
+    # Writing
+    # -------------------------------------------------------------------------
+    def upsert(self, entries: Iterable[CatalogEntry]) -> int:
+        """Insert or replace entries by path, in one transaction; returns the count."""
+        columns = _ENTRY_COLUMNS + ("updated_at",)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "path")
+        sql = (
+            f"INSERT INTO documents ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT(path) DO UPDATE SET {updates}"
+        )
+        now = time.time()
+        rows = [
+            tuple(json.dumps(v) if k == "stats" else v for k, v in asdict(e).items()) + (now,)
+            for e in entries
+        ]
+        with self.connection:
+            self.connection.executemany(sql, rows)
+        logger.debug(f"Catalogued {len(rows)} documents in {self.filepath}")
+        return len(rows)
+
+    def remove(self, paths: Iterable[str]) -> None:
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM documents WHERE path = ?", [(str(p),) for p in paths]
+            )
+
+    # -------------------------------------------------------------------------
+    # Querying
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _where(
+        min_tokens: int | None = None,
+        max_tokens: int | None = None,
+        **filters,
+    ) -> tuple[str, list]:
+        clauses: list[str] = []
+        params: list = []
+        for column, value in filters.items():
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Unknown filter {column!r}; choose from {FILTER_COLUMNS}")
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set)):
+                clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if min_tokens is not None:
+            clauses.append("n_tokens >= ?")
+            params.append(min_tokens)
+        if max_tokens is not None:
+            clauses.append("n_tokens <= ?")
+            params.append(max_tokens)
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> CatalogEntry:
+        values = {c: row[c] for c in _ENTRY_COLUMNS}
+        values["stats"] = json.loads(values["stats"]) if values["stats"] else {}
+        return CatalogEntry(**values)
+
+    def query(
+        self,
+        limit: int | None = None,
+        seed: int | None = None,
+        min_tokens: int | None = None,
+        max_tokens: int | None = None,
+        **filters,
+    ) -> list[CatalogEntry]:
+        """Entries matching every filter, in path order (or shuffled by `seed`).
+
+        Filters are columns in FILTER_COLUMNS, each a value or a list of
+        values, e.g. `query(dataset="hc3", label=["human", "llm"], min_tokens=64)`.
+        """
+        where, params = self._where(min_tokens=min_tokens, max_tokens=max_tokens, **filters)
+        order = "seeded_order(path, ?)" if seed is not None else "path"
+        sql = f"SELECT * FROM documents {where} ORDER BY {order}"
+        if seed is not None:
+            params.append(seed)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [self._entry(row) for row in self.connection.execute(sql, params)]
+
+    def paths(self, **kwargs) -> list[str]:
+        """Paths of `query(**kwargs)`."""
+        return [entry.path for entry in self.query(**kwargs)]
+
+    def balanced(
+        self,
+        by: str,
+        n: int,
+        seed: int = 0,
+        min_tokens: int | None = None,
+        max_tokens: int | None = None,
+        **filters,
+    ) -> list[CatalogEntry]:
+        """A sample of about `n` entries split evenly across the values of column `by`.
+
+        Each group contributes n // (number of groups) entries, chosen
+        pseudo-randomly but reproducibly for `seed`; groups with fewer entries
+        contribute all of them (a warning is logged).
+        """
+        if by not in FILTER_COLUMNS:
+            raise ValueError(f"Unknown column {by!r}; choose from {FILTER_COLUMNS}")
+        where, params = self._where(min_tokens=min_tokens, max_tokens=max_tokens, **filters)
+        groups = self.connection.execute(
+            f"SELECT {by}, COUNT(*) FROM documents {where} GROUP BY {by}", params
+        ).fetchall()
+        if not groups:
+            return []
+        per_group = n // len(groups)
+        for value, count in groups:
+            if count < per_group:
+                logger.warning(f"Only {count} entries with {by}={value!r}, wanted {per_group}")
+        sql = (
+            f"SELECT * FROM ("
+            f"  SELECT *, ROW_NUMBER() OVER ("
+            f"    PARTITION BY {by} ORDER BY seeded_order(path, ?)"
+            f"  ) AS row_in_group FROM documents {where}"
+            f") WHERE row_in_group <= ? ORDER BY {by}, row_in_group"
+        )
+        rows = self.connection.execute(sql, [seed, *params, per_group])
+        return [self._entry(row) for row in rows]
+
+    def counts(self, by: str | tuple[str, ...] = ("dataset", "label"), **filters) -> dict:
+        """Number of entries per value (or tuple of values) of the `by` columns."""
+        columns = (by,) if isinstance(by, str) else tuple(by)
+        for column in columns:
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Unknown column {column!r}; choose from {FILTER_COLUMNS}")
+        where, params = self._where(**filters)
+        select = ", ".join(columns)
+        rows = self.connection.execute(
+            f"SELECT {select}, COUNT(*) FROM documents {where} GROUP BY {select} ORDER BY {select}",
+            params,
+        )
+        return {
+            (row[0] if len(columns) == 1 else tuple(row[: len(columns)])): row[-1] for row in rows
+        }
+
+
+# -----------------------------------------------------------------------------
+# Entries from outputs
+# -----------------------------------------------------------------------------
+def labels_for(source_path: str, author_from_parent: bool = False, **labels) -> dict:
+    """Label columns of an entry; the author is the source's directory name if asked."""
+    if author_from_parent:
+        labels["author"] = Path(source_path).parent.name
+    return labels
+
+
+def logprobs_entry(
+    path: str,
+    source_path: str | None = None,
+    author_from_parent: bool = False,
+    **labels,
+) -> CatalogEntry:
+    """Catalog entry of a scored LogProbs file, hashing its source text if given.
+
+    Only token_probs and token_ranks are read from the file.
+    """
+    from fingerprinting_llms.score import LogProbs
+    from fingerprinting_llms.score.manifest import hash_text
+
+    logprobs = LogProbs.from_file(path, lazy=True)
+    text = None
+    if source_path is not None and os.path.exists(source_path):
+        with open(source_path) as f:
+            text = f.read()
+    if source_path is not None:
+        labels = labels_for(source_path, author_from_parent, **labels)
+    summary = logprobs_summary(logprobs.token_probs, logprobs.token_ranks)
+    return CatalogEntry(
+        path=str(path),
+        kind=KIND_LOGPROBS,
+        source_path=source_path,
+        n_tokens=logprobs.size,
+        n_chars=len(text) if text is not None else None,
+        content_hash=hash_text(text) if text is not None else None,
+        mean_logprob=summary["mean_logprob"],
+        std_logprob=summary["std_logprob"],
+        top1_fraction=summary["top1_fraction"],
+        **labels,
+    )
+
+
+def catalog_logprobs_outputs(
+    catalog: Catalog,
+    pairs: Iterable[tuple[str, str]],
+    workers: int = 8,
+    author_from_parent: bool = False,
+    **labels,
+) -> int:
+    """Catalog the scored outputs of (input filepath, output filepath) pairs.
+
+    Outputs that cannot be read are logged and left out. Returns the number
+    of entries written.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def entry(pair: tuple[str, str]) -> CatalogEntry | None:
+        source_path, path = pair
+        try:
+            return logprobs_entry(path, source_path, author_from_parent, **labels)
+        except (KeyError, ValueError, OSError) as err:
+            logger.warning(f"Not cataloguing {path}: {err!r}")
+            return None
+
+    with ThreadPoolExecutor(workers) as executor:
+        entries = [e for e in executor.map(entry, list(pairs)) if e is not None]
+    n = catalog.upsert(entries)
+    logger.info(f"Catalogued {n} scored documents in {catalog.filepath}")
+    return n
@@ -5,6 +5,13 @@ from pathlib import Path
 import numpy as np
 import numpy.typing as npt
 from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from fingerprinting_llms.io.atomic import atomic_write
+from fingerprinting_llms.score.encoding import encode_logprobs, encode_ranks, read_column
+
+if TYPE_CHECKING:
+    from fingerprinting_llms.score.vocab import Vocabulary
 
 
 logger = logging.getLogger(__name__)
@@ -14,12 +21,68 @@ logger = logging.getLogger(__name__)
 class LogProbs:
     decoded_tokens: npt.NDArray[np.str_]
     token_ids: npt.NDArray[np.int32]
-    token_ranks: list[np.int32]
-    token_probs: list[np.float32]
+    token_ranks: npt.NDArray[np.int32] | list[np.int32]
+    token_probs: npt.NDArray[np.float32] | list[np.float32]
+    #   Set by chunked scoring: True where the token saw its whole document
+    #   prefix, False where the prefix was cut to the scoring window
+    full_context: npt.NDArray[np.bool_] | None = None
+    #   Set when scored with top_k > 1: the top-k candidates of position i, in
+    #   rank order, are topk_ids / topk_logprobs[topk_offsets[i]:topk_offsets[i + 1]]
+    topk_offsets: npt.NDArray[np.int64] | None = None
+    topk_ids: npt.NDArray[np.int32] | None = None
+    topk_logprobs: npt.NDArray[np.float32] | None = None
 
     @property
     def size(self) -> int:
         return len(self.token_probs)
+
+    @property
+    def has_topk(self) -> bool:
+        return self.topk_offsets is not None
+
+    def _topk(
+        self,
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int32], npt.NDArray[np.float32]]:
+        """(topk_offsets, topk_ids, topk_logprobs), which are set together."""
+        if self.topk_offsets is None or self.topk_ids is None or self.topk_logprobs is None:
+            raise ValueError("LogProbs has no top-k alternatives; score with top_k > 1")
+        return self.topk_offsets, self.topk_ids, self.topk_logprobs
+
+    def _topk_counts(self) -> npt.NDArray[np.int64]:
+        """Number of top-k candidates at each position."""
+        return np.diff(self._topk()[0])
+
+    def top1_logprobs(self) -> npt.NDArray[np.float32]:
+        """Logprob of the most likely token at each position (NaN if none was returned)."""
+        offsets, _, logprobs = self._topk()
+        has_candidates = np.diff(offsets) > 0
+        top1 = np.full(self.size, np.nan, dtype=np.float32)
+        top1[has_candidates] = logprobs[offsets[:-1][has_candidates]]
+        return top1
+
+    def margin(self) -> npt.NDArray[np.float32]:
+        """Logprob gap between the top-1 token and the actual token (0 where it was top-1)."""
+        return self.top1_logprobs() - np.asarray(self.token_probs, dtype=np.float32)
+
+    def entropy(self, renormalize: bool = True) -> npt.NDArray[np.float64]:
+        """Per-position entropy (nats) of the top-k candidate distribution.
+
+        Args:
+            renormalize: If True, the top-k probabilities are rescaled to sum to
+                1 first; if False, the untruncated terms -p log p are summed as
+                returned (a lower bound on the full-vocabulary entropy).
+        """
+        segments = np.repeat(np.arange(self.size), self._topk_counts())
+        logp = self._topk()[2].astype(np.float64)
+        p = np.exp(logp)
+        if renormalize:
+            mass = np.bincount(segments, weights=p, minlength=self.size)
+            log_mass = np.log(mass, out=np.full_like(mass, np.nan), where=mass > 0)
+            logp = logp - log_mass[segments]
+            p = np.exp(logp)
+        return np.bincount(segments, weights=-p * logp, minlength=self.size).astype(
+            np.float64, copy=False
+        )
     
     def from_lists(
         decoded_tokens: list[str],
@@ -48,7 +111,15 @@ class LogProbs:
             token_probs=arr_probs,
         )
 
-    def save_npz(self, filepath: str | Path, *, compressed: bool = True) -> None:
+    def save_npz(
+        self,
+        filepath: str | Path,
+        *,
+        compressed: bool = True,
+        vocab: "Vocabulary | None" = None,
+        logprobs_encoding: str = "float32",
+        ranks_encoding: str = "int32",
+    ) -> None:
         """
         Save this LogProbs instance to a NumPy .npz file.
 
@@ -57,13 +128,35 @@ class LogProbs:
           - token_ids      : np.int32
           - token_ranks    : np.int32
           - token_probs    : np.float32  (use NaN or -inf for missing)
+          - full_context   : np.bool_    (only if set, see chunked scoring)
+          - topk_offsets   : np.int64    (only if set: n + 1 offsets into
+                                          topk_ids / topk_logprobs)
+          - topk_ids       : np.int32
+          - topk_logprobs  : np.float32
+
+        With a `vocab`, decoded_tokens is replaced by the vocabulary's
+        fingerprint and the positions where the tokens differ from it (see
+        fingerprinting_llms.score.vocab); the vocabulary itself must be saved
+        in the file's directory or a parent.
+
+        `logprobs_encoding` ("float16", "q16") and `ranks_encoding` ("uint16")
+        store token_probs / topk_logprobs and token_ranks in 16 bits (see
+        fingerprinting_llms.score.encoding for the error bounds); from_file
+        decodes them back to float32 / int32.
+
+        The file is written atomically: readers see either the previous file or
+        the complete new one.
 
         Args:
             filepath: Output file path (e.g., "data/tokens_npz/<doc_id>.npz").
             compressed: If True, uses np.savez_compressed (smaller on disk).
+            vocab: Optional Vocabulary to store decoded_tokens against.
+            logprobs_encoding: "float32" (exact), "float16" or "q16".
+            ranks_encoding: "int32" or "uint16" (both exact).
 
         Raises:
-            ValueError: if array lengths are inconsistent.
+            ValueError: if array lengths are inconsistent, or for an unknown
+                encoding.
         """
         n = len(self.decoded_tokens)
         if not (len(self.token_ids) == len(self.token_ranks) == len(self.token_probs) == n):
@@ -73,30 +166,70 @@ class LogProbs:
                 f"token_ranks={len(self.token_ranks)}, "
                 f"token_probs={len(self.token_probs)}"
             )
+        if self.full_context is not None and len(self.full_context) != n:
+            raise ValueError(
+                f"Inconsistent lengths: decoded_tokens={n}, full_context={len(self.full_context)}"
+            )
+        optional: dict[str, Any] = {}
+        if self.full_context is not None:
+            optional["full_context"] = np.asarray(self.full_context, dtype=np.bool_)
+        if self.has_topk:
+            topk_offsets, topk_ids, topk_logprobs = self._topk()
+            if len(topk_offsets) != n + 1:
+                raise ValueError(
+                    f"Inconsistent lengths: decoded_tokens={n}, topk_offsets={len(topk_offsets)}"
+                )
+            optional["topk_offsets"] = np.asarray(topk_offsets, dtype=np.int64)
+            optional["topk_ids"] = np.asarray(topk_ids, dtype=np.int32)
+            optional |= encode_logprobs("topk_logprobs", topk_logprobs, logprobs_encoding)
+        tokens_arrays: dict[str, Any]
+        if vocab is not None:
+            positions, tokens = vocab.overrides(self)
+            tokens_arrays = {"vocab_hash": np.asarray(vocab.fingerprint)}
+            if len(positions):
+                tokens_arrays["decoded_override_positions"] = positions
+                tokens_arrays["decoded_override_tokens"] = tokens
+        else:
+            tokens_arrays = {"decoded_tokens": self.decoded_tokens}
 
         filepath = Path(filepath)
+        if filepath.suffix != ".npz":
+            #   Match np.savez, which appends the extension to bare paths
+            filepath = filepath.with_name(f"{filepath.name}.npz")
         filepath.parent.mkdir(parents=True, exist_ok=True)
 
         saver = np.savez_compressed if compressed else np.savez
         logger.info(f"Saving to {filepath} with compressed {compressed}")
         dirpath = os.path.dirname(filepath)
         os.makedirs(dirpath, exist_ok=True)
-        saver(
-            filepath,
-            decoded_tokens=self.decoded_tokens,
-            token_ids=self.token_ids,
-            token_ranks=self.token_ranks,
-            token_probs=self.token_probs,
-        )
+        arrays: dict[str, Any] = {
+            **tokens_arrays,
+            "token_ids": self.token_ids,
+            **encode_ranks("token_ranks", self.token_ranks, ranks_encoding),
+            **encode_logprobs("token_probs", self.token_probs, logprobs_encoding),
+            **optional,
+        }
+        #   A killed run or a concurrent writer never leaves a truncated .npz behind
+        with atomic_write(filepath) as f:
+            saver(f, **arrays)
 
 
     @staticmethod
-    def from_file(path: str | Path) -> "LogProbs":
+    def from_file(
+        path: str | Path,
+        lazy: bool = False,
+        vocab: "Vocabulary | None" = None,
+    ) -> "LogProbs":
         """
         Load a LogProbs instance from a NumPy .npz file created by `save_npz`.
 
         Args:
             path: Path to the .npz file.
+            lazy: If True, return a LazyLogProbs that reads each array on first
+                access, memory-mapping arrays saved with compressed=False.
+                Lengths are then not checked up front.
+            vocab: Vocabulary of a file saved with one; by default it is looked
+                up next to the file or in a parent directory.
 
         Returns:
             LogProbs: reconstructed object.
@@ -109,16 +242,28 @@ class LogProbs:
         p = Path(path)
         if not p.exists():
             raise FileNotFoundError(p)
+        if lazy:
+            from fingerprinting_llms.score.lazy import LazyLogProbs
+
+            return LazyLogProbs(p, vocab=vocab)
 
         with np.load(p) as z:
             # Required arrays
             try:
-                decoded_tokens = z["decoded_tokens"]
                 token_ids = z["token_ids"]
-                token_ranks = z["token_ranks"]
-                token_probs = z["token_probs"]
+                if "decoded_tokens" not in z.files and "vocab_hash" in z.files:
+                    decoded_tokens = _decode_interned(p, z, token_ids, vocab)
+                else:
+                    decoded_tokens = z["decoded_tokens"]
+                token_ranks = read_column(z, "token_ranks")
+                token_probs = read_column(z, "token_probs")
             except KeyError as e:
                 raise KeyError(f"Missing array in NPZ: {e}") from e
+            full_context = z["full_context"] if "full_context" in z.files else None
+            topk = {
+                key: read_column(z, key) if key in z.files else None
+                for key in ("topk_offsets", "topk_ids", "topk_logprobs")
+            }
 
         n = len(decoded_tokens)
         if not (len(token_ids) == len(token_ranks) == len(token_probs) == n):
@@ -133,4 +278,25 @@ class LogProbs:
             token_ids=token_ids,
             token_ranks=token_ranks,
             token_probs=token_probs,
+            full_context=full_context,
+            **topk,
         )
+
+
+def _decode_interned(
+    path: Path,
+    z,
+    token_ids: npt.NDArray[np.int32],
+    vocab: "Vocabulary | None" = None,
+) -> npt.NDArray[np.str_]:
+    """decoded_tokens of a file saved against a vocabulary (`z` is its open NpzFile)."""
+    from fingerprinting_llms.score.vocab import find_vocabulary
+
+    fingerprint = z["vocab_hash"].item()
+    if vocab is None:
+        vocab = find_vocabulary(path, fingerprint)
+    elif vocab.fingerprint != fingerprint:
+        raise ValueError(f"{path} was saved with vocabulary {fingerprint}, not {vocab.fingerprint}")
+    if "decoded_override_positions" not in z.files:
+        return vocab.decode(token_ids)
+    return vocab.decode(token_ids, z["decoded_override_positions"], z["decoded_override_tokens"])
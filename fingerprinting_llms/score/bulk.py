@@ -0,0 +1,220 @@
+"""
+Parallel bulk loading of LogProbs columns.
+
+Every analysis starts by loading one or two columns (usually `token_probs`) of
+every document in a tree. `load_many` finds the files, reads only the requested
+columns (see `fingerprinting_llms.score.lazy`) in a thread or process pool, and
+returns one array per document, either as a list or packed into a
+`RaggedArray`. Decompression and .npy parsing run in the workers, so loading
+uses all cores instead of one. A corpus store file is read directly instead.
+
+Usage:
+    series = load_many("data/tokens/human_llama-graded/hc3", min_length=64, dtype=np.float64)
+    ragged = load_many(HUMAN_ROOT_LLAMA, ragged=True)           # .values, .offsets, .paths
+    columns = load_many(root, columns=("token_probs", "token_ranks"))   # {column: [arrays]}
+"""
+
+import logging
+import os
+import zipfile
+from collections.abc import Iterator, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.lazy import LazyLogProbs
+from fingerprinting_llms.score.store import CorpusStore, find_npz_files
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RaggedArray:
+    """Variable-length arrays packed end to end: item i is values[offsets[i]:offsets[i + 1]]."""
+
+    values: np.ndarray
+    offsets: npt.NDArray[np.int64]
+    paths: list[str]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return self.values[self.offsets[i] : self.offsets[i + 1]]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def lengths(self) -> npt.NDArray[np.int64]:
+        return np.diff(self.offsets)
+
+    def tolist(self) -> list[np.ndarray]:
+        """Per-item views, as a list."""
+        return np.split(self.values, self.offsets[1:-1]) if len(self) else []
+
+    @staticmethod
+    def from_arrays(arrays: Sequence[npt.ArrayLike], paths: list[str]) -> "RaggedArray":
+        items = [np.asarray(a) for a in arrays]
+        offsets = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum([len(a) for a in items], out=offsets[1:])
+        values = np.concatenate(items) if items else np.empty(0)
+        return RaggedArray(values=values, offsets=offsets, paths=paths)
+
+
+#   Columns `load_many` can read
+_LOGPROBS_COLUMNS = frozenset(f.name for f in fields(LogProbs))
+
+#   What `load_many` returns, by `columns` (one or several) and `ragged`
+Loaded = list[np.ndarray] | dict[str, list[np.ndarray]] | RaggedArray | dict[str, RaggedArray]
+
+
+def _load_columns(
+    filepath: str,
+    columns: tuple[str, ...],
+    min_length: int,
+    max_length: int | None,
+    dtype: npt.DTypeLike | None,
+) -> tuple[np.ndarray, ...] | None:
+    """Requested columns of one file, or None if it is filtered out or unreadable."""
+    try:
+        logprobs = LazyLogProbs(filepath, mmap=False)
+        n = logprobs.size
+        if n < min_length or (max_length is not None and n > max_length):
+            return None
+        arrays = []
+        for column in columns:
+            values = getattr(logprobs, column)
+            if values is None:
+                raise KeyError(f"{column} is not in the file")
+            arrays.append(np.asarray(values, dtype=dtype) if dtype is not None else values)
+        return tuple(arrays)
+    except (KeyError, ValueError, OSError, zipfile.BadZipFile) as err:
+        logger.warning(f"Skipping {filepath}: {err!r}")
+        return None
+
+
+def _load_store(
+    filepath: Path,
+    columns: tuple[str, ...],
+    min_length: int,
+    max_length: int | None,
+    dtype: npt.DTypeLike | None,
+) -> tuple[list[str], list[tuple[np.ndarray, ...]]]:
+    """Requested columns of the documents of a corpus store, filtered by length.
+
+    Raises:
+        ValueError: if a column is not a LogProbs column or is not in the store
+    """
+    store = CorpusStore.load(filepath, mmap=True)
+    for column in columns:
+        if column not in _LOGPROBS_COLUMNS:
+            raise ValueError(f"Unknown column {column!r}; choose from {sorted(_LOGPROBS_COLUMNS)}")
+        if column != "decoded_tokens" and getattr(store, column) is None:
+            raise ValueError(f"Column {column!r} is not in the store {filepath}")
+    lengths = store.lengths()
+    keep = lengths >= min_length
+    if max_length is not None:
+        keep &= lengths <= max_length
+    paths, rows = [], []
+    for i in np.flatnonzero(keep).tolist():
+        arrays = []
+        for column in columns:
+            if column == "decoded_tokens":
+                values = store.decoded_tokens(i)
+            elif column in ("topk_ids", "topk_logprobs", "topk_offsets"):
+                values = store.topk_column(column, i)
+            else:
+                values = store.column(column, i)
+            arrays.append(np.asarray(values, dtype=dtype) if dtype is not None else values)
+        paths.append(str(store.paths[i]))
+        rows.append(tuple(arrays))
+    return paths, rows
+
+
+def load_many(
+    root: str | Path | Sequence[str | Path],
+    columns: str | Sequence[str] = "token_probs",
+    workers: int | None = None,
+    min_length: int = 0,
+    max_length: int | None = None,
+    dtype: npt.DTypeLike | None = None,
+    pattern: str = "**/*.npz",
+    ragged: bool = False,
+    processes: bool = False,
+    return_paths: bool = False,
+) -> Loaded | tuple[Loaded, list[str]]:
+    """Load `columns` of every LogProbs file under `root`, in parallel.
+
+    Args:
+        root: Directory to search with `pattern`, a corpus store file (see
+            `CorpusStore`), or a list of .npz filepaths
+        columns: A LogProbs column name, or several
+        workers: Pool size (default: the number of CPUs)
+        min_length: Skip documents with fewer tokens
+        max_length: Skip documents with more tokens
+        dtype: Convert every array to this dtype (e.g. np.float64)
+        pattern: Glob of the files to load, relative to `root`
+        ragged: Return RaggedArray(s) instead of lists of arrays
+        processes: Use a process pool instead of threads; worth it when
+            decompression of compressed files dominates
+        return_paths: Also return the filepaths (or store paths) loaded, in
+            order; with `ragged` they are in RaggedArray.paths instead
+
+    Returns:
+        For one column name, a list of arrays (or a RaggedArray); for a
+        sequence of columns, a dict of those per column. Documents come back in
+        sorted path order; unreadable files are logged and skipped.
+
+    Raises:
+        ValueError: if `root` is a corpus store without one of `columns`
+    """
+    single = isinstance(columns, str)
+    column_names = (columns,) if isinstance(columns, str) else tuple(columns)
+
+    if isinstance(root, (str, Path)) and Path(root).is_file():
+        paths, rows = _load_store(Path(root), column_names, min_length, max_length, dtype)
+    else:
+        if isinstance(root, (str, Path)):
+            filepaths = [str(p) for p in find_npz_files(root, pattern)]
+        else:
+            filepaths = sorted(str(p) for p in root)
+        workers = workers or os.cpu_count() or 1
+        logger.info(f"Loading {column_names} from {len(filepaths)} files with {workers} workers")
+
+        executor: Executor = (
+            ProcessPoolExecutor(max_workers=workers) if processes else ThreadPoolExecutor(workers)
+        )
+        with executor:
+            results = executor.map(
+                _load_columns,
+                filepaths,
+                *(
+                    [value] * len(filepaths)
+                    for value in (column_names, min_length, max_length, dtype)
+                ),
+                chunksize=max(1, len(filepaths) // (workers * 4)) if processes else 1,
+            )
+            paths, rows = [], []
+            for filepath, row in zip(filepaths, results, strict=True):
+                if row is not None:
+                    paths.append(filepath)
+                    rows.append(row)
+
+    logger.info(f"Loaded {len(rows)} documents")
+    by_column = {column: [row[j] for row in rows] for j, column in enumerate(column_names)}
+    out: Loaded
+    if ragged:
+        by_column_ragged = {
+            column: RaggedArray.from_arrays(arrays, paths) for column, arrays in by_column.items()
+        }
+        out = by_column_ragged[column_names[0]] if single else by_column_ragged
+    else:
+        out = by_column[column_names[0]] if single else by_column
+    if return_paths and not ragged:
+        return out, paths
+    return out
@@ -0,0 +1,193 @@
+"""
+Content-addressed LogProbs cache.
+
+Scored documents are stored as .npz files keyed by a hash of the model identity
+and the exact prompt text, so the same text scored again by the same model (a
+rerun into another output tree, or a duplicate inside a dataset) is a file
+lookup instead of a round-trip to the GPU.
+
+Layout:
+    <cachedir>/<key[:2]>/<key>.npz
+
+The cache can be capped in size; when it grows past the cap, the least recently
+used entries (by file modification time, refreshed on every hit) are evicted.
+
+Usage:
+    cache = LogProbsCache("data/cache/logprobs", max_bytes=50 * 2**30)
+    logprobs = cached_extract_prompt_logprobs(server, model, text, cache=cache)
+"""
+
+import hashlib
+import logging
+import os
+from collections.abc import Callable
+from pathlib import Path
+
+from fingerprinting_llms.io.atomic import atomic_copy
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.extract import EndpointPool, extract_prompt_logprobs
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(model: str, text: str) -> str:
+    """SHA-256 hex digest identifying (model, exact prompt text)."""
+    h = hashlib.sha256()
+    h.update(model.encode("utf-8"))
+    h.update(b"\0")
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+class LogProbsCache:
+    """
+    On-disk cache of LogProbs keyed by (model, text hash).
+
+    Args:
+        cachedir: Directory holding the cache; created if missing.
+        max_bytes: Size cap. When exceeded, least recently used entries are
+            evicted down to `low_watermark` x `max_bytes`. None means unbounded.
+        low_watermark: Fraction of `max_bytes` to evict down to, so eviction
+            does not run on every insert once the cache is full.
+    """
+
+    def __init__(
+        self,
+        cachedir: str | Path,
+        max_bytes: int | None = None,
+        low_watermark: float = 0.9,
+    ):
+        self.cachedir = Path(cachedir)
+        self.cachedir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.low_watermark = low_watermark
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = sum(p.stat().st_size for p in self._entries())
+
+    def _entries(self) -> list[Path]:
+        return list(self.cachedir.glob("*/*.npz"))
+
+    def path_for(self, model: str, text: str) -> Path:
+        key = cache_key(model, text)
+        return self.cachedir / key[:2] / f"{key}.npz"
+
+    def lookup(self, model: str, text: str) -> Path | None:
+        """Path of the cached entry for (model, text), or None on a miss.
+
+        A hit refreshes the entry's modification time for LRU eviction.
+        """
+        path = self.path_for(model, text)
+        if not path.exists():
+            self.misses += 1
+            return None
+        self.hits += 1
+        os.utime(path)
+        return path
+
+    def get(self, model: str, text: str) -> LogProbs | None:
+        """Load the cached LogProbs for (model, text), or None on a miss."""
+        path = self.lookup(model, text)
+        return LogProbs.from_file(path) if path is not None else None
+
+    def put(self, model: str, text: str, logprobs: LogProbs) -> Path:
+        """Store `logprobs` for (model, text), evicting old entries if over the cap.
+
+        An entry that already exists (e.g. written meanwhile by a concurrent
+        scorer of a duplicate text) is kept and counted as a hit.
+        """
+        path = self.path_for(model, text)
+        if not self._refresh(path):
+            self._store(path, lambda: logprobs.save_npz(path))
+        return path
+
+    def put_file(self, model: str, text: str, filepath: str | Path) -> Path:
+        """Store an already saved LogProbs .npz for (model, text) by copying it, as `put`."""
+        path = self.path_for(model, text)
+        if not self._refresh(path):
+            self._store(path, lambda: atomic_copy(filepath, path))
+        return path
+
+    def _refresh(self, path: Path) -> bool:
+        """Refresh the modification time of an existing entry; False if there is none."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        self.hits += 1
+        return True
+
+    def _store(self, path: Path, write: Callable[[], None]) -> None:
+        try:
+            write()
+        except OSError:
+            #   Losing the rename to a concurrent writer of the same key leaves
+            #   an equivalent entry in place
+            if not self._refresh(path):
+                raise
+            return
+        #   Concurrent writers of one key may each count it; evict() recounts from disk
+        self.total_bytes += path.stat().st_size
+        if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def materialize(self, model: str, text: str, output_filepath: str | Path) -> bool:
+        """Copy the cached entry for (model, text) to `output_filepath`.
+
+        Returns:
+            bool: False on a cache miss
+        """
+        path = self.lookup(model, text)
+        if path is None:
+            return False
+        atomic_copy(path, output_filepath)
+        return True
+
+    def evict(self) -> int:
+        """Remove least recently used entries until under the low watermark.
+
+        Returns:
+            int: number of entries removed
+        """
+        if self.max_bytes is None:
+            return 0
+        target = self.low_watermark * self.max_bytes
+        entries = []
+        for path in self._entries():
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        self.total_bytes = total
+        logger.info(f"Evicted {removed} entries from {self.cachedir} ({total} bytes remain)")
+        return removed
+
+
+def cached_extract_prompt_logprobs(
+    server: str | EndpointPool,
+    model: str,
+    text: str,
+    cache: LogProbsCache,
+) -> LogProbs:
+    """`extract_prompt_logprobs` with a cache lookup in front of it.
+
+    Raises:
+        ValueError, ConnectionError: as `extract_prompt_logprobs`
+    """
+    logprobs = cache.get(model, text)
+    if logprobs is not None:
+        return logprobs
+    logprobs = extract_prompt_logprobs(server=server, model=model, text=text)
+    cache.put(model, text, logprobs)
+    return logprobs
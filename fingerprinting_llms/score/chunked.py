@@ -0,0 +1,127 @@
+"""
+Chunked scoring of documents longer than the server's max-model-len.
+
+A tokenized document is split into overlapping token windows that each fit in
+the model's context. Every window is scored independently (and concurrently),
+then the per-position prompt logprobs are stitched back into one LogProbs:
+
+    tokens   : t0 t1 t2 ... t9 t10 t11 ...
+    window 0 : [t0 ............ t7]               keep t1..t7 (full context)
+    window 1 :          [t4 ............ t11]     keep t8..t11 (>= overlap context)
+
+The first window keeps everything it scored; each later window only keeps the
+tokens past the end of the previous window, so every kept token has at least
+`overlap` tokens of context. Tokens from the first window saw their whole
+document prefix and are marked `full_context=True`; the rest are marked False.
+
+The first window starts with the tokenizer's special prefix (BOS), which the
+model always attends to. Later windows are sent with the same prefix in front
+of their tokens, so they are scored like the start of a document; `plan_windows`
+leaves room for it and its positions are dropped before stitching.
+"""
+
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.decode import decode_prompt_logprobs
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TokenWindow:
+    start: int
+    end: int
+    keep_from: int
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+
+def plan_windows(
+    n_tokens: int,
+    window_tokens: int,
+    overlap_tokens: int,
+    prefix_tokens: int = 0,
+) -> list[TokenWindow]:
+    """Split `n_tokens` into overlapping windows of at most `window_tokens`.
+
+    Windows after the first hold at most `window_tokens - prefix_tokens`
+    document tokens, leaving room for the special prefix sent in front of them.
+    The last window is aligned to the end of the document, so it has at least
+    `overlap_tokens` (usually more) of context.
+
+    Raises:
+        ValueError: if the overlap and prefix leave no room for new tokens in a window
+    """
+    later_tokens = window_tokens - prefix_tokens
+    if not 0 <= overlap_tokens < later_tokens:
+        raise ValueError(
+            f"Need 0 <= overlap_tokens < window_tokens - prefix_tokens, got {overlap_tokens}, "
+            f"{window_tokens} and {prefix_tokens}"
+        )
+    windows = [TokenWindow(start=0, end=min(window_tokens, n_tokens), keep_from=0)]
+    while windows[-1].end < n_tokens:
+        start = min(windows[-1].end - overlap_tokens, n_tokens - later_tokens)
+        windows.append(
+            TokenWindow(
+                start=start,
+                end=min(start + later_tokens, n_tokens),
+                keep_from=windows[-1].end,
+            )
+        )
+    return windows
+
+
+def stitch_windows(
+    windows: list[TokenWindow],
+    window_prompt_logprobs: list[list[dict | None]],
+    top_k: int = 1,
+    token_ids: list[int] | None = None,
+) -> LogProbs:
+    """Stitch per-window prompt_logprobs into a single LogProbs.
+
+    Args:
+        windows: Windows from `plan_windows`
+        window_prompt_logprobs: For each window, the prompt_logprobs returned by
+            the server, one entry per token in the window
+        top_k: The windows' `prompt_logprobs` value (see `decode_prompt_logprobs`)
+        token_ids: The tokenized document, used to identify the prompt token
+            among the top-k candidates
+
+    Returns:
+        LogProbs: one entry per document token that has a logprob, with
+            `full_context` marking tokens scored in the first window
+
+    Raises:
+        ValueError: if a window's response does not cover every token in it
+    """
+    stitched: list[dict | None] = []
+    stitched_ids: list[int] = []
+    full_context: list[bool] = []
+    for i, (window, prompt_logprobs) in enumerate(
+        zip(windows, window_prompt_logprobs, strict=True)
+    ):
+        if len(prompt_logprobs) != window.size:
+            raise ValueError(
+                f"Window {i} has {window.size} tokens but {len(prompt_logprobs)} prompt_logprobs"
+            )
+        kept = prompt_logprobs[window.keep_from - window.start :]
+        stitched.extend(kept)
+        if token_ids is not None:
+            stitched_ids.extend(token_ids[window.keep_from : window.end])
+        full_context.extend(i == 0 for p in kept if p is not None)
+
+    logprobs = decode_prompt_logprobs(
+        stitched, top_k=top_k, prompt_token_ids=stitched_ids if token_ids is not None else None
+    )
+    logprobs.full_context = np.asarray(full_context, dtype=np.bool_)
+    logger.info(
+        f"Stitched {len(windows)} windows into {logprobs.size} tokens "
+        f"({int(logprobs.full_context.sum())} with full context)"
+    )
+    return logprobs
@@ -0,0 +1,798 @@
+"""
+Corpus-level scoring.
+
+Scores many documents against a vLLM server from a single process, keeping a
+fixed number of /v1/completions requests in flight over one pooled aiohttp
+session, instead of launching `scripts/score_text.py` once per file.
+
+Pass a `RunManifest` to make a run resumable: documents already scored with
+the same text and model are skipped on rerun.
+
+Pass a `LogProbsCache` to reuse logprobs for texts the same model has already
+scored, in this or any earlier run.
+
+Documents longer than the server's max-model-len can be scored in overlapping
+token windows by passing `window_tokens` (see `chunked`).
+
+Short documents (e.g. HC3 answers) can share requests by passing
+`batch_tokens`: several prompts go in one /v1/completions call and the
+choices are split back into one LogProbs per document (see `PromptBatcher`).
+
+Pass a `ScoringMetrics` to collect request latencies, response sizes and the
+time spent parsing, decoding and writing (see `metrics`).
+
+Documents can be spread over several servers hosting the same model by
+passing a list of server URLs (or an `EndpointPool`) instead of a single URL.
+
+Usage:
+    jobs = build_jobs(find_input_files("data/hc3"), "data/hc3", "data/tokens/hc3")
+    result = run_score_corpus(jobs, server="http://localhost:9001", model=MODEL)
+    result = run_score_corpus(
+        jobs, server=[f"http://localhost:{p}" for p in (9000, 9001, 9002, 9003)], model=MODEL
+    )
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+import aiohttp
+
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.cache import LogProbsCache
+from fingerprinting_llms.score.chunked import plan_windows, stitch_windows
+from fingerprinting_llms.score.decode import (
+    decode_completions_batch,
+    decode_completions_data,
+    loads,
+)
+from fingerprinting_llms.score.extract import (
+    COMPLETIONS_ROUTE,
+    TOKENIZE_ROUTE,
+    TRANSIENT_STATUSES,
+    EndpointPool,
+    backoff_delay,
+    build_completions_request,
+    get_prompt_logprobs,
+    load_text_from_file,
+)
+from fingerprinting_llms.score.manifest import (
+    STATUS_DONE,
+    STATUS_FAILED,
+    RunManifest,
+    hash_text,
+)
+from fingerprinting_llms.score.metrics import (
+    STAGE_DECODE,
+    STAGE_PARSE,
+    STAGE_WRITE,
+    ScoringMetrics,
+    timed,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScoringJob:
+    input_filepath: str
+    output_filepath: str
+
+
+#   Job outcomes, named after the CorpusResult lists they are collected in
+SCORED = "scored"
+CACHED = "cached"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+@dataclass
+class CorpusResult:
+    scored: list[str] = field(default_factory=list)
+    cached: list[str] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        return len(self.scored) + len(self.cached) + len(self.skipped) + len(self.failed)
+
+
+# -----------------------------------------------------------------------------
+# Job discovery
+# -----------------------------------------------------------------------------
+def find_input_files(inputdir: str, extensions: tuple[str, ...] = (".txt",)) -> list[str]:
+    """Recursively find input files under `inputdir` with one of `extensions`."""
+    filepaths = []
+    for root, _, files in os.walk(inputdir):
+        for file in files:
+            if file.endswith(extensions):
+                filepaths.append(os.path.join(root, file))
+    return sorted(filepaths)
+
+
+def read_file_list(filepath: str) -> list[str]:
+    """Read a file list (one path per line, e.g. HUMAN.txt), skipping blank lines."""
+    with open(filepath) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def build_jobs(
+    input_filepaths: list[str],
+    input_root: str,
+    outputdir: str,
+    suffix: str = ".npz",
+) -> list[ScoringJob]:
+    """Map each input file to `outputdir/<path relative to input_root><suffix>`.
+
+    This mirrors the `${FILE/<input_root>/<outputdir>}.npz` substitution used by
+    the per-file scoring loops.
+    """
+    jobs = []
+    for input_filepath in input_filepaths:
+        rel_path = os.path.relpath(input_filepath, input_root)
+        output_filepath = os.path.join(outputdir, rel_path) + suffix
+        jobs.append(ScoringJob(input_filepath=input_filepath, output_filepath=output_filepath))
+    return jobs
+
+
+# -----------------------------------------------------------------------------
+# Scoring
+# -----------------------------------------------------------------------------
+def make_pool(
+    server: str | list[str] | EndpointPool, concurrency: int, **pool_options
+) -> EndpointPool:
+    """Normalize a server URL, list of URLs or pool into an EndpointPool.
+
+    `pool_options` are passed on to a new EndpointPool (e.g. request_timeout).
+    """
+    if isinstance(server, EndpointPool):
+        return server
+    servers = [server] if isinstance(server, str) else list(server)
+    return EndpointPool(servers, max_in_flight=concurrency, **pool_options)
+
+
+async def post_json_async(
+    session: aiohttp.ClientSession,
+    pool: EndpointPool,
+    route: str,
+    body: dict,
+    max_attempts: int = 3,
+    metrics: ScoringMetrics | None = None,
+) -> dict:
+    """POST `body` to `route` on the least-loaded endpoint in `pool`.
+
+    If the endpoint cannot be reached, times out, answers with a transient
+    HTTP status (see TRANSIENT_STATUSES) or returns something that is not JSON,
+    the request is retried after a jittered backoff on the least-loaded
+    endpoint, up to `max_attempts` times. Each attempt is limited to the pool's
+    `request_timeout` and the whole call to its `deadline`. Other error
+    responses (e.g. a prompt longer than max-model-len) are returned as is.
+    Every attempt is recorded in `metrics`, if given.
+
+    Returns:
+        dict: the decoded JSON response
+
+    Raises:
+        ValueError: if `max_attempts` is less than 1
+        ConnectionError: if every attempt failed or the deadline passed
+    """
+    if max_attempts < 1:
+        raise ValueError(f"max_attempts must be at least 1, got {max_attempts}")
+    deadline = time.monotonic() + pool.deadline
+    last_err: Exception | None = None
+    for attempt in range(max_attempts):
+        if attempt > 0:
+            await asyncio.sleep(backoff_delay(attempt - 1, pool.backoff_base, pool.backoff_max))
+        endpoint = pool.acquire()
+        while endpoint is None and time.monotonic() < deadline:
+            #   Wake up for the deadline rather than sleeping through a long drain
+            wait = min(pool.seconds_until_available(), deadline - time.monotonic())
+            await asyncio.sleep(max(0.05, wait))
+            endpoint = pool.acquire()
+        if endpoint is None:
+            break
+
+        start = time.monotonic()
+        timeout = aiohttp.ClientTimeout(total=min(pool.request_timeout, max(1.0, deadline - start)))
+        latency = None
+        raw = b""
+        try:
+            async with session.post(f"{endpoint.server}{route}", json=body, timeout=timeout) as r:
+                raw = await r.read()
+            latency = time.monotonic() - start
+            if r.status in TRANSIENT_STATUSES:
+                raise ConnectionError(f"HTTP {r.status}: {raw[:200]!r}")
+            with timed(metrics, STAGE_PARSE):
+                data = loads(raw)
+        except (aiohttp.ClientError, TimeoutError, ConnectionError, ValueError) as err:
+            pool.release(endpoint, latency=None, ok=False)
+            if metrics is not None:
+                metrics.observe_request(endpoint.server, latency, len(raw), ok=False)
+            logger.warning(f"Request to {endpoint.server} failed: {err!r}")
+            last_err = err
+            continue
+        pool.release(endpoint, latency=latency, ok=True)
+        if metrics is not None:
+            metrics.observe_request(endpoint.server, latency, len(raw), ok=r.status < 400)
+        return data
+    raise ConnectionError(f"Failed after {attempt + 1} attempts: {last_err!r}")
+
+
+async def extract_prompt_logprobs_async(
+    session: aiohttp.ClientSession,
+    pool: EndpointPool,
+    model: str,
+    text: str,
+    max_attempts: int = 3,
+    metrics: ScoringMetrics | None = None,
+    top_k: int = 1,
+) -> LogProbs | None:
+    """Async counterpart of `extract_prompt_logprobs` on a shared session.
+
+    Returns:
+        LogProbs | None: None if the server reported an error for this text
+    """
+    data = await post_json_async(
+        session,
+        pool,
+        COMPLETIONS_ROUTE,
+        build_completions_request(model=model, text=text, top_k=top_k),
+        max_attempts=max_attempts,
+        metrics=metrics,
+    )
+    with timed(metrics, STAGE_DECODE):
+        return decode_completions_data(data, top_k=top_k)
+
+
+async def extract_prompt_logprobs_chunked_async(
+    session: aiohttp.ClientSession,
+    pool: EndpointPool,
+    model: str,
+    text: str,
+    window_tokens: int,
+    overlap_tokens: int,
+    max_attempts: int = 3,
+    metrics: ScoringMetrics | None = None,
+    top_k: int = 1,
+) -> LogProbs | None:
+    """Score `text` in overlapping token windows of at most `window_tokens`.
+
+    The text is tokenized by the server, every window is scored concurrently,
+    and the results are stitched into one LogProbs whose `full_context` marks
+    tokens that saw their whole document prefix (see `chunked`). Windows after
+    the first are sent behind the tokenizer's special prefix (BOS), as the
+    first window is.
+
+    Returns:
+        LogProbs | None: None if the server reported an error for any window
+    """
+    data, empty = await asyncio.gather(
+        *(
+            post_json_async(
+                session,
+                pool,
+                TOKENIZE_ROUTE,
+                {"model": model, "prompt": prompt},
+                max_attempts=max_attempts,
+                metrics=metrics,
+            )
+            for prompt in (text, "")
+        )
+    )
+    for response in (data, empty):
+        if "tokens" not in response:
+            logger.warning(f"Error from server while tokenizing: {response}")
+            return None
+    tokens = data["tokens"]
+    #   What the tokenizer puts in front of any text, e.g. [BOS]
+    prefix = empty["tokens"] if tokens[: len(empty["tokens"])] == empty["tokens"] else []
+
+    windows = plan_windows(len(tokens), window_tokens, overlap_tokens, prefix_tokens=len(prefix))
+    responses = await asyncio.gather(
+        *(
+            post_json_async(
+                session,
+                pool,
+                COMPLETIONS_ROUTE,
+                build_completions_request(
+                    model=model,
+                    text=(prefix if w.start > 0 else []) + tokens[w.start : w.end],
+                    top_k=top_k,
+                ),
+                max_attempts=max_attempts,
+                metrics=metrics,
+            )
+            for w in windows
+        )
+    )
+    window_prompt_logprobs: list[list[dict | None]] = []
+    for window, response in zip(windows, responses, strict=True):
+        prompt_logprobs = get_prompt_logprobs(response)
+        if prompt_logprobs is None:
+            return None
+        #   Drop the positions of the prefix sent in front of later windows
+        window_prompt_logprobs.append(prompt_logprobs[len(prefix) if window.start > 0 else 0 :])
+    with timed(metrics, STAGE_DECODE):
+        return stitch_windows(windows, window_prompt_logprobs, top_k=top_k, token_ids=tokens)
+
+
+# -----------------------------------------------------------------------------
+# Batching
+# -----------------------------------------------------------------------------
+#   Rough characters per token for English text with Llama-3 and Mixtral
+#   tokenizers; only used to pack batches, never to cut text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap estimate of the number of tokens in `text`, without asking the server."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+async def extract_prompt_logprobs_batch_async(
+    session: aiohttp.ClientSession,
+    pool: EndpointPool,
+    model: str,
+    texts: list[str],
+    max_attempts: int = 3,
+    metrics: ScoringMetrics | None = None,
+    top_k: int = 1,
+) -> list[LogProbs | None]:
+    """Score several texts in one /v1/completions request, one LogProbs per text.
+
+    The server rejects the whole request if any prompt is invalid (e.g. longer
+    than max-model-len), so a rejected batch is split in half and each half is
+    retried, until the offending documents are isolated and come back as None.
+
+    Returns:
+        list[LogProbs | None]: in the order of `texts`; None for texts the
+            server could not score
+    """
+    data = await post_json_async(
+        session,
+        pool,
+        COMPLETIONS_ROUTE,
+        build_completions_request(model=model, text=texts, top_k=top_k),
+        max_attempts=max_attempts,
+        metrics=metrics,
+    )
+    with timed(metrics, STAGE_DECODE):
+        results = decode_completions_batch(data, top_k=top_k)
+    if results is not None and len(results) == len(texts):
+        return results
+    if len(texts) == 1:
+        return [None]
+
+    logger.info(f"Batch of {len(texts)} documents rejected; retrying in halves")
+    middle = len(texts) // 2
+    halves = await asyncio.gather(
+        *(
+            extract_prompt_logprobs_batch_async(
+                session, pool, model, half, max_attempts=max_attempts, metrics=metrics, top_k=top_k
+            )
+            for half in (texts[:middle], texts[middle:])
+        )
+    )
+    return halves[0] + halves[1]
+
+
+class PromptBatcher:
+    """Packs concurrently submitted short documents into multi-prompt requests.
+
+    Documents passed to `score` are held for up to `max_wait` seconds and sent
+    together once the batch holds `max_batch_size` documents or adding the next
+    one would exceed `max_batch_tokens` (estimated). Each caller gets back its
+    own document's LogProbs, or None if the server could not score it.
+
+    Args:
+        pool: Endpoints to send batches to
+        model: Model name
+        max_batch_tokens: Estimated token budget per request (see `estimate_tokens`)
+        max_batch_size: Maximum documents per request
+        max_wait: Seconds to wait for more documents before sending a partial batch
+        metrics: Optional ScoringMetrics
+        top_k: Top-k candidates to keep per position (see `decode_prompt_logprobs`)
+    """
+
+    def __init__(
+        self,
+        pool: EndpointPool,
+        model: str,
+        max_batch_tokens: int = 8192,
+        max_batch_size: int = 32,
+        max_wait: float = 0.01,
+        metrics: ScoringMetrics | None = None,
+        top_k: int = 1,
+    ):
+        self.pool = pool
+        self.model = model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.metrics = metrics
+        self.top_k = top_k
+        self.batches_sent = 0
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._pending_tokens = 0
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def fits(self, text: str) -> bool:
+        """Whether `text` is short enough to share a request with other documents."""
+        return estimate_tokens(text) <= self.max_batch_tokens // 2
+
+    async def score(self, session: aiohttp.ClientSession, text: str) -> LogProbs | None:
+        n_tokens = estimate_tokens(text)
+        if self._pending and self._pending_tokens + n_tokens > self.max_batch_tokens:
+            self._flush(session)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        self._pending_tokens += n_tokens
+        if len(self._pending) >= self.max_batch_size:
+            self._flush(session)
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.max_wait, self._flush, session
+            )
+        return await future
+
+    def _flush(self, session: aiohttp.ClientSession) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        task = asyncio.create_task(self._send(session, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(
+        self, session: aiohttp.ClientSession, batch: list[tuple[str, asyncio.Future]]
+    ) -> None:
+        self.batches_sent += 1
+        try:
+            results = await extract_prompt_logprobs_batch_async(
+                session,
+                self.pool,
+                self.model,
+                [text for text, _ in batch],
+                metrics=self.metrics,
+                top_k=self.top_k,
+            )
+        except Exception as err:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(err)
+            return
+        for (_, future), logprobs in zip(batch, results, strict=True):
+            if not future.done():
+                future.set_result(logprobs)
+
+
+def topk_identity(model: str, top_k: int) -> str:
+    """Model identity for outputs that carry top-k candidates (unchanged for top_k=1)."""
+    return model if top_k <= 1 else f"{model}#top{top_k}"
+
+
+def cache_identity(
+    model: str, window_tokens: int | None, overlap_tokens: int, top_k: int = 1
+) -> str:
+    """Model identity for the LogProbs cache.
+
+    Chunked outputs differ from whole-document ones, and top-k outputs carry
+    extra arrays, so they are cached under the model name plus those settings.
+    """
+    model = topk_identity(model, top_k)
+    if window_tokens is None:
+        return model
+    return f"{model}@{window_tokens}/{overlap_tokens}"
+
+
+async def score_text_async(
+    session: aiohttp.ClientSession,
+    pool: EndpointPool,
+    model: str,
+    text: str,
+    window_tokens: int | None = None,
+    overlap_tokens: int = 0,
+    metrics: ScoringMetrics | None = None,
+    top_k: int = 1,
+) -> LogProbs | None:
+    """Score `text` whole, or in overlapping windows if `window_tokens` is set."""
+    if window_tokens is None:
+        return await extract_prompt_logprobs_async(
+            session=session, pool=pool, model=model, text=text, metrics=metrics, top_k=top_k
+        )
+    return await extract_prompt_logprobs_chunked_async(
+        session=session,
+        pool=pool,
+        model=model,
+        text=text,
+        window_tokens=window_tokens,
+        overlap_tokens=overlap_tokens,
+        metrics=metrics,
+        top_k=top_k,
+    )
+
+
+async def _score_job(
+    session: aiohttp.ClientSession,
+    pool: EndpointPool,
+    model: str,
+    job: ScoringJob,
+    manifest: RunManifest | None = None,
+    cache: LogProbsCache | None = None,
+    cache_only: bool = False,
+    window_tokens: int | None = None,
+    overlap_tokens: int = 0,
+    metrics: ScoringMetrics | None = None,
+    batcher: PromptBatcher | None = None,
+    top_k: int = 1,
+) -> str:
+    """Score one job and return its status: "scored", "cached", "skipped" or "failed".
+
+    With a `batcher`, short documents share requests with other jobs' documents.
+    """
+    text = await asyncio.to_thread(load_text_from_file, job.input_filepath)
+    text_hash = hash_text(text)
+    run_model = topk_identity(model, top_k)
+    if manifest is not None and manifest.is_done(
+        job.input_filepath, job.output_filepath, text_hash, run_model
+    ):
+        return SKIPPED
+
+    cache_model = cache_identity(model, window_tokens, overlap_tokens, top_k=top_k)
+    if cache is not None:
+        try:
+            hit = await asyncio.to_thread(cache.materialize, cache_model, text, job.output_filepath)
+        except OSError as err:
+            #   An unreadable entry or an unwritable output: score it as a miss
+            logger.warning(f"Cache lookup failed for {job.input_filepath}: {err!r}")
+            hit = False
+        if hit or cache_only:
+            if not hit:
+                logger.warning(f"Not in cache: {job.input_filepath}")
+            status = STATUS_DONE if hit else STATUS_FAILED
+            if manifest is not None:
+                manifest.record(
+                    job.input_filepath, job.output_filepath, text_hash, run_model, status=status
+                )
+            return CACHED if hit else FAILED
+
+    try:
+        logprobs = None
+        batched = batcher is not None and batcher.fits(text)
+        if batcher is not None and batched:
+            logprobs = await batcher.score(session, text)
+        #   A document the batch could not score may still fit in windows
+        if not batched or (logprobs is None and window_tokens is not None):
+            logprobs = await score_text_async(
+                session=session,
+                pool=pool,
+                model=model,
+                text=text,
+                window_tokens=window_tokens,
+                overlap_tokens=overlap_tokens,
+                metrics=metrics,
+                top_k=top_k,
+            )
+        if logprobs is not None:
+            returned_text = "".join(logprobs.decoded_tokens.tolist())
+            if returned_text != text:
+                logger.info(f"Returned text does NOT match input text for {job.input_filepath}")
+            with timed(metrics, STAGE_WRITE):
+                await asyncio.to_thread(logprobs.save_npz, filepath=job.output_filepath)
+            if metrics is not None:
+                metrics.observe_tokens(logprobs.size)
+            if cache is not None:
+                await _cache_output(cache, cache_model, text, job.output_filepath)
+    except Exception as err:
+        logger.warning(f"Failed to score {job.input_filepath}: {err!r}")
+        logprobs = None
+
+    status = STATUS_DONE if logprobs is not None else STATUS_FAILED
+    if manifest is not None:
+        manifest.record(
+            job.input_filepath, job.output_filepath, text_hash, run_model, status=status
+        )
+    return SCORED if logprobs is not None else FAILED
+
+
+async def _cache_output(cache: LogProbsCache, model: str, text: str, filepath: str) -> None:
+    """Copy a written output into the cache; the document is scored whatever happens."""
+    try:
+        await asyncio.to_thread(cache.put_file, model, text, filepath)
+    except OSError as err:
+        logger.warning(f"Could not cache {filepath}: {err!r}")
+
+
+async def run_jobs(
+    jobs: list[ScoringJob],
+    score_job: Callable[[aiohttp.ClientSession, ScoringJob], Awaitable[str]],
+    n_workers: int,
+    connection_limit: int | None = None,
+    metrics: ScoringMetrics | None = None,
+) -> CorpusResult:
+    """Run `score_job` over `jobs` with `n_workers` concurrent workers on one session.
+
+    The session pools up to `connection_limit` connections (default `n_workers`).
+
+    `score_job` returns the job's status (SCORED, CACHED, SKIPPED or FAILED); an
+    exception counts as FAILED and does not stop the other jobs. Each job's
+    status and end-to-end time are recorded in `metrics`, if given.
+    """
+    result = CorpusResult()
+    queue: asyncio.Queue[ScoringJob] = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+
+    async def worker(session: aiohttp.ClientSession) -> None:
+        while True:
+            try:
+                job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.monotonic()
+            try:
+                status = await score_job(session, job)
+            except Exception as err:
+                logger.warning(f"Failed to score {job.input_filepath}: {err!r}")
+                status = FAILED
+            getattr(result, status).append(job.input_filepath)
+            if metrics is not None:
+                metrics.observe_document(status, time.monotonic() - start)
+            if result.size % 100 == 0:
+                logger.info(f"Progress: {result.size}/{len(jobs)} ({len(result.failed)} failed)")
+
+    n_workers = max(1, n_workers)
+    connector = aiohttp.TCPConnector(limit=connection_limit or n_workers)
+    timeout = aiohttp.ClientTimeout(total=None)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await asyncio.gather(*(worker(session) for _ in range(n_workers)))
+    if metrics is not None:
+        metrics.finish()
+
+    logger.info(
+        f"Scored {len(result.scored)}/{len(jobs)} documents "
+        f"({len(result.cached)} from cache, {len(result.skipped)} already done, "
+        f"{len(result.failed)} failed)"
+    )
+    return result
+
+
+async def score_corpus(
+    jobs: list[ScoringJob],
+    server: str | list[str] | EndpointPool,
+    model: str,
+    concurrency: int = 16,
+    manifest: RunManifest | None = None,
+    cache: LogProbsCache | None = None,
+    cache_only: bool = False,
+    window_tokens: int | None = None,
+    overlap_tokens: int = 0,
+    metrics: ScoringMetrics | None = None,
+    batch_tokens: int | None = None,
+    batch_size: int = 32,
+    top_k: int = 1,
+) -> CorpusResult:
+    """Score every job, keeping up to `concurrency` requests in flight per server.
+
+    A failure on one document is logged and recorded in the result; it does
+    not stop the rest of the corpus. With several servers, a failing or slow
+    server is drained and its documents go to the others.
+
+    Args:
+        jobs: Input/output file pairs to score
+        server: Server URL, list of server URLs serving the same model, or an
+            EndpointPool
+        model: Model name
+        concurrency: Number of concurrent requests per server (ignored when an
+            EndpointPool is passed; its max_in_flight is used instead)
+        manifest: Optional run manifest; documents it already records as done
+            (same text, model and output) are skipped, and every outcome is
+            appended to it
+        cache: Optional LogProbs cache; hits are copied to the output without a
+            request, and newly scored documents are added to it
+        cache_only: Only materialize outputs from `cache`; misses are failures
+        window_tokens: If set, score documents in overlapping windows of at most
+            this many tokens (see `extract_prompt_logprobs_chunked_async`)
+        overlap_tokens: Tokens of overlap between consecutive windows
+        metrics: Optional ScoringMetrics collecting request latencies, bytes,
+            decode and write times, and document outcomes
+        batch_tokens: If set, pack short documents into multi-prompt requests of
+            at most this many (estimated) tokens; see `PromptBatcher`
+        batch_size: Maximum documents per batched request
+        top_k: If > 1, also keep the top-k candidates of every position, for
+            `LogProbs.entropy` and `LogProbs.margin`
+
+    Returns:
+        CorpusResult: input filepaths that were scored, cached, skipped or failed
+    """
+    pool = make_pool(server, concurrency=concurrency)
+    batcher = None
+    n_workers = pool.max_in_flight * len(pool)
+    if batch_tokens is not None:
+        batcher = PromptBatcher(
+            pool,
+            model,
+            max_batch_tokens=batch_tokens,
+            max_batch_size=batch_size,
+            metrics=metrics,
+            top_k=top_k,
+        )
+        #   Enough documents in flight to fill every request slot with a full batch
+        n_workers *= batch_size
+
+    async def score_job(session: aiohttp.ClientSession, job: ScoringJob) -> str:
+        return await _score_job(
+            session=session,
+            pool=pool,
+            model=model,
+            job=job,
+            manifest=manifest,
+            cache=cache,
+            cache_only=cache_only,
+            window_tokens=window_tokens,
+            overlap_tokens=overlap_tokens,
+            metrics=metrics,
+            batcher=batcher,
+            top_k=top_k,
+        )
+
+    result = await run_jobs(
+        jobs,
+        score_job,
+        n_workers=n_workers,
+        connection_limit=pool.max_in_flight * len(pool),
+        metrics=metrics,
+    )
+    if batcher is not None:
+        logger.info(f"Sent {batcher.batches_sent} batched requests")
+
+    for endpoint in pool.endpoints:
+        logger.info(
+            f"{endpoint.server} : completed={endpoint.completed} failed={endpoint.failed} "
+            f"limit={endpoint.limit:.1f}"
+        )
+    return result
+
+
+def run_score_corpus(
+    jobs: list[ScoringJob],
+    server: str | list[str] | EndpointPool,
+    model: str,
+    concurrency: int = 16,
+    manifest: RunManifest | None = None,
+    cache: LogProbsCache | None = None,
+    cache_only: bool = False,
+    window_tokens: int | None = None,
+    overlap_tokens: int = 0,
+    metrics: ScoringMetrics | None = None,
+    batch_tokens: int | None = None,
+    batch_size: int = 32,
+    top_k: int = 1,
+) -> CorpusResult:
+    """Synchronous entry point for `score_corpus`."""
+    return asyncio.run(
+        score_corpus(
+            jobs=jobs,
+            server=server,
+            model=model,
+            concurrency=concurrency,
+            manifest=manifest,
+            cache=cache,
+            cache_only=cache_only,
+            window_tokens=window_tokens,
+            overlap_tokens=overlap_tokens,
+            metrics=metrics,
+            batch_tokens=batch_tokens,
+            batch_size=batch_size,
+            top_k=top_k,
+        )
+    )
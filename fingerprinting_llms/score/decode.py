@@ -0,0 +1,238 @@
+"""
+Fast decoding of /v1/completions prompt_logprobs responses.
+
+`parse_completions_response` is the readable reference: it runs a
+`max(..., key=lambda ...)` per token, appends to four Python lists and then
+converts them through `LogProbs.from_lists`. At high concurrency that client-side
+parsing becomes the bottleneck, so the scoring clients use this decoder instead:
+
+  - The raw response bytes are parsed with orjson when it is installed (about
+    2x faster than the stdlib json module), falling back to json.
+  - The prompt_logprobs are walked once, writing straight into preallocated
+    NumPy arrays. Positions with a single candidate (the prompt token was the
+    top-1 prediction) skip the rank comparison entirely.
+
+See scripts/benchmark_decode.py for a comparison of the two paths.
+"""
+
+import json
+import logging
+from types import ModuleType
+from typing import Any
+
+import numpy as np
+
+from fingerprinting_llms.score import LogProbs
+
+# Optional: orjson is only a speedup; the stdlib json module is the fallback
+orjson: ModuleType | None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def loads(raw: bytes | str) -> Any:
+    """Parse JSON, with orjson if available.
+
+    orjson rejects the non-standard -Infinity/NaN literals that a server may
+    emit for impossible tokens, so those responses fall back to json.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(raw)
+
+
+def is_error_response(data: dict) -> bool:
+    """True for an error payload ({"error": ...} or vLLM's {"object": "error", ...})."""
+    return "error" in data or data.get("object") == "error"
+
+
+def decode_prompt_logprobs(
+    prompt_logprobs: list[dict | None],
+    top_k: int = 1,
+    prompt_token_ids: list[int] | None = None,
+) -> LogProbs:
+    """Convert per-position prompt_logprobs into a LogProbs in a single pass.
+
+    Equivalent to `logprobs_from_prompt_logprobs`: None positions are skipped
+    and, where several candidates are returned, the one with the largest rank
+    is the prompt token.
+
+    With `top_k` > 1 (the request's `prompt_logprobs`), the top-k candidates of
+    every position are also kept, in rank order, in the LogProbs' flat topk_*
+    arrays. The largest-rank rule no longer identifies the prompt token then,
+    so it is read from `prompt_token_ids` (aligned with `prompt_logprobs`) or,
+    failing that, taken to be the first candidate, as vLLM lists it first.
+    """
+    if top_k > 1:
+        return _decode_prompt_logprobs_topk(prompt_logprobs, top_k, prompt_token_ids)
+
+    n = len(prompt_logprobs)
+    token_ids = np.empty(n, dtype=np.int32)
+    token_ranks = np.empty(n, dtype=np.int32)
+    token_probs = np.empty(n, dtype=np.float32)
+    decoded_tokens: list[str] = []
+
+    k = 0
+    for prompt_logprob in prompt_logprobs:
+        if prompt_logprob is None:
+            continue
+        if len(prompt_logprob) == 1:
+            ((token_id, info),) = prompt_logprob.items()
+        else:
+            best_rank = -1
+            for candidate_id, candidate in prompt_logprob.items():
+                rank = candidate["rank"]
+                if rank > best_rank:
+                    best_rank = rank
+                    token_id, info = candidate_id, candidate
+        token_ids[k] = int(token_id)
+        token_ranks[k] = info["rank"]
+        token_probs[k] = info["logprob"]
+        decoded_tokens.append(info["decoded_token"])
+        k += 1
+
+    return LogProbs(
+        decoded_tokens=np.asarray(decoded_tokens, dtype=np.str_),
+        token_ids=token_ids[:k],
+        token_ranks=token_ranks[:k],
+        token_probs=token_probs[:k],
+    )
+
+
+def _decode_prompt_logprobs_topk(
+    prompt_logprobs: list[dict | None],
+    top_k: int,
+    prompt_token_ids: list[int] | None,
+) -> LogProbs:
+    """`decode_prompt_logprobs` that also keeps the top-k candidates per position."""
+    n = len(prompt_logprobs)
+    token_ids = np.empty(n, dtype=np.int32)
+    token_ranks = np.empty(n, dtype=np.int32)
+    token_probs = np.empty(n, dtype=np.float32)
+    decoded_tokens: list[str] = []
+    topk_offsets = np.zeros(n + 1, dtype=np.int64)
+    topk_ids = np.empty(n * top_k, dtype=np.int32)
+    topk_logprobs = np.empty(n * top_k, dtype=np.float32)
+
+    k = 0
+    m = 0
+    for i, prompt_logprob in enumerate(prompt_logprobs):
+        if prompt_logprob is None:
+            continue
+        if prompt_token_ids is not None:
+            token_id = str(prompt_token_ids[i])
+            info = prompt_logprob[token_id]
+        else:
+            token_id, info = next(iter(prompt_logprob.items()))
+        token_ids[k] = int(token_id)
+        token_ranks[k] = info["rank"]
+        token_probs[k] = info["logprob"]
+        decoded_tokens.append(info["decoded_token"])
+
+        candidates = sorted(
+            (candidate["rank"], int(candidate_id), candidate["logprob"])
+            for candidate_id, candidate in prompt_logprob.items()
+            if candidate["rank"] <= top_k
+        )
+        for _, candidate_id, logprob in candidates[:top_k]:
+            topk_ids[m] = candidate_id
+            topk_logprobs[m] = logprob
+            m += 1
+        k += 1
+        topk_offsets[k] = m
+
+    return LogProbs(
+        decoded_tokens=np.asarray(decoded_tokens, dtype=np.str_),
+        token_ids=token_ids[:k],
+        token_ranks=token_ranks[:k],
+        token_probs=token_probs[:k],
+        topk_offsets=topk_offsets[: k + 1],
+        topk_ids=topk_ids[:m].copy(),
+        topk_logprobs=topk_logprobs[:m].copy(),
+    )
+
+
+def decode_completions_data(data: dict, top_k: int = 1) -> LogProbs | None:
+    """Decode an already parsed /v1/completions response into a LogProbs.
+
+    `top_k` is the `prompt_logprobs` value of the request (see
+    `decode_prompt_logprobs`).
+
+    Returns:
+        LogProbs | None: None if the server reported an error
+
+    Raises:
+        ValueError: if the response has no choices or no prompt_logprobs
+    """
+    if is_error_response(data):
+        logger.warning(f"Error from server: {data.get('error', data.get('message'))}")
+        return None
+
+    choices = data.get("choices")
+    if not choices:
+        raise ValueError("Response has no choices")
+    choice = choices[0]
+    prompt_logprobs = choice.get("prompt_logprobs")
+    if prompt_logprobs is None:
+        raise ValueError(f"Missing prompt fields; keys={list(choice.keys())}")
+
+    logprobs = decode_prompt_logprobs(
+        prompt_logprobs, top_k=top_k, prompt_token_ids=choice.get("prompt_token_ids")
+    )
+    logger.debug(f"Decoded log_probs of size {logprobs.size}")
+    return logprobs
+
+
+def decode_completions_batch(data: dict, top_k: int = 1) -> list[LogProbs | None] | None:
+    """Decode a /v1/completions response to a list of prompts, one LogProbs per prompt.
+
+    Choices are returned in prompt order (by their `index`). A choice without
+    prompt_logprobs decodes to None, so one bad document does not lose the
+    rest of the batch.
+
+    Returns:
+        list[LogProbs | None] | None: None if the server rejected the whole
+            request (e.g. one prompt was longer than max-model-len)
+
+    Raises:
+        ValueError: if the response has no choices
+    """
+    if is_error_response(data):
+        logger.warning(f"Error from server: {data.get('error', data.get('message'))}")
+        return None
+
+    if not data.get("choices"):
+        raise ValueError("Response has no choices")
+    choices = sorted(data["choices"], key=lambda choice: choice.get("index", 0))
+    results: list[LogProbs | None] = []
+    for choice in choices:
+        prompt_logprobs = choice.get("prompt_logprobs")
+        if prompt_logprobs is None:
+            logger.warning(f"Missing prompt_logprobs for prompt {choice.get('index')}")
+            results.append(None)
+            continue
+        results.append(
+            decode_prompt_logprobs(
+                prompt_logprobs, top_k=top_k, prompt_token_ids=choice.get("prompt_token_ids")
+            )
+        )
+    return results
+
+
+def decode_completions_response(raw: bytes | str, top_k: int = 1) -> LogProbs | None:
+    """Decode raw /v1/completions response bytes into a LogProbs.
+
+    Returns:
+        LogProbs | None: None if the server reported an error
+
+    Raises:
+        ValueError: if the response is not JSON or has no choices or no prompt_logprobs
+    """
+    return decode_completions_data(loads(raw), top_k=top_k)
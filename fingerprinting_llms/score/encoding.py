@@ -0,0 +1,125 @@
+"""
+Reduced-precision storage encodings for logprob and rank columns.
+
+Logprobs are written as float32 and ranks as int32, but ranks are almost always
+tiny (docs/ISSUES.md: they overflow int16 only rarely) and feature code does not
+need the last digits of a logprob. For corpus-scale storage these encodings
+halve the bytes per token:
+
+  logprobs (token_probs, topk_logprobs)
+    - float32 : exact (default)
+    - float16 : relative error at most 2**-11, i.e. |error| <= 4.9e-4 * |logprob|
+                (0.005 nats at -10), for |logprob| >= 2**-14 = 6.1e-5; closer
+                to 0 values are subnormal and the bound is absolute,
+                |error| <= 2**-25 = 3.0e-8 nats (below 3.0e-8 they round to 0)
+    - q16     : uint16 codes of -logprob / step with step = 1/1024, so
+                |error| <= step / 2 = 4.9e-4 nats for logprobs in (-64, 0];
+                lower, positive and NaN values are stored exactly (escaped)
+  ranks (token_ranks)
+    - int32   : exact (default)
+    - uint16  : exact; ranks >= 65535 are escaped
+
+Escaped values are written alongside the column as `<name>_escape_positions`
+and `<name>_escape_values`, and a q16 column's step as `<name>_step`. Columns
+are decoded back to float32 / int32 by `read_column`, which passes unencoded
+columns through, so loading is transparent.
+"""
+
+import numpy as np
+import numpy.typing as npt
+
+LOGPROBS_ENCODINGS = ("float32", "float16", "q16")
+RANKS_ENCODINGS = ("int32", "uint16")
+
+Q16_STEP = 1.0 / 1024
+_ESCAPE = np.iinfo(np.uint16).max
+
+
+def _escapes(name: str, mask: np.ndarray, values: np.ndarray) -> dict[str, np.ndarray]:
+    if not mask.any():
+        return {}
+    positions = np.flatnonzero(mask)
+    return {f"{name}_escape_positions": positions, f"{name}_escape_values": values[positions]}
+
+
+def encode_logprobs(
+    name: str,
+    values: npt.ArrayLike,
+    encoding: str = "float32",
+    step: float = Q16_STEP,
+) -> dict[str, np.ndarray]:
+    """Arrays to save for logprob column `name` in `encoding`.
+
+    Raises:
+        ValueError: for an unknown encoding.
+    """
+    values = np.asarray(values, dtype=np.float32)
+    if encoding == "float32":
+        return {name: values}
+    if encoding == "float16":
+        return {name: values.astype(np.float16)}
+    if encoding == "q16":
+        scaled = np.rint(-values.astype(np.float64) / step)
+        escaped = ~((scaled >= 0) & (scaled < _ESCAPE))
+        codes = np.where(escaped, _ESCAPE, scaled).astype(np.uint16)
+        return {name: codes, f"{name}_step": np.asarray(step)} | _escapes(name, escaped, values)
+    raise ValueError(f"Unknown logprobs encoding {encoding!r}; choose from {LOGPROBS_ENCODINGS}")
+
+
+def encode_ranks(
+    name: str,
+    values: npt.ArrayLike,
+    encoding: str = "int32",
+) -> dict[str, np.ndarray]:
+    """Arrays to save for rank column `name` in `encoding`.
+
+    Raises:
+        ValueError: for an unknown encoding.
+    """
+    values = np.asarray(values, dtype=np.int32)
+    if encoding == "int32":
+        return {name: values}
+    if encoding == "uint16":
+        escaped = (values < 0) | (values >= _ESCAPE)
+        codes = np.where(escaped, _ESCAPE, values).astype(np.uint16)
+        return {name: codes} | _escapes(name, escaped, values)
+    raise ValueError(f"Unknown ranks encoding {encoding!r}; choose from {RANKS_ENCODINGS}")
+
+
+def stored_encoding(z, name: str) -> str:
+    """Encoding that column `name` of an open .npz (`np.load` or `NpzColumns`) was saved in.
+
+    Returns:
+        str: one of LOGPROBS_ENCODINGS for a float column, of RANKS_ENCODINGS
+            for an integer one
+    """
+    if f"{name}_step" in z.files:
+        return "q16"
+    dtype = z[name].dtype
+    if dtype == np.float16:
+        return "float16"
+    if dtype == np.uint16:
+        return "uint16"
+    return "float32" if dtype.kind == "f" else "int32"
+
+
+def read_column(z, name: str) -> np.ndarray:
+    """Read column `name` from an open .npz (`np.load` or `NpzColumns`), decoding it.
+
+    float16 and q16 columns come back as float32 and uint16 ones as int32;
+    anything else is returned as stored.
+    """
+    values = z[name]
+    files = z.files
+    if f"{name}_step" in files:
+        step = float(z[f"{name}_step"])
+        values = (values.astype(np.float64) * -step).astype(np.float32)
+    elif values.dtype == np.float16:
+        values = values.astype(np.float32)
+    elif values.dtype == np.uint16:
+        values = values.astype(np.int32)
+    else:
+        return values
+    if f"{name}_escape_positions" in files:
+        values[z[f"{name}_escape_positions"]] = z[f"{name}_escape_values"]
+    return values
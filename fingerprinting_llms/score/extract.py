@@ -1,10 +1,237 @@
 import logging
+import random
+import time
+from dataclasses import dataclass
+
 import requests
 
 from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.decode import (
+    decode_completions_data,
+    is_error_response,
+    loads,
+)
 
 logger = logging.getLogger(__name__)
 
+COMPLETIONS_ROUTE = "/v1/completions"
+TOKENIZE_ROUTE = "/tokenize"
+
+
+# -----------------------------------------------------------------------------
+# Endpoint pool
+# -----------------------------------------------------------------------------
+#   HTTP statuses worth retrying: the request may succeed later or elsewhere.
+#   Anything else from the server (e.g. 400 for a prompt longer than
+#   max-model-len) would fail again and is returned to the caller.
+TRANSIENT_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Seconds to wait before retry number `attempt` (0-based), with full jitter.
+
+    Uniform in [0, min(cap, base * 2**attempt)], so clients that failed together
+    do not retry together.
+    """
+    return random.uniform(0.0, min(cap, base * 2**attempt))
+
+
+@dataclass
+class Endpoint:
+    """A single vLLM server, its observed load and its current concurrency limit."""
+
+    server: str
+    limit: float = 1.0
+    in_flight: int = 0
+    latency_ewma: float | None = None
+    latency_baseline: float | None = None
+    last_decrease: float = 0.0
+    consecutive_failures: int = 0
+    drained_until: float = 0.0
+    completed: int = 0
+    failed: int = 0
+
+    def expected_wait(self, default_latency: float) -> float:
+        """Estimated seconds until a new request here would finish."""
+        latency = self.latency_ewma if self.latency_ewma is not None else default_latency
+        return (self.in_flight + 1) * latency
+
+    @property
+    def capacity(self) -> int:
+        """Requests this endpoint may have in flight right now."""
+        return max(1, int(self.limit))
+
+
+class EndpointPool:
+    """
+    A pool of vLLM servers serving the same model.
+
+    Requests go to the available endpoint with the smallest expected wait,
+    i.e. (queue depth + 1) x observed latency. An endpoint is drained (gets no
+    new work) for `drain_seconds` after `max_failures` consecutive failures, or
+    when its latency is more than `slow_factor` times the fastest endpoint's.
+    Drained endpoints are re-admitted automatically once the drain expires.
+
+    Each endpoint's in-flight limit adapts to the server's load (AIMD): every
+    success adds about one request per round of `limit` requests, up to
+    `max_in_flight`. When short-term latency rises past `latency_tolerance`
+    times the long-term baseline (requests are queueing on the server) the
+    limit is cut by `latency_backoff`, and a failed request halves it. Cuts are
+    spaced at least one observed latency apart, so one burst of slow responses
+    counts once. With `adaptive=False` every endpoint keeps `max_in_flight`.
+
+    The pool also carries the retry policy of the clients using it: each
+    attempt is cut off after `request_timeout` seconds, a whole call (all
+    attempts and backoff) after `deadline` seconds, and retries wait
+    `backoff_delay(attempt, backoff_base, backoff_max)`.
+
+    Usage:
+      pool = EndpointPool(["http://localhost:9000", "http://localhost:9001"])
+      endpoint = pool.acquire()
+      ... send request to endpoint.server ...
+      pool.release(endpoint, latency=elapsed, ok=True)
+    """
+
+    def __init__(
+        self,
+        servers: list[str],
+        max_in_flight: int = 16,
+        max_failures: int = 3,
+        drain_seconds: float = 60.0,
+        slow_factor: float = 4.0,
+        ewma_alpha: float = 0.2,
+        adaptive: bool = True,
+        min_in_flight: int = 1,
+        initial_in_flight: int | None = None,
+        latency_tolerance: float = 2.0,
+        latency_backoff: float = 0.9,
+        baseline_alpha: float = 0.01,
+        request_timeout: float = 300.0,
+        deadline: float = 900.0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+    ):
+        if not servers:
+            raise ValueError("EndpointPool needs at least one server")
+        if not 1 <= min_in_flight <= max_in_flight:
+            raise ValueError(
+                f"Need 1 <= min_in_flight <= max_in_flight, got {min_in_flight} and {max_in_flight}"
+            )
+        self.max_in_flight = max_in_flight
+        self.min_in_flight = min_in_flight
+        self.adaptive = adaptive
+        if not adaptive:
+            initial = max_in_flight
+        elif initial_in_flight is None:
+            initial = max(min_in_flight, max_in_flight // 4)
+        else:
+            initial = min(max(initial_in_flight, min_in_flight), max_in_flight)
+        self.endpoints = [Endpoint(server=server, limit=float(initial)) for server in servers]
+        self.max_failures = max_failures
+        self.drain_seconds = drain_seconds
+        self.slow_factor = slow_factor
+        self.ewma_alpha = ewma_alpha
+        self.latency_tolerance = latency_tolerance
+        self.latency_backoff = latency_backoff
+        self.baseline_alpha = baseline_alpha
+        self.request_timeout = request_timeout
+        self.deadline = deadline
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def _default_latency(self) -> float:
+        latencies = [e.latency_ewma for e in self.endpoints if e.latency_ewma is not None]
+        return min(latencies) if latencies else 1.0
+
+    def available(self, now: float | None = None) -> list[Endpoint]:
+        """Endpoints that are not drained and have spare in-flight capacity."""
+        now = time.monotonic() if now is None else now
+        return [e for e in self.endpoints if e.drained_until <= now and e.in_flight < e.capacity]
+
+    def seconds_until_available(self) -> float:
+        """Seconds until the next drained endpoint is re-admitted (0 if one is free)."""
+        now = time.monotonic()
+        if self.available(now):
+            return 0.0
+        return max(0.0, min(e.drained_until for e in self.endpoints) - now)
+
+    def acquire(self) -> Endpoint | None:
+        """Reserve the endpoint with the smallest expected wait, or None if all are busy."""
+        candidates = self.available()
+        if not candidates:
+            return None
+        default_latency = self._default_latency()
+        endpoint = min(candidates, key=lambda e: e.expected_wait(default_latency))
+        endpoint.in_flight += 1
+        return endpoint
+
+    def release(self, endpoint: Endpoint, latency: float | None, ok: bool) -> None:
+        """Record the outcome of a request made against `endpoint`."""
+        endpoint.in_flight = max(0, endpoint.in_flight - 1)
+        if not ok:
+            endpoint.failed += 1
+            endpoint.consecutive_failures += 1
+            self._decrease(endpoint, factor=0.5, reason="failed request")
+            if endpoint.consecutive_failures >= self.max_failures:
+                self.drain(endpoint, reason=f"{endpoint.consecutive_failures} consecutive failures")
+            return
+
+        endpoint.completed += 1
+        endpoint.consecutive_failures = 0
+        if latency is None:
+            return
+        if endpoint.latency_ewma is None:
+            endpoint.latency_ewma = latency
+        else:
+            a = self.ewma_alpha
+            endpoint.latency_ewma = a * latency + (1 - a) * endpoint.latency_ewma
+        #   The baseline follows the short-term latency down at once and up only
+        #   slowly, so it approximates the unloaded latency for the current mix
+        if endpoint.latency_baseline is None or endpoint.latency_ewma < endpoint.latency_baseline:
+            endpoint.latency_baseline = endpoint.latency_ewma
+        else:
+            b = self.baseline_alpha
+            endpoint.latency_baseline += b * (endpoint.latency_ewma - endpoint.latency_baseline)
+
+        if endpoint.latency_ewma > self.latency_tolerance * endpoint.latency_baseline:
+            self._decrease(
+                endpoint,
+                factor=self.latency_backoff,
+                reason=f"latency {endpoint.latency_ewma:.2f}s vs baseline "
+                f"{endpoint.latency_baseline:.2f}s",
+            )
+        elif self.adaptive:
+            endpoint.limit = min(self.max_in_flight, endpoint.limit + 1.0 / endpoint.limit)
+
+        fastest = self._default_latency()
+        if len(self) > 1 and endpoint.latency_ewma > self.slow_factor * fastest:
+            self.drain(
+                endpoint,
+                reason=f"latency {endpoint.latency_ewma:.2f}s vs fastest {fastest:.2f}s",
+            )
+
+    def _decrease(self, endpoint: Endpoint, factor: float, reason: str) -> None:
+        """Multiplicatively cut `endpoint`'s limit, at most once per observed latency."""
+        if not self.adaptive:
+            return
+        now = time.monotonic()
+        if now - endpoint.last_decrease < (endpoint.latency_ewma or 0.0):
+            return
+        endpoint.last_decrease = now
+        endpoint.limit = max(float(self.min_in_flight), endpoint.limit * factor)
+        logger.debug(f"{endpoint.server} limit -> {endpoint.limit:.1f}: {reason}")
+
+    def drain(self, endpoint: Endpoint, reason: str) -> None:
+        """Stop sending new requests to `endpoint` for `drain_seconds`."""
+        endpoint.drained_until = time.monotonic() + self.drain_seconds
+        #   Forget the stale latency so the endpoint is re-probed on its merits
+        endpoint.latency_ewma = None
+        endpoint.latency_baseline = None
+        endpoint.consecutive_failures = 0
+        logger.warning(f"Draining {endpoint.server} for {self.drain_seconds:.0f}s: {reason}")
 
 
 def load_text_from_file(filepath: str) -> str:
@@ -13,54 +240,67 @@ def load_text_from_file(filepath: str) -> str:
     return "".join(lines)
 
 
-def extract_prompt_logprobs(
-    server: str,
-    model: str,
-    text: str,
-) -> LogProbs:
-    """Get the per-token prompt tokens and logprobs for the given text.
+def build_completions_request(
+    model: str, text: str | list[int] | list[str], top_k: int = 1
+) -> dict:
+    """Build the /v1/completions request body that echoes the prompt logprobs.
 
     Args:
-        server (str): Server URL
         model (str): Model name
-        text (str): Input text
+        text (str | list[int] | list[str]): Input text, its token ids, or a
+            list of texts scored as one batch (one choice per text)
+        top_k (int): Number of most likely candidates to return per position,
+            besides the prompt token
 
     Returns:
-        list[Optional[tuple[str, int, int, float]]]: List of tuples containing
-            - None for tokens without logprobs (e.g., special tokens)
-            - (str(token), token_id, rank, logprob) for tokens with logprobs
+        dict: JSON body for the completions endpoint
     """
-    #   Request completions with logprobs
     #   max_tokens = 0 is not supported
-    r = requests.post(
-        f"{server}/v1/completions",
-        json={
-            "model": model,
-            "prompt": text,
-            "max_tokens": 1,
-            "prompt_logprobs": 1,
-            "logprobs": 0,
-            "echo": True,
-            "temperature": 0.0,
-        },
-    )
+    return {
+        "model": model,
+        "prompt": text,
+        "max_tokens": 1,
+        "prompt_logprobs": top_k,
+        "logprobs": 0,
+        "echo": True,
+        "temperature": 0.0,
+    }
 
-    data = r.json()
-    if "error" in data:
-        logger.warning(f"Error from server: {data['error']}")
-        return
+
+def get_prompt_logprobs(data: dict) -> list[dict | None] | None:
+    """Pull the per-position prompt_logprobs out of a decoded /v1/completions response.
+
+    Args:
+        data (dict): Decoded JSON response from the server
+
+    Returns:
+        list[dict | None] | None: One entry per prompt token (None for tokens
+            without logprobs, e.g. BOS), or None if the server reported an error
+
+    Raises:
+        ValueError: if the response has no choices or no prompt_logprobs
+    """
+    if is_error_response(data):
+        logger.warning(f"Error from server: {data.get('error', data.get('message'))}")
+        return None
 
     choices = data.get("choices")
+    if not choices:
+        raise ValueError("Response has no choices")
     choice = choices[0]
     logger.info(f"choice = {choice.keys()}")
 
-    logger.info(f"Response text : {choice["text"][:100]}...")
+    logger.info(f"Response text : {str(choice.get('text'))[:100]}...")
 
     # list[None|dict[str, {logprob, ...}]]
     prompt_logprobs = choice.get("prompt_logprobs")
     if prompt_logprobs is None:
         raise ValueError(f"Missing prompt fields; keys={list(choice.keys())}")
+    return prompt_logprobs
+
 
+def logprobs_from_prompt_logprobs(prompt_logprobs: list[dict | None]) -> LogProbs:
+    """Convert per-position prompt_logprobs into a LogProbs, skipping None positions."""
     decoded_tokens: list[str] = []
     token_ids: list[int] = []
     token_ranks: list[int] = []
@@ -90,3 +330,106 @@ def extract_prompt_logprobs(
     )
     logger.info(f"Created log_probs of size {log_probs.size}")
     return log_probs
+
+
+def parse_completions_response(data: dict) -> LogProbs | None:
+    """Convert a decoded /v1/completions response into a LogProbs.
+
+    This is the reference implementation; the scoring clients use the faster
+    `decode.decode_completions_response`, which produces the same LogProbs.
+
+    Args:
+        data (dict): Decoded JSON response from the server
+
+    Returns:
+        LogProbs | None: None if the server reported an error
+
+    Raises:
+        ValueError: if the response has no choices or no prompt_logprobs
+    """
+    prompt_logprobs = get_prompt_logprobs(data)
+    if prompt_logprobs is None:
+        return None
+    return logprobs_from_prompt_logprobs(prompt_logprobs)
+
+
+def extract_prompt_logprobs(
+    server: str | EndpointPool,
+    model: str,
+    text: str,
+    session: requests.Session | None = None,
+    max_attempts: int = 3,
+    top_k: int = 1,
+) -> LogProbs:
+    """Get the per-token prompt tokens and logprobs for the given text.
+
+    Requests that time out, cannot connect or get a transient HTTP status
+    (see TRANSIENT_STATUSES) are retried with jittered backoff, on another
+    server when a pool is given, within the pool's per-request timeout and
+    overall deadline.
+
+    Args:
+        server (str | EndpointPool): Server URL, or a pool of servers serving
+            the same model
+        model (str): Model name
+        text (str): Input text
+        session (requests.Session | None): Optional session to reuse connections
+            across calls
+        max_attempts (int): Maximum number of requests to send
+        top_k (int): If > 1, also keep the top-k candidates of every position
+            (see `LogProbs.entropy` and `LogProbs.margin`)
+
+    Returns:
+        LogProbs: decoded tokens, token ids, ranks and logprobs for every prompt
+            token that has a logprob (special tokens such as BOS are skipped)
+
+    Raises:
+        ValueError: if the server rejected the text (e.g. it is longer than
+            max-model-len), or `max_attempts` is less than 1
+        ConnectionError: if no attempt got an answer before the deadline
+    """
+    if max_attempts < 1:
+        raise ValueError(f"max_attempts must be at least 1, got {max_attempts}")
+    #   Request completions with logprobs
+    post = session.post if session is not None else requests.post
+    body = build_completions_request(model=model, text=text, top_k=top_k)
+    pool = server if isinstance(server, EndpointPool) else EndpointPool([server], max_in_flight=1)
+
+    deadline = time.monotonic() + pool.deadline
+    last_err: Exception | None = None
+    for attempt in range(max_attempts):
+        if attempt > 0:
+            time.sleep(backoff_delay(attempt - 1, pool.backoff_base, pool.backoff_max))
+        endpoint = pool.acquire()
+        while endpoint is None and time.monotonic() < deadline:
+            #   Wake up for the deadline rather than sleeping through a long drain
+            wait = min(pool.seconds_until_available(), deadline - time.monotonic())
+            time.sleep(max(0.05, wait))
+            endpoint = pool.acquire()
+        if endpoint is None:
+            break
+
+        start = time.monotonic()
+        try:
+            r = post(
+                f"{endpoint.server}{COMPLETIONS_ROUTE}",
+                json=body,
+                timeout=min(pool.request_timeout, max(1.0, deadline - start)),
+            )
+            latency = time.monotonic() - start
+            if r.status_code in TRANSIENT_STATUSES:
+                raise ConnectionError(f"HTTP {r.status_code}: {r.text[:200]}")
+            data = loads(r.content)
+            #   A truncated or malformed answer is retried like a failed request
+            logprobs = decode_completions_data(data, top_k=top_k)
+        except (requests.RequestException, ConnectionError, ValueError) as err:
+            pool.release(endpoint, latency=None, ok=False)
+            logger.warning(f"Request to {endpoint.server} failed: {err!r}")
+            last_err = err
+            continue
+        pool.release(endpoint, latency=latency, ok=True)
+
+        if logprobs is None:
+            raise ValueError(f"Server rejected the text: {data.get('message', data.get('error'))}")
+        return logprobs
+    raise ConnectionError(f"Failed to score the text after {attempt + 1} attempts: {last_err!r}")
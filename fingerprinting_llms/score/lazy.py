@@ -0,0 +1,201 @@
+"""
+Lazy, column-at-a-time loading of LogProbs.
+
+`LogProbs.from_file` reads and decompresses every array of a record, including
+the Unicode `decoded_tokens`, although most feature code only needs
+`token_probs`. This module loads single .npz members on demand instead:
+
+  - `NpzColumns` reads an archive's directory once and loads one member per
+    access. Members stored uncompressed (`save_npz(..., compressed=False)`,
+    `np.savez`, corpus stores) are memory-mapped in place, so nothing is read
+    until the array is touched and slices are zero-copy views of the page cache.
+    Compressed members are decompressed alone, without touching the others.
+  - `LazyLogProbs` is a LogProbs whose columns are materialized on first access.
+
+Usage:
+    logprobs = LogProbs.from_file("data/tokens/....txt.npz", lazy=True)
+    probs = logprobs.token_probs            # only this member is read
+    logprobs.loaded                         # ["token_probs"]
+"""
+
+import logging
+import struct
+import zipfile
+from collections.abc import Iterator, Mapping
+from dataclasses import fields
+from pathlib import Path
+
+import numpy as np
+
+from fingerprinting_llms.score import LogProbs, _decode_interned
+from fingerprinting_llms.score.encoding import read_column
+from fingerprinting_llms.score.vocab import Vocabulary
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ("decoded_tokens", "token_ids", "token_ranks", "token_probs")
+
+#   Zip local file header: fixed 30 bytes, then the file name and extra field
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+
+def _read_npy_header(f) -> tuple[tuple[int, ...], bool, np.dtype]:
+    """Read an .npy header from `f`, leaving it positioned at the array data."""
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(f)
+    if version == (2, 0):
+        return np.lib.format.read_array_header_2_0(f)
+    raise ValueError(f"Unsupported .npy format version {version}")
+
+
+class NpzColumns(Mapping):
+    """Read-only mapping of an .npz archive's members, loaded one at a time.
+
+    Keys are member names without the `.npy` suffix, as with `np.load`. Every
+    access loads the member again; callers keep the arrays they reuse.
+    """
+
+    def __init__(self, filepath: str | Path, mmap: bool = True):
+        self.filepath = Path(filepath)
+        if not self.filepath.exists():
+            raise FileNotFoundError(self.filepath)
+        self.mmap = mmap
+        with zipfile.ZipFile(self.filepath) as zf:
+            self._members = {info.filename.removesuffix(".npy"): info for info in zf.infolist()}
+
+    @property
+    def files(self) -> list[str]:
+        return list(self._members)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._members)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._members
+
+    def is_stored(self, name: str) -> bool:
+        """True if member `name` is stored uncompressed (and can be memory-mapped)."""
+        return self._members[name].compress_type == zipfile.ZIP_STORED
+
+    def _data_offset(self, info: zipfile.ZipInfo) -> int:
+        """Byte offset of a member's contents in the archive."""
+        with open(self.filepath, "rb") as f:
+            f.seek(info.header_offset)
+            header = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+        if header[0] != _LOCAL_HEADER_SIGNATURE:
+            raise ValueError(f"Bad zip local header for {info.filename} in {self.filepath}")
+        name_length, extra_length = header[-2], header[-1]
+        return info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+
+    def shape(self, name: str) -> tuple[int, ...]:
+        """Shape of member `name`, read from its .npy header only."""
+        with zipfile.ZipFile(self.filepath) as zf, zf.open(self._members[name]) as f:
+            shape, _, _ = _read_npy_header(f)
+        return shape
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._members:
+            raise KeyError(f"{name} is not a file in the archive")
+        info = self._members[name]
+        if self.mmap and info.compress_type == zipfile.ZIP_STORED:
+            offset = self._data_offset(info)
+            with open(self.filepath, "rb") as f:
+                f.seek(offset)
+                shape, fortran_order, dtype = _read_npy_header(f)
+                data_offset = f.tell()
+            #   np.memmap cannot map empty or object arrays; read those instead
+            if not dtype.hasobject and int(np.prod(shape)) > 0:
+                return np.memmap(
+                    self.filepath,
+                    dtype=dtype,
+                    mode="r",
+                    offset=data_offset,
+                    shape=shape,
+                    order="F" if fortran_order else "C",
+                )
+        with zipfile.ZipFile(self.filepath) as zf, zf.open(info) as f:
+            return np.lib.format.read_array(f, allow_pickle=False)
+
+
+_LOGPROBS_FIELDS = frozenset(f.name for f in fields(LogProbs))
+
+
+class _LazyColumn:
+    """Reads a LazyLogProbs column on first access and caches it on the instance.
+
+    A descriptor rather than `__getattr__`, because the dataclass defaults of
+    the optional columns (None) are class attributes that would shadow it.
+    """
+
+    def __set_name__(self, owner: type, name: str):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = obj._load(self.name)
+        obj.__dict__[self.name] = value
+        return value
+
+
+class LazyLogProbs(LogProbs):
+    """LogProbs backed by an .npz file, reading each column on first access.
+
+    Columns absent from the file (full_context, topk_*) read as None, columns
+    saved in a 16-bit encoding are decoded (and so copied, not mapped), and
+    decoded_tokens of a file saved against a vocabulary are rebuilt from it
+    when first used. Loaded columns are kept, so later accesses are free;
+    anything that reads every field (repr, ==) loads the whole record.
+    """
+
+    decoded_tokens = _LazyColumn()
+    token_ids = _LazyColumn()
+    token_ranks = _LazyColumn()
+    token_probs = _LazyColumn()
+    full_context = _LazyColumn()
+    topk_offsets = _LazyColumn()
+    topk_ids = _LazyColumn()
+    topk_logprobs = _LazyColumn()
+
+    def __init__(self, filepath: str | Path, mmap: bool = True, vocab: "Vocabulary | None" = None):
+        columns = NpzColumns(filepath, mmap=mmap)
+        interned = "decoded_tokens" not in columns and "vocab_hash" in columns
+        missing = [
+            name
+            for name in REQUIRED_COLUMNS
+            if name not in columns and not (interned and name == "decoded_tokens")
+        ]
+        if missing:
+            raise KeyError(f"Missing array in NPZ: {missing}")
+        self._columns = columns
+        self._vocab = vocab
+
+    def _load(self, name: str) -> np.ndarray | None:
+        columns = self._columns
+        if name == "decoded_tokens" and name not in columns:
+            return _decode_interned(columns.filepath, columns, self.token_ids, self._vocab)
+        return read_column(columns, name) if name in columns else None
+
+    @property
+    def filepath(self) -> Path:
+        return self._columns.filepath
+
+    @property
+    def loaded(self) -> list[str]:
+        """Columns read so far."""
+        return [name for name in self.__dict__ if name in _LOGPROBS_FIELDS]
+
+    @property
+    def has_topk(self) -> bool:
+        return "topk_offsets" in self._columns
+
+    @property
+    def size(self) -> int:
+        if "token_probs" in self.__dict__:
+            return len(self.token_probs)
+        return self._columns.shape("token_probs")[0]
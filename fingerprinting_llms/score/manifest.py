@@ -0,0 +1,126 @@
+"""
+Run manifest for resumable scoring.
+
+The manifest is an append-only JSON-lines file with one record per scored (or
+failed) document. The last record for an input path wins, so a run that dies
+halfway can simply be restarted: documents whose text, model and output are
+unchanged since they were last scored successfully are skipped.
+
+Usage:
+    manifest = RunManifest("data/tokens/human_llama-graded/manifest.jsonl")
+    if not manifest.is_done(input_filepath, output_filepath, text_hash, model):
+        ... score and save ...
+        manifest.record(input_filepath, output_filepath, text_hash, model, status="done")
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def hash_text(text: str) -> str:
+    """SHA-256 hex digest of the exact UTF-8 bytes of `text`."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ManifestEntry:
+    input_filepath: str
+    output_filepath: str
+    content_hash: str
+    model: str
+    status: str
+    updated: float
+
+
+class RunManifest:
+    """
+    Append-only record of the documents a scoring run has processed.
+
+    Args:
+        filepath: Path to the JSON-lines manifest; created if it does not exist.
+    """
+
+    def __init__(self, filepath: str | Path):
+        self.filepath = Path(filepath)
+        self.entries: dict[str, ManifestEntry] = {}
+        self._by_output: dict[str, ManifestEntry] | None = None
+        if self.filepath.exists():
+            self._load()
+
+    def _load(self) -> None:
+        n_bad = 0
+        with open(self.filepath) as f:
+            for line in f:
+                try:
+                    entry = ManifestEntry(**json.loads(line))
+                except (ValueError, TypeError):
+                    #   A partially written last line from a killed run
+                    n_bad += 1
+                    continue
+                self.entries[entry.input_filepath] = entry
+        logger.info(
+            f"Loaded manifest {self.filepath} with {len(self.entries)} documents "
+            f"({n_bad} unreadable lines skipped)"
+        )
+
+    def is_done(
+        self,
+        input_filepath: str,
+        output_filepath: str,
+        content_hash: str,
+        model: str,
+    ) -> bool:
+        """True if this exact text was already scored by `model` into `output_filepath`."""
+        entry = self.entries.get(input_filepath)
+        return (
+            entry is not None
+            and entry.status == STATUS_DONE
+            and entry.content_hash == content_hash
+            and entry.model == model
+            and entry.output_filepath == output_filepath
+            and os.path.exists(output_filepath)
+        )
+
+    def by_output(self, output_filepath: str | Path) -> ManifestEntry | None:
+        """Latest successful entry that wrote `output_filepath`, if any."""
+        if self._by_output is None:
+            self._by_output = {
+                os.path.abspath(entry.output_filepath): entry
+                for entry in self.entries.values()
+                if entry.status == STATUS_DONE
+            }
+        return self._by_output.get(os.path.abspath(output_filepath))
+
+    def record(
+        self,
+        input_filepath: str,
+        output_filepath: str,
+        content_hash: str,
+        model: str,
+        status: str,
+    ) -> ManifestEntry:
+        """Append a record for one document and flush it to disk."""
+        entry = ManifestEntry(
+            input_filepath=input_filepath,
+            output_filepath=output_filepath,
+            content_hash=content_hash,
+            model=model,
+            status=status,
+            updated=time.time(),
+        )
+        self.entries[input_filepath] = entry
+        self._by_output = None
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.filepath, "a") as f:
+            f.write(json.dumps(asdict(entry)) + "\n")
+        return entry
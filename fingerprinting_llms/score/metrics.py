@@ -0,0 +1,274 @@
+"""
+Scoring run telemetry.
+
+Collects per-request and per-document measurements across a scoring run:
+
+  - requests : latency (send to last response byte, i.e. server plus network
+               time), bytes received and errors, per endpoint
+  - stages   : time spent parsing response JSON, decoding it into LogProbs
+               and writing NPZ files, and end-to-end time per document
+  - totals   : documents by outcome and tokens scored
+
+Latencies and sizes go into fixed-bucket histograms (as in Prometheus), so a run
+of any length uses constant memory. At the end of a run the metrics are written
+as JSON, or in the Prometheus text exposition format if the path ends in
+`.prom`, and a summary is logged.
+
+Usage:
+    metrics = ScoringMetrics()
+    result = run_score_corpus(jobs, server=servers, model=MODEL, metrics=metrics)
+    metrics.write("data/tokens/hc3/metrics.json")
+    logger.info(metrics.summary())
+"""
+
+import json
+import logging
+import math
+import time
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from fingerprinting_llms.io.atomic import atomic_write
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, math.inf
+)  # fmt: skip
+BYTES_BUCKETS = tuple(float(1 << s) for s in range(10, 30, 2)) + (math.inf,)
+
+#   Per-document stages timed in the client
+STAGE_PARSE = "parse"
+STAGE_DECODE = "decode"
+STAGE_WRITE = "write"
+STAGE_DOCUMENT = "document"
+
+
+@dataclass
+class Histogram:
+    """Counts of observations per bucket, with each bucket's upper bound in `bounds`."""
+
+    bounds: tuple[float, ...] = LATENCY_BUCKETS
+    counts: list[int] = field(default_factory=list)
+    total: float = 0.0
+
+    def __post_init__(self):
+        if not self.counts:
+            self.counts = [0] * len(self.bounds)
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate the `q` quantile by linear interpolation within its bucket.
+
+        Returns NaN for an empty histogram; values in the last (infinite)
+        bucket are reported as that bucket's lower bound.
+        """
+        n = self.count
+        if n == 0:
+            return math.nan
+        rank = q * n
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if seen + c >= rank and c > 0:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i]
+                if math.isinf(upper):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / c
+            seen += c
+        return self.bounds[-2]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "buckets": {str(b): c for b, c in zip(self.bounds, self.counts, strict=True)},
+        }
+
+
+@dataclass
+class EndpointMetrics:
+    requests: int = 0
+    errors: int = 0
+    bytes_received: int = 0
+    latency: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    response_bytes: Histogram = field(default_factory=lambda: Histogram(BYTES_BUCKETS))
+
+
+class ScoringMetrics:
+    """Request, stage and document metrics for one scoring run."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.finished: float | None = None
+        self.endpoints: dict[str, EndpointMetrics] = {}
+        self.stages: dict[str, Histogram] = {}
+        self.documents: dict[str, int] = {}
+        self.tokens = 0
+
+    # -------------------------------------------------------------------------
+    # Recording
+    # -------------------------------------------------------------------------
+    def endpoint(self, server: str) -> EndpointMetrics:
+        if server not in self.endpoints:
+            self.endpoints[server] = EndpointMetrics()
+        return self.endpoints[server]
+
+    def observe_request(self, server: str, seconds: float | None, n_bytes: int, ok: bool) -> None:
+        """Record one HTTP request; `seconds` is None if no response arrived."""
+        endpoint = self.endpoint(server)
+        endpoint.requests += 1
+        if not ok:
+            endpoint.errors += 1
+        if seconds is not None:
+            endpoint.latency.observe(seconds)
+            endpoint.response_bytes.observe(n_bytes)
+            endpoint.bytes_received += n_bytes
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        if stage not in self.stages:
+            self.stages[stage] = Histogram(LATENCY_BUCKETS)
+        self.stages[stage].observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Time the enclosed block as one observation of `stage`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    def observe_document(self, status: str, seconds: float) -> None:
+        """Record a finished document's outcome and end-to-end time."""
+        self.documents[status] = self.documents.get(status, 0) + 1
+        self.observe_stage(STAGE_DOCUMENT, seconds)
+
+    def observe_tokens(self, n_tokens: int) -> None:
+        self.tokens += n_tokens
+
+    def finish(self) -> None:
+        self.finished = time.monotonic()
+
+    # -------------------------------------------------------------------------
+    # Reporting
+    # -------------------------------------------------------------------------
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def to_dict(self) -> dict:
+        elapsed = self.elapsed
+        return {
+            "elapsed_seconds": elapsed,
+            "documents": dict(self.documents),
+            "tokens": self.tokens,
+            "tokens_per_second": self.tokens / elapsed if elapsed > 0 else 0.0,
+            "endpoints": {
+                server: {
+                    "requests": e.requests,
+                    "errors": e.errors,
+                    "bytes_received": e.bytes_received,
+                    "latency_seconds": e.latency.to_dict(),
+                    "response_bytes": e.response_bytes.to_dict(),
+                }
+                for server, e in self.endpoints.items()
+            },
+            "stages": {stage: h.to_dict() for stage, h in self.stages.items()},
+        }
+
+    def to_prometheus(self, prefix: str = "scoring") -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        lines: list[str] = []
+
+        def histogram(name: str, labels: dict[str, str], h: Histogram) -> None:
+            label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            sep = "," if label_str else ""
+            cumulative = 0
+            for bound, c in zip(h.bounds, h.counts, strict=True):
+                cumulative += c
+                le = "+Inf" if math.isinf(bound) else repr(bound)
+                lines.append(f'{name}_bucket{{{label_str}{sep}le="{le}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{label_str}}} {h.total}")
+            lines.append(f"{name}_count{{{label_str}}} {h.count}")
+
+        lines.append(f"# TYPE {prefix}_elapsed_seconds gauge")
+        lines.append(f"{prefix}_elapsed_seconds {self.elapsed}")
+        lines.append(f"# TYPE {prefix}_tokens_total counter")
+        lines.append(f"{prefix}_tokens_total {self.tokens}")
+        lines.append(f"# TYPE {prefix}_documents_total counter")
+        for status, n in self.documents.items():
+            lines.append(f'{prefix}_documents_total{{status="{status}"}} {n}')
+
+        for metric, attr in (
+            ("requests_total", "requests"),
+            ("request_errors_total", "errors"),
+            ("response_bytes_total", "bytes_received"),
+        ):
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            for server, e in self.endpoints.items():
+                lines.append(f'{prefix}_{metric}{{server="{server}"}} {getattr(e, attr)}')
+        lines.append(f"# TYPE {prefix}_request_seconds histogram")
+        for server, e in self.endpoints.items():
+            histogram(f"{prefix}_request_seconds", {"server": server}, e.latency)
+        lines.append(f"# TYPE {prefix}_response_bytes histogram")
+        for server, e in self.endpoints.items():
+            histogram(f"{prefix}_response_bytes", {"server": server}, e.response_bytes)
+        lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+        for stage, h in self.stages.items():
+            histogram(f"{prefix}_stage_seconds", {"stage": stage}, h)
+        return "\n".join(lines) + "\n"
+
+    def write(self, filepath: str | Path) -> None:
+        """Write the metrics as Prometheus text (`.prom`) or JSON (anything else)."""
+        filepath = Path(filepath)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        if filepath.suffix == ".prom":
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_dict(), indent=2)
+        with atomic_write(filepath, "w") as f:
+            f.write(content)
+        logger.info(f"Wrote scoring metrics to {filepath}")
+
+    def summary(self) -> str:
+        """Multi-line human-readable summary: throughput, time split and endpoints."""
+        elapsed = max(self.elapsed, 1e-9)
+        n_docs = sum(self.documents.values())
+        outcomes = ", ".join(f"{k}={v}" for k, v in self.documents.items())
+        lines = [
+            f"{n_docs} documents ({outcomes}) in {elapsed:.1f}s : "
+            f"{n_docs / elapsed:.2f} docs/s, {self.tokens / elapsed:,.0f} tokens/s"
+        ]
+        request_seconds = sum(e.latency.total for e in self.endpoints.values())
+        split = {"request": request_seconds} | {
+            stage: h.total for stage, h in self.stages.items() if stage != STAGE_DOCUMENT
+        }
+        lines.append(
+            "time summed over concurrent documents : "
+            + ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in split.items())
+        )
+        for server, e in self.endpoints.items():
+            lines.append(
+                f"{server} : requests={e.requests} errors={e.errors} "
+                f"MB={e.bytes_received / 2**20:.1f} "
+                f"p50={e.latency.quantile(0.5) * 1e3:.0f}ms "
+                f"p90={e.latency.quantile(0.9) * 1e3:.0f}ms "
+                f"p99={e.latency.quantile(0.99) * 1e3:.0f}ms"
+            )
+        return "\n".join(lines)
+
+
+def timed(metrics: ScoringMetrics | None, stage: str) -> AbstractContextManager:
+    """`metrics.timer(stage)`, or a no-op context when metrics are not collected."""
+    return metrics.timer(stage) if metrics is not None else nullcontext()
@@ -0,0 +1,305 @@
+"""
+Mock vLLM completions server.
+
+A stand-in for a vLLM OpenAI-compatible server that implements just enough of
+the API for the scoring client: `/v1/completions` with `echo` and
+`prompt_logprobs`, `/tokenize`, `/v1/models` and `/health`. It needs no GPU, so
+the scoring client can be exercised and load-tested offline and in CI.
+
+Everything the server returns is deterministic for a given text and seed:
+
+  - Text is split into short word pieces (at most 5 letters or 3 digits, with a
+    leading space attached), so decoded tokens round-trip to the input text.
+    Token ids are a hash of the piece; a BOS token (id 1) is prepended, and its
+    prompt_logprobs entry is None as with Llama models.
+  - Each token's rank and logprob are derived from a hash of (seed, previous
+    token id, token id). About 45% of tokens are the top-1 prediction; the rest
+    get a geometric rank and come with the top-1 alternative(s).
+
+Latency, failures and payload size follow a `MockProfile`: requests wait for one
+of `max_num_seqs` slots (like a server's batch), then take
+`latency_ms + per_token_ms * prompt_tokens` with lognormal jitter.
+
+Usage:
+    python serving/serve_mock.py --port 9100 --profile realistic
+    run_mock_server(PROFILES["flaky"], port=9100)
+"""
+
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+import zlib
+from dataclasses import dataclass, replace
+
+import numpy as np
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+BOS_TOKEN_ID = 1
+_SPECIAL_TOKENS = 256
+_PIECE_RE = re.compile(r" ?[A-Za-z]{1,5}| ?\d{1,3}| ?[^\sA-Za-z\d]|\s+")
+
+
+@dataclass
+class MockProfile:
+    """Latency, failure and payload-size behaviour of the mock server.
+
+    Args:
+        latency_ms: Fixed time per request, e.g. scheduling and the one
+            generated token.
+        per_token_ms: Prefill time per prompt token.
+        jitter: Sigma of the lognormal multiplier applied to each request's
+            latency.
+        max_num_seqs: Requests processed at once; the rest queue, as on a
+            saturated server.
+        error_rate: Fraction of requests answered with an HTTP 500 error payload.
+        max_model_len: Longer prompts are rejected with HTTP 400, like vLLM.
+        extra_alternatives: Extra candidates added to every prompt_logprobs
+            position, to inflate payloads like a larger `prompt_logprobs` value
+            would.
+        vocab_size: Token ids are drawn from [256, vocab_size).
+        seed: Seed for the synthetic logprobs; also mixed with the model name.
+    """
+
+    latency_ms: float = 20.0
+    per_token_ms: float = 0.05
+    jitter: float = 0.2
+    max_num_seqs: int = 64
+    error_rate: float = 0.0
+    max_model_len: int = 8192
+    extra_alternatives: int = 0
+    vocab_size: int = 128_000
+    seed: int = 0
+
+
+PROFILES: dict[str, MockProfile] = {
+    #   No latency at all: measures the client alone
+    "instant": MockProfile(latency_ms=0.0, per_token_ms=0.0, jitter=0.0, max_num_seqs=1024),
+    #   Roughly a 70B model on one node scoring short documents
+    "realistic": MockProfile(),
+    #   One request in twenty fails, with heavy latency tails
+    "flaky": MockProfile(error_rate=0.05, jitter=0.8),
+    #   Few slots and slow prefill: requests queue on the server
+    "overloaded": MockProfile(latency_ms=50.0, per_token_ms=0.2, max_num_seqs=8),
+    #   Many candidates per position: multi-megabyte responses
+    "large-payload": MockProfile(extra_alternatives=8),
+    #   A server started with a small MAX_MODEL_LEN
+    "short-context": MockProfile(max_model_len=512),
+}
+
+
+# -----------------------------------------------------------------------------
+# Deterministic tokenizer and logprobs
+# -----------------------------------------------------------------------------
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: a fast, well-distributed hash of uint64 values."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _uniform(h: np.ndarray) -> np.ndarray:
+    """Map uint64 hashes to floats in [0, 1)."""
+    return (h >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+class MockTokenizer:
+    """Splits text into word pieces with hashed ids, remembering ids for decoding."""
+
+    def __init__(self, vocab_size: int):
+        self.vocab_size = vocab_size
+        self.id_to_piece: dict[int, str] = {BOS_TOKEN_ID: "<s>"}
+
+    def encode(self, text: str, add_bos: bool = True) -> list[int]:
+        ids = [BOS_TOKEN_ID] if add_bos else []
+        span = self.vocab_size - _SPECIAL_TOKENS
+        for piece in _PIECE_RE.findall(text):
+            token_id = zlib.crc32(piece.encode("utf-8")) % span + _SPECIAL_TOKENS
+            self.id_to_piece.setdefault(token_id, piece)
+            ids.append(token_id)
+        return ids
+
+    def decode_token(self, token_id: int) -> str:
+        return self.id_to_piece.get(token_id, f"<{token_id}>")
+
+
+def synthetic_prompt_logprobs(
+    token_ids: list[int],
+    model: str,
+    k: int,
+    profile: MockProfile,
+    tokenizer: MockTokenizer,
+) -> list[dict | None]:
+    """vLLM-style prompt_logprobs for `token_ids`, deterministic in (model, seed, ids)."""
+    n = len(token_ids)
+    if n == 0:
+        return []
+    ids = np.asarray(token_ids, dtype=np.uint64)
+    prev = np.concatenate([np.zeros(1, dtype=np.uint64), ids[:-1]])
+    salt = np.uint64(zlib.crc32(model.encode("utf-8")) ^ (profile.seed * 0x9E3779B1))
+    h = _mix(salt ^ (prev * np.uint64(0x9E3779B97F4A7C15)) ^ (ids * np.uint64(0xC2B2AE3D27D4EB4F)))
+    u1 = _uniform(h)
+    u2 = _uniform(_mix(h))
+
+    is_top1 = u1 < 0.45
+    ranks = np.where(is_top1, 1, 2 + np.floor(np.log1p(-u2) / np.log1p(-0.08))).astype(np.int64)
+    ranks = np.minimum(ranks, profile.vocab_size)
+    top1_logprobs = -0.05 - 1.5 * u2 * u2
+    logprobs = np.where(is_top1, top1_logprobs, top1_logprobs - 0.3 - 1.3 * np.log(ranks))
+    span = profile.vocab_size - _SPECIAL_TOKENS
+
+    out: list[dict | None] = [None]
+    for i in range(1, n):
+        token_id = int(ids[i])
+        rank = int(ranks[i])
+        entries = {
+            str(token_id): {
+                "logprob": float(logprobs[i]),
+                "rank": rank,
+                "decoded_token": tokenizer.decode_token(token_id),
+            }
+        }
+        #   The top-k candidates (excluding the prompt token's own slot), plus
+        #   any padding candidates, with logprobs decreasing by rank
+        n_alts = k + profile.extra_alternatives
+        alt_h = int(h[i])
+        for alt_rank in range(1, n_alts + 1):
+            if alt_rank == rank:
+                continue
+            alt_h = (alt_h * 6364136223846793005 + 1442695040888963407) & (2**64 - 1)
+            alt_id = alt_h % span + _SPECIAL_TOKENS
+            if str(alt_id) in entries:
+                continue
+            entries[str(alt_id)] = {
+                "logprob": float(top1_logprobs[i]) - 0.7 * (alt_rank - 1),
+                "rank": alt_rank,
+                "decoded_token": tokenizer.decode_token(alt_id),
+            }
+        out.append(entries)
+    return out
+
+
+# -----------------------------------------------------------------------------
+# Server
+# -----------------------------------------------------------------------------
+def _error(message: str, status: int) -> web.Response:
+    error_type = "BadRequestError" if status < 500 else "InternalServerError"
+    body = {"object": "error", "message": message, "type": error_type, "code": status}
+    return web.json_response(body, status=status)
+
+
+def _normalize_prompts(prompt) -> list[str | list[int]]:
+    """A prompt may be a string, token ids, or a list of either."""
+    if isinstance(prompt, str):
+        return [prompt]
+    if isinstance(prompt, list) and prompt and isinstance(prompt[0], int):
+        return [prompt]
+    return list(prompt)
+
+
+def create_app(profile: MockProfile | None = None) -> web.Application:
+    """Build the aiohttp application for a mock server with `profile`."""
+    profile = profile or MockProfile()
+    tokenizer = MockTokenizer(profile.vocab_size)
+    slots = asyncio.Semaphore(profile.max_num_seqs)
+    rng = random.Random(profile.seed)
+
+    async def simulate_work(n_tokens: int) -> None:
+        latency = (profile.latency_ms + profile.per_token_ms * n_tokens) / 1000.0
+        if profile.jitter > 0:
+            latency *= rng.lognormvariate(0.0, profile.jitter)
+        async with slots:
+            await asyncio.sleep(latency)
+
+    async def completions(request: web.Request) -> web.Response:
+        body = await request.json()
+        model = body.get("model", "mock")
+        k = body.get("prompt_logprobs")
+        prompts = [
+            p if isinstance(p, list) else tokenizer.encode(p)
+            for p in _normalize_prompts(body.get("prompt", ""))
+        ]
+        n_tokens = sum(len(p) for p in prompts)
+        for p in prompts:
+            if len(p) + body.get("max_tokens", 16) > profile.max_model_len:
+                return _error(
+                    f"This model's maximum context length is {profile.max_model_len} tokens. "
+                    f"However, you requested {len(p) + body.get('max_tokens', 16)} tokens.",
+                    status=400,
+                )
+
+        await simulate_work(n_tokens)
+        if rng.random() < profile.error_rate:
+            return _error("Mock server injected failure", status=500)
+
+        choices = []
+        for index, token_ids in enumerate(prompts):
+            text = "".join(tokenizer.decode_token(t) for t in token_ids if t != BOS_TOKEN_ID)
+            choices.append(
+                {
+                    "index": index,
+                    "text": text if body.get("echo") else "",
+                    "logprobs": None,
+                    "finish_reason": "length",
+                    "stop_reason": None,
+                    "prompt_logprobs": (
+                        synthetic_prompt_logprobs(token_ids, model, k, profile, tokenizer)
+                        if k is not None
+                        else None
+                    ),
+                    "prompt_token_ids": token_ids,
+                }
+            )
+        response = {
+            "id": f"cmpl-mock-{rng.getrandbits(32):08x}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": choices,
+            "usage": {
+                "prompt_tokens": n_tokens,
+                "completion_tokens": len(prompts),
+                "total_tokens": n_tokens + len(prompts),
+            },
+        }
+        return web.Response(body=json.dumps(response), content_type="application/json")
+
+    async def tokenize(request: web.Request) -> web.Response:
+        body = await request.json()
+        tokens = tokenizer.encode(body.get("prompt", ""), body.get("add_special_tokens", True))
+        return web.json_response(
+            {"count": len(tokens), "max_model_len": profile.max_model_len, "tokens": tokens}
+        )
+
+    async def models(request: web.Request) -> web.Response:
+        return web.json_response(
+            {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]}
+        )
+
+    async def health(request: web.Request) -> web.Response:
+        return web.Response(text="")
+
+    app = web.Application(client_max_size=256 * 2**20)
+    app.router.add_post("/v1/completions", completions)
+    app.router.add_post("/tokenize", tokenize)
+    app.router.add_get("/v1/models", models)
+    app.router.add_get("/health", health)
+    return app
+
+
+def get_profile(name: str, **overrides) -> MockProfile:
+    """Look up a named profile, replacing any fields given as keyword arguments."""
+    if name not in PROFILES:
+        raise ValueError(f"Unknown profile {name!r}; choose from {sorted(PROFILES)}")
+    overrides = {k: v for k, v in overrides.items() if v is not None}
+    return replace(PROFILES[name], **overrides)
+
+
+def run_mock_server(profile: MockProfile, host: str = "localhost", port: int = 8000) -> None:
+    """Serve a mock server until interrupted."""
+    logger.info(f"Serving mock vLLM on http://{host}:{port} with {profile}")
+    web.run_app(create_app(profile), host=host, port=port, print=None)
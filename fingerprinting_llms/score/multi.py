@@ -0,0 +1,344 @@
+"""
+Multi-model scoring.
+
+Attribution work scores every text with several models (e.g. Llama 70B, Llama
+8B and Mixtral). Instead of one run and one output tree per model, joined later
+by path substitution, a multi-model job reads each document once, sends it to
+every model's endpoints concurrently, and writes a single record per document
+holding one LogProbs per model.
+
+Models with different tokenizers produce series of different lengths, so the
+record can also align every model's series onto one reference model's tokens by
+character position (see `MultiModelLogProbs.aligned`).
+
+Record layout (.npz):
+  - models              : np.ndarray[str]  model names, in order
+  - <name>/<column>     : the LogProbs arrays of each model
+                          (decoded_tokens, token_ids, token_ranks, token_probs,
+                          and full_context / topk_* if set)
+
+Usage:
+    targets = [
+        ModelTarget("llama70b", "/disk2/dma0523/models/llama3.1-70b-w4a16", ["http://localhost:9003"]),
+        ModelTarget("mixtral", "/proj/redline/team/mcg/models/Mixtral-8x7B-Instruct-v0.1",
+                    ["http://localhost:9002"]),
+    ]
+    result = run_score_corpus_multi(jobs, targets)
+    record = MultiModelLogProbs.from_file("data/tokens/multi/....txt.npz")
+    aligned = record.aligned(reference="llama70b")   # {name: token_probs on llama70b tokens}
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import aiohttp
+import numpy as np
+import numpy.typing as npt
+
+from fingerprinting_llms.io.atomic import atomic_write
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.cache import LogProbsCache
+from fingerprinting_llms.score.corpus import (
+    FAILED,
+    SCORED,
+    SKIPPED,
+    CorpusResult,
+    ScoringJob,
+    cache_identity,
+    make_pool,
+    run_jobs,
+    score_text_async,
+    topk_identity,
+)
+from fingerprinting_llms.score.extract import EndpointPool, load_text_from_file
+from fingerprinting_llms.score.manifest import (
+    STATUS_DONE,
+    STATUS_FAILED,
+    RunManifest,
+    hash_text,
+)
+from fingerprinting_llms.score.metrics import STAGE_WRITE, ScoringMetrics, timed
+
+logger = logging.getLogger(__name__)
+
+LOGPROBS_COLUMNS = ("decoded_tokens", "token_ids", "token_ranks", "token_probs")
+OPTIONAL_COLUMNS = ("full_context", "topk_offsets", "topk_ids", "topk_logprobs")
+
+
+@dataclass
+class ModelTarget:
+    """A model to score with: a short record name, the served model name, and its servers."""
+
+    name: str
+    model: str
+    servers: list[str] = field(default_factory=list)
+
+
+def char_offsets(logprobs: LogProbs) -> npt.NDArray[np.int64]:
+    """Character offset at which each token starts in the concatenated decoded text."""
+    lengths = np.fromiter(
+        (len(token) for token in logprobs.decoded_tokens.tolist()),
+        dtype=np.int64,
+        count=logprobs.size,
+    )
+    return np.cumsum(lengths) - lengths
+
+
+@dataclass
+class MultiModelLogProbs:
+    models: dict[str, LogProbs]
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.models)
+
+    def aligned(
+        self,
+        reference: str,
+        column: str = "token_probs",
+    ) -> dict[str, np.ndarray]:
+        """Align every model's `column` onto the tokens of the `reference` model.
+
+        For each reference token, the value is taken from the token of the other
+        model whose character span contains the reference token's first
+        character. Models sharing the reference tokenizer come back unchanged.
+
+        Returns:
+            dict[str, np.ndarray]: one array per model, each of the reference
+                model's length
+        """
+        ref_offsets = char_offsets(self.models[reference])
+        aligned = {}
+        for name, logprobs in self.models.items():
+            values = np.asarray(getattr(logprobs, column))
+            if name == reference:
+                aligned[name] = values
+                continue
+            offsets = char_offsets(logprobs)
+            idx = np.searchsorted(offsets, ref_offsets, side="right") - 1
+            aligned[name] = values[np.clip(idx, 0, max(0, len(values) - 1))]
+        return aligned
+
+    def save_npz(self, filepath: str | Path, *, compressed: bool = True) -> None:
+        """Save all models' LogProbs into one .npz, written atomically."""
+        arrays: dict[str, Any] = {"models": np.asarray(self.names, dtype=np.str_)}
+        for name, logprobs in self.models.items():
+            for column in LOGPROBS_COLUMNS:
+                arrays[f"{name}/{column}"] = np.asarray(getattr(logprobs, column))
+            for column in OPTIONAL_COLUMNS:
+                if getattr(logprobs, column) is not None:
+                    arrays[f"{name}/{column}"] = np.asarray(getattr(logprobs, column))
+
+        filepath = Path(filepath)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        saver = np.savez_compressed if compressed else np.savez
+        logger.info(f"Saving {len(self.models)} models to {filepath} with compressed {compressed}")
+        with atomic_write(filepath) as f:
+            saver(f, **arrays)
+
+    @staticmethod
+    def from_file(path: str | Path) -> "MultiModelLogProbs":
+        """Load a record written by `save_npz`.
+
+        Raises:
+            FileNotFoundError: if the file does not exist.
+            KeyError: if required arrays are missing.
+        """
+        p = Path(path)
+        if not p.exists():
+            raise FileNotFoundError(p)
+
+        models = {}
+        with np.load(p) as z:
+            try:
+                for name in z["models"].tolist():
+                    models[name] = LogProbs(
+                        **{column: z[f"{name}/{column}"] for column in LOGPROBS_COLUMNS},
+                        **{
+                            column: z[f"{name}/{column}"]
+                            for column in OPTIONAL_COLUMNS
+                            if f"{name}/{column}" in z.files
+                        },
+                    )
+            except KeyError as e:
+                raise KeyError(f"Missing array in NPZ: {e}") from e
+        return MultiModelLogProbs(models=models)
+
+
+async def _score_job_multi(
+    session: aiohttp.ClientSession,
+    targets: list[ModelTarget],
+    pools: dict[str, EndpointPool],
+    job: ScoringJob,
+    manifest: RunManifest | None = None,
+    cache: LogProbsCache | None = None,
+    window_tokens: int | None = None,
+    overlap_tokens: int = 0,
+    metrics: ScoringMetrics | None = None,
+    top_k: int = 1,
+) -> str:
+    """Score one document with every target and write the combined record."""
+    text = await asyncio.to_thread(load_text_from_file, job.input_filepath)
+    text_hash = hash_text(text)
+    run_model = ";".join(f"{t.name}={topk_identity(t.model, top_k)}" for t in targets)
+    if manifest is not None and manifest.is_done(
+        job.input_filepath, job.output_filepath, text_hash, run_model
+    ):
+        return SKIPPED
+
+    async def score_target(target: ModelTarget) -> LogProbs | None:
+        cache_model = cache_identity(target.model, window_tokens, overlap_tokens, top_k=top_k)
+        if cache is not None:
+            logprobs = await asyncio.to_thread(cache.get, cache_model, text)
+            if logprobs is not None:
+                return logprobs
+        logprobs = await score_text_async(
+            session=session,
+            pool=pools[target.name],
+            model=target.model,
+            text=text,
+            window_tokens=window_tokens,
+            overlap_tokens=overlap_tokens,
+            metrics=metrics,
+            top_k=top_k,
+        )
+        if logprobs is not None and metrics is not None:
+            metrics.observe_tokens(logprobs.size)
+        if logprobs is not None and cache is not None:
+            try:
+                await asyncio.to_thread(cache.put, cache_model, text, logprobs)
+            except OSError as err:
+                logger.warning(f"Could not cache {job.input_filepath} ({target.name}): {err!r}")
+        return logprobs
+
+    try:
+        results = await asyncio.gather(*(score_target(t) for t in targets))
+        models = {
+            t.name: logprobs
+            for t, logprobs in zip(targets, results, strict=True)
+            if logprobs is not None
+        }
+        ok = len(models) == len(targets)
+        if ok:
+            record = MultiModelLogProbs(models=models)
+            with timed(metrics, STAGE_WRITE):
+                await asyncio.to_thread(record.save_npz, job.output_filepath)
+    except Exception as err:
+        logger.warning(f"Failed to score {job.input_filepath}: {err!r}")
+        ok = False
+
+    if manifest is not None:
+        status = STATUS_DONE if ok else STATUS_FAILED
+        manifest.record(
+            job.input_filepath, job.output_filepath, text_hash, run_model, status=status
+        )
+    return SCORED if ok else FAILED
+
+
+async def score_corpus_multi(
+    jobs: list[ScoringJob],
+    targets: list[ModelTarget],
+    concurrency: int = 16,
+    manifest: RunManifest | None = None,
+    cache: LogProbsCache | None = None,
+    window_tokens: int | None = None,
+    overlap_tokens: int = 0,
+    metrics: ScoringMetrics | None = None,
+    pool_options: dict | None = None,
+    top_k: int = 1,
+) -> CorpusResult:
+    """Score every job with every target model, writing one record per document.
+
+    Each document is read once and sent to all targets concurrently. A
+    document only counts as scored if every model scored it.
+
+    Args:
+        jobs: Input/output file pairs to score
+        targets: Models to score with; names must be unique
+        concurrency: Number of concurrent requests per server
+        manifest: Optional run manifest (see `score_corpus`)
+        cache: Optional LogProbs cache consulted and filled per model
+        window_tokens: If set, score in overlapping token windows (see `chunked`)
+        overlap_tokens: Tokens of overlap between consecutive windows
+        metrics: Optional ScoringMetrics (see `score_corpus`); tokens are
+            counted per model
+        pool_options: Extra EndpointPool arguments for every model's pool
+            (e.g. request_timeout, deadline, adaptive)
+        top_k: If > 1, also keep the top-k candidates of every position for
+            every model (see `score_corpus`)
+
+    Returns:
+        CorpusResult: input filepaths that were scored, skipped or failed
+    """
+    names = [t.name for t in targets]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Model target names must be unique, got {names}")
+    pools = {
+        t.name: make_pool(t.servers, concurrency=concurrency, **(pool_options or {}))
+        for t in targets
+    }
+
+    async def score_job(session: aiohttp.ClientSession, job: ScoringJob) -> str:
+        return await _score_job_multi(
+            session=session,
+            targets=targets,
+            pools=pools,
+            job=job,
+            manifest=manifest,
+            cache=cache,
+            window_tokens=window_tokens,
+            overlap_tokens=overlap_tokens,
+            metrics=metrics,
+            top_k=top_k,
+        )
+
+    #   Every document holds one request per model, so the busiest model's
+    #   capacity bounds how many documents are worth keeping in flight
+    n_workers = max(pool.max_in_flight * len(pool) for pool in pools.values())
+    result = await run_jobs(
+        jobs,
+        score_job,
+        n_workers=n_workers,
+        connection_limit=sum(pool.max_in_flight * len(pool) for pool in pools.values()),
+        metrics=metrics,
+    )
+
+    for name, pool in pools.items():
+        for endpoint in pool.endpoints:
+            logger.info(
+                f"{name} {endpoint.server} : completed={endpoint.completed} "
+                f"failed={endpoint.failed} limit={endpoint.limit:.1f}"
+            )
+    return result
+
+
+def run_score_corpus_multi(
+    jobs: list[ScoringJob],
+    targets: list[ModelTarget],
+    concurrency: int = 16,
+    manifest: RunManifest | None = None,
+    cache: LogProbsCache | None = None,
+    window_tokens: int | None = None,
+    overlap_tokens: int = 0,
+    metrics: ScoringMetrics | None = None,
+    pool_options: dict | None = None,
+    top_k: int = 1,
+) -> CorpusResult:
+    """Synchronous entry point for `score_corpus_multi`."""
+    return asyncio.run(
+        score_corpus_multi(
+            jobs=jobs,
+            targets=targets,
+            concurrency=concurrency,
+            manifest=manifest,
+            cache=cache,
+            window_tokens=window_tokens,
+            overlap_tokens=overlap_tokens,
+            metrics=metrics,
+            pool_options=pool_options,
+            top_k=top_k,
+        )
+    )
@@ -0,0 +1,401 @@
+"""
+Single-file columnar store for a corpus of LogProbs.
+
+A scored dataset is thousands of small compressed .npz files, and loading it
+means opening, decompressing and closing every one of them, which takes minutes
+on a network filesystem. A `CorpusStore` packs all of a tree's documents into
+one file of concatenated columns plus an offsets index, so loading a dataset is
+a handful of large sequential reads.
+
+Layout (.npz, uncompressed so it can be read sequentially or memory-mapped):
+  - attrs              : JSON str   store-level attributes (format, source root, ...)
+  - paths              : str        document names, e.g. paths relative to the tree root
+  - metadata           : JSON str   list with one dict per document (see `pack_npz_tree`)
+  - offsets            : int64      n_docs + 1; document i is rows offsets[i]:offsets[i + 1]
+  - token_ids          : int32      all documents' token columns, concatenated
+  - token_ranks        : int32
+  - token_probs        : float32
+  - token_text         : uint8      decoded tokens as one UTF-8 blob ...
+  - token_text_offsets : int64      ... n_tokens + 1 byte offsets into it
+  - full_context       : bool       (only if every document has it)
+  - topk_offsets       : int64      (only if every document has top-k; n_tokens + 1,
+  - topk_ids           : int32       global offsets into the flat top-k columns)
+  - topk_logprobs      : float32
+
+Decoded tokens are kept as UTF-8 bytes with offsets rather than a NumPy str_
+array, which is fixed-width UTF-32 padded to the corpus' longest token.
+
+Usage:
+    store = pack_npz_tree("data/tokens/human_llama-graded/hc3", "data/stores/hc3_human_llama.npz")
+    store = CorpusStore.load("data/stores/hc3_human_llama.npz", mmap=True)
+    logprobs = store[0]                              # LogProbs view of one document
+    series = store.split("token_probs")              # list of per-document arrays
+"""
+
+import json
+import logging
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+from fingerprinting_llms.io.atomic import atomic_write
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.encoding import encode_logprobs, encode_ranks, read_column
+from fingerprinting_llms.score.lazy import NpzColumns
+from fingerprinting_llms.score.manifest import RunManifest
+from fingerprinting_llms.score.vocab import VOCAB_PREFIX
+
+logger = logging.getLogger(__name__)
+
+STORE_FORMAT = "corpus-store-v1"
+
+#   Per-token columns that split on `offsets`
+TOKEN_COLUMNS = ("token_ids", "token_ranks", "token_probs", "full_context")
+
+
+@dataclass
+class CorpusStore:
+    paths: npt.NDArray[np.str_]
+    offsets: npt.NDArray[np.int64]
+    token_ids: npt.NDArray[np.int32]
+    token_ranks: npt.NDArray[np.int32]
+    token_probs: npt.NDArray[np.float32]
+    token_text: npt.NDArray[np.uint8]
+    token_text_offsets: npt.NDArray[np.int64]
+    full_context: npt.NDArray[np.bool_] | None = None
+    topk_offsets: npt.NDArray[np.int64] | None = None
+    topk_ids: npt.NDArray[np.int32] | None = None
+    topk_logprobs: npt.NDArray[np.float32] | None = None
+    metadata: list[dict] = field(default_factory=list)
+    attrs: dict = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        if not self.metadata:
+            self.metadata = [{} for _ in range(len(self.paths))]
+        self._index: dict[str, int] | None = None
+
+    # -------------------------------------------------------------------------
+    # Access
+    # -------------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    @property
+    def n_tokens(self) -> int:
+        return int(self.offsets[-1])
+
+    def lengths(self) -> npt.NDArray[np.int64]:
+        """Number of tokens in each document."""
+        return np.diff(self.offsets)
+
+    def index(self, path: str) -> int:
+        """Position of the document stored under `path`."""
+        if self._index is None:
+            self._index = {p: i for i, p in enumerate(self.paths.tolist())}
+        return self._index[path]
+
+    def column(self, name: str, i: int) -> np.ndarray:
+        """Zero-copy view of per-token column `name` for document `i`."""
+        return getattr(self, name)[self.offsets[i] : self.offsets[i + 1]]
+
+    def topk_column(self, name: str, i: int) -> np.ndarray:
+        """Top-k column `name` of document `i`, as in `document(i)`.
+
+        topk_ids and topk_logprobs are zero-copy views; topk_offsets are
+        rebased to start at 0.
+
+        Raises:
+            ValueError: if the store has no top-k columns
+        """
+        if self.topk_offsets is None:
+            raise ValueError("The store has no top-k columns")
+        topk_offsets = self.topk_offsets[self.offsets[i] : self.offsets[i + 1] + 1]
+        if name == "topk_offsets":
+            return topk_offsets - topk_offsets[0]
+        return getattr(self, name)[topk_offsets[0] : topk_offsets[-1]]
+
+    def split(self, name: str) -> list[np.ndarray]:
+        """Per-document views of per-token column `name`."""
+        return np.split(getattr(self, name), self.offsets[1:-1])
+
+    def decoded_tokens(self, i: int) -> npt.NDArray[np.str_]:
+        """Decoded tokens of document `i`."""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        text_offsets = self.token_text_offsets[start : end + 1]
+        blob = self.token_text[text_offsets[0] : text_offsets[-1]].tobytes()
+        base = text_offsets[0]
+        return np.asarray(
+            [
+                blob[a - base : b - base].decode("utf-8")
+                for a, b in zip(text_offsets[:-1].tolist(), text_offsets[1:].tolist(), strict=True)
+            ],
+            dtype=np.str_,
+        )
+
+    def document(self, i: int) -> LogProbs:
+        """LogProbs of document `i`; its numeric columns are views into the store."""
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        topk: dict[str, Any] = {}
+        #   The three top-k columns are set together
+        if (
+            self.topk_offsets is not None
+            and self.topk_ids is not None
+            and self.topk_logprobs is not None
+        ):
+            topk_offsets = self.topk_offsets[start : end + 1]
+            lo, hi = int(topk_offsets[0]), int(topk_offsets[-1])
+            topk = {
+                "topk_offsets": topk_offsets - lo,
+                "topk_ids": self.topk_ids[lo:hi],
+                "topk_logprobs": self.topk_logprobs[lo:hi],
+            }
+        return LogProbs(
+            decoded_tokens=self.decoded_tokens(i),
+            token_ids=self.token_ids[start:end],
+            token_ranks=self.token_ranks[start:end],
+            token_probs=self.token_probs[start:end],
+            full_context=None if self.full_context is None else self.full_context[start:end],
+            **topk,
+        )
+
+    def __getitem__(self, key: int | str) -> LogProbs:
+        return self.document(self.index(key) if isinstance(key, str) else key)
+
+    def __iter__(self) -> Iterator[LogProbs]:
+        for i in range(len(self)):
+            yield self.document(i)
+
+    # -------------------------------------------------------------------------
+    # Building
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def from_logprobs(
+        documents: Iterable[tuple[str, LogProbs]],
+        metadata: list[dict] | None = None,
+        attrs: dict | None = None,
+    ) -> "CorpusStore":
+        """Pack (path, LogProbs) pairs into a store.
+
+        Optional columns (full_context, top-k) are kept only if every document
+        has them.
+        """
+        paths: list[str] = []
+        docs: list[LogProbs] = []
+        for path, logprobs in documents:
+            paths.append(path)
+            docs.append(logprobs)
+
+        lengths = np.fromiter((d.size for d in docs), dtype=np.int64, count=len(docs))
+        offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        def concat(name: str, dtype) -> np.ndarray:
+            return np.concatenate(
+                [np.asarray(getattr(d, name), dtype=dtype) for d in docs] or [np.empty(0, dtype)]
+            )
+
+        encoded = [t.encode("utf-8") for d in docs for t in d.decoded_tokens.tolist()]
+        text_lengths = np.fromiter((len(t) for t in encoded), dtype=np.int64, count=len(encoded))
+        token_text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(text_lengths, out=token_text_offsets[1:])
+
+        optional: dict[str, Any] = {}
+        if docs and all(d.full_context is not None for d in docs):
+            optional["full_context"] = concat("full_context", np.bool_)
+        if docs and all(d.has_topk for d in docs):
+            counts = np.concatenate([d._topk_counts() for d in docs])
+            topk_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+            np.cumsum(counts, out=topk_offsets[1:])
+            optional["topk_offsets"] = topk_offsets
+            optional["topk_ids"] = concat("topk_ids", np.int32)
+            optional["topk_logprobs"] = concat("topk_logprobs", np.float32)
+
+        return CorpusStore(
+            paths=np.asarray(paths, dtype=np.str_),
+            offsets=offsets,
+            token_ids=concat("token_ids", np.int32),
+            token_ranks=concat("token_ranks", np.int32),
+            token_probs=concat("token_probs", np.float32),
+            token_text=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            token_text_offsets=token_text_offsets,
+            metadata=metadata or [],
+            attrs=attrs or {},
+            **optional,
+        )
+
+    # -------------------------------------------------------------------------
+    # Serialization
+    # -------------------------------------------------------------------------
+    def save(
+        self,
+        filepath: str | Path,
+        logprobs_encoding: str = "float32",
+        ranks_encoding: str = "int32",
+    ) -> None:
+        """Write the store to one uncompressed .npz file, atomically.
+
+        Args:
+            filepath: Path to write to
+            logprobs_encoding: "float32" (exact), "float16" or "q16"; see
+                fingerprinting_llms.score.encoding
+            ranks_encoding: "int32" or "uint16" (both exact)
+        """
+        arrays: dict[str, Any] = {
+            "attrs": np.asarray(json.dumps({"format": STORE_FORMAT} | self.attrs)),
+            "paths": self.paths,
+            "metadata": np.asarray(json.dumps(self.metadata)),
+            "offsets": self.offsets,
+            "token_ids": self.token_ids,
+            **encode_ranks("token_ranks", self.token_ranks, ranks_encoding),
+            **encode_logprobs("token_probs", self.token_probs, logprobs_encoding),
+            "token_text": self.token_text,
+            "token_text_offsets": self.token_text_offsets,
+        }
+        for name in ("full_context", "topk_offsets", "topk_ids"):
+            if getattr(self, name) is not None:
+                arrays[name] = getattr(self, name)
+        if self.topk_logprobs is not None:
+            arrays |= encode_logprobs("topk_logprobs", self.topk_logprobs, logprobs_encoding)
+
+        filepath = Path(filepath)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(filepath) as f:
+            np.savez(f, **arrays)
+        logger.info(
+            f"Saved {len(self)} documents ({self.n_tokens} tokens) to {filepath} "
+            f"({filepath.stat().st_size / 2**20:.1f} MB)"
+        )
+
+    @staticmethod
+    def load(filepath: str | Path, mmap: bool = False) -> "CorpusStore":
+        """Load a store written by `save`.
+
+        Args:
+            filepath: Path to the store
+            mmap: If True, memory-map the columns instead of reading them, so
+                only the pages of the columns and documents used are read
+                (columns saved in a 16-bit encoding are decoded, so read whole)
+
+        Raises:
+            FileNotFoundError: if the file does not exist.
+            ValueError: if the file is not a corpus store.
+        """
+        filepath = Path(filepath)
+        if not filepath.exists():
+            raise FileNotFoundError(filepath)
+        z = NpzColumns(filepath, mmap=mmap)
+        if "attrs" not in z:
+            raise ValueError(f"{filepath} is not a corpus store")
+        attrs = json.loads(z["attrs"].item())
+        if attrs.get("format") != STORE_FORMAT:
+            raise ValueError(f"Unsupported corpus store format {attrs.get('format')!r}")
+        arrays = {
+            name: read_column(z, name)
+            for name in z.files
+            if name in CorpusStore.__dataclass_fields__ and name not in ("metadata", "attrs")
+        }
+        metadata = json.loads(z["metadata"].item())
+        return CorpusStore(metadata=metadata, attrs=attrs, **arrays)
+
+
+# -----------------------------------------------------------------------------
+# Converters
+# -----------------------------------------------------------------------------
+def find_npz_files(root: str | Path, pattern: str = "**/*.npz") -> list[Path]:
+    """Sorted .npz files under `root`, skipping hidden (e.g. temporary) and vocabulary files."""
+    root = Path(root)
+    return sorted(
+        p for p in root.glob(pattern) if p.is_file() and not p.name.startswith((".", VOCAB_PREFIX))
+    )
+
+
+def document_metadata(filepath: Path, manifest: RunManifest | None = None) -> dict:
+    """Store metadata of the document packed from `filepath`.
+
+    The file's modification time, plus the input file, model and content hash
+    of the run-manifest entry that wrote it, if any.
+    """
+    metadata: dict[str, Any] = {"mtime": filepath.stat().st_mtime}
+    if manifest is not None:
+        entry = manifest.by_output(filepath)
+        if entry is not None:
+            metadata |= {
+                "input_filepath": entry.input_filepath,
+                "model": entry.model,
+                "content_hash": entry.content_hash,
+            }
+    return metadata
+
+
+def pack_npz_tree(
+    root: str | Path,
+    output_filepath: str | Path | None = None,
+    pattern: str = "**/*.npz",
+    attrs: dict | None = None,
+    manifest: RunManifest | str | Path | None = None,
+) -> CorpusStore:
+    """Pack every LogProbs .npz under `root` into a CorpusStore.
+
+    Documents are named by their path relative to `root`. Files that cannot be
+    loaded (e.g. multi-model records or truncated files) are logged and skipped.
+    Each document's metadata is filled by `document_metadata`.
+
+    Args:
+        root: Root of the NPZ tree, e.g. data/tokens/human_llama-graded/hc3
+        output_filepath: If given, the store is also saved there
+        pattern: Glob of the files to pack, relative to `root`
+        attrs: Extra store-level attributes (e.g. {"model": ...})
+        manifest: Run manifest of the scoring run that wrote the tree (default:
+            <root>/manifest.jsonl, if it exists)
+
+    Returns:
+        CorpusStore: the packed store
+    """
+    root = Path(root)
+    filepaths = find_npz_files(root, pattern)
+    logger.info(f"Packing {len(filepaths)} files under {root}")
+    if manifest is None and (root / "manifest.jsonl").exists():
+        manifest = root / "manifest.jsonl"
+    if manifest is not None and not isinstance(manifest, RunManifest):
+        manifest = RunManifest(manifest)
+
+    paths: list[str] = []
+    docs: list[LogProbs] = []
+    metadata: list[dict] = []
+    for filepath in filepaths:
+        try:
+            logprobs = LogProbs.from_file(filepath)
+        except (KeyError, ValueError, OSError) as err:
+            logger.warning(f"Skipping {filepath}: {err!r}")
+            continue
+        paths.append(str(filepath.relative_to(root)))
+        docs.append(logprobs)
+        metadata.append(document_metadata(filepath, manifest))
+
+    store = CorpusStore.from_logprobs(
+        zip(paths, docs, strict=True),
+        metadata=metadata,
+        attrs={"source_root": str(root)} | (attrs or {}),
+    )
+    if output_filepath is not None:
+        store.save(output_filepath)
+    return store
+
+
+def unpack_store(
+    store: CorpusStore,
+    outputdir: str | Path,
+    compressed: bool = True,
+    **save_options,
+) -> None:
+    """Write every document of `store` back out as one LogProbs .npz under `outputdir`.
+
+    `save_options` are passed to `LogProbs.save_npz` (e.g. logprobs_encoding).
+    """
+    outputdir = Path(outputdir)
+    for i, path in enumerate(store.paths.tolist()):
+        store.document(i).save_npz(outputdir / path, compressed=compressed, **save_options)
@@ -0,0 +1,250 @@
+"""
+Vocabulary-interned token storage.
+
+`LogProbs.decoded_tokens` is saved as a NumPy str_ array: fixed-width UTF-32,
+every entry padded to the document's longest token, and redundant with
+`token_ids`. A `Vocabulary` holds each model's id -> decoded token table once
+per tree, so documents can store ids only and rebuild `decoded_tokens` on load.
+
+vLLM detokenizes prompt tokens in context, so the same id does not always decode
+to the same string (e.g. byte-fallback pieces of a multi-byte character). A
+document saved against a vocabulary therefore keeps the positions and strings
+where its tokens differ from the table, and round-trips exactly.
+
+Layout of an interned document (.npz), instead of `decoded_tokens`:
+  - vocab_hash               : str     fingerprint of the vocabulary it was saved with
+  - decoded_override_positions : int32 positions whose decoded token differs from
+                                       the table (only if there are any)
+  - decoded_override_tokens  : str     their decoded tokens
+
+The vocabulary is saved next to the documents as `vocab-<hash>.npz`, and is
+found by walking up from a document's directory.
+
+Usage:
+    vocab = intern_tree("data/tokens/human_llama-graded/hc3")   # rewrites the tree in place
+    logprobs = LogProbs.from_file("data/tokens/human_llama-graded/hc3/....txt.npz")
+"""
+
+import hashlib
+import logging
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from fingerprinting_llms.io.atomic import atomic_write
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.encoding import stored_encoding
+
+logger = logging.getLogger(__name__)
+
+VOCAB_PREFIX = "vocab-"
+
+
+@dataclass
+class Vocabulary:
+    """Sorted token ids and their decoded tokens, as a UTF-8 blob with offsets."""
+
+    ids: npt.NDArray[np.int32]
+    token_text: npt.NDArray[np.uint8]
+    token_text_offsets: npt.NDArray[np.int64]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @cached_property
+    def tokens(self) -> np.ndarray:
+        """Decoded token of every id, as an object array aligned with `ids`."""
+        blob = self.token_text.tobytes()
+        offsets = self.token_text_offsets.tolist()
+        tokens = np.empty(len(self.ids), dtype=object)
+        tokens[:] = [
+            blob[a:b].decode("utf-8") for a, b in zip(offsets[:-1], offsets[1:], strict=True)
+        ]
+        return tokens
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """Short content hash; documents record it to find their vocabulary."""
+        h = hashlib.sha256()
+        for array in (self.ids, self.token_text, self.token_text_offsets):
+            h.update(np.ascontiguousarray(array).tobytes())
+        return h.hexdigest()[:16]
+
+    @property
+    def filename(self) -> str:
+        return f"{VOCAB_PREFIX}{self.fingerprint}.npz"
+
+    # -------------------------------------------------------------------------
+    # Building
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def from_tokens(table: dict[int, str]) -> "Vocabulary":
+        ids = np.fromiter(sorted(table), dtype=np.int32, count=len(table))
+        encoded = [table[i].encode("utf-8") for i in ids.tolist()]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in encoded], out=offsets[1:])
+        return Vocabulary(
+            ids=ids,
+            token_text=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            token_text_offsets=offsets,
+        )
+
+    @staticmethod
+    def from_logprobs(documents: Iterable[LogProbs]) -> "Vocabulary":
+        """Build the table from documents; each id keeps the first string seen for it."""
+        table: dict[int, str] = {}
+        for logprobs in documents:
+            ids, first = np.unique(np.asarray(logprobs.token_ids), return_index=True)
+            decoded = logprobs.decoded_tokens
+            for token_id, i in zip(ids.tolist(), first.tolist(), strict=True):
+                if token_id not in table:
+                    table[token_id] = str(decoded[i])
+        return Vocabulary.from_tokens(table)
+
+    # -------------------------------------------------------------------------
+    # Encoding
+    # -------------------------------------------------------------------------
+    def decode(
+        self,
+        token_ids: npt.ArrayLike,
+        override_positions: npt.ArrayLike | None = None,
+        override_tokens: npt.ArrayLike | None = None,
+    ) -> npt.NDArray[np.str_]:
+        """Decoded tokens of `token_ids`, with per-position overrides applied.
+
+        Ids missing from the table decode to "" unless overridden.
+        """
+        token_ids = np.asarray(token_ids)
+        if len(token_ids) == 0:
+            return np.asarray([], dtype=np.str_)
+        idx = np.minimum(np.searchsorted(self.ids, token_ids), max(0, len(self.ids) - 1))
+        decoded = np.full(len(token_ids), "", dtype=object)
+        if len(self.ids):
+            known = self.ids[idx] == token_ids
+            decoded[known] = self.tokens[idx[known]]
+        if override_positions is not None:
+            positions = np.asarray(override_positions)
+            decoded[positions] = np.asarray(override_tokens, dtype=object)
+        return decoded.astype(np.str_)
+
+    def overrides(self, logprobs: LogProbs) -> tuple[npt.NDArray[np.int32], npt.NDArray[np.str_]]:
+        """Positions (and their tokens) where `logprobs` differs from this table."""
+        expected = self.decode(logprobs.token_ids)
+        positions = np.flatnonzero(expected != np.asarray(logprobs.decoded_tokens))
+        return positions.astype(np.int32), np.asarray(logprobs.decoded_tokens)[positions]
+
+    # -------------------------------------------------------------------------
+    # Serialization
+    # -------------------------------------------------------------------------
+    def save(self, dirpath: str | Path) -> Path:
+        """Save as `<dirpath>/vocab-<fingerprint>.npz`, atomically; returns the path."""
+        filepath = Path(dirpath) / self.filename
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(filepath) as f:
+            np.savez_compressed(
+                f,
+                ids=self.ids,
+                token_text=self.token_text,
+                token_text_offsets=self.token_text_offsets,
+            )
+        logger.info(f"Saved vocabulary of {len(self)} tokens to {filepath}")
+        return filepath
+
+    @staticmethod
+    def from_file(filepath: str | Path) -> "Vocabulary":
+        with np.load(filepath) as z:
+            return Vocabulary(
+                ids=z["ids"],
+                token_text=z["token_text"],
+                token_text_offsets=z["token_text_offsets"],
+            )
+
+
+@lru_cache(maxsize=16)
+def _load_vocabulary(filepath: Path) -> Vocabulary:
+    return Vocabulary.from_file(filepath)
+
+
+def find_vocabulary(filepath: str | Path, fingerprint: str) -> Vocabulary:
+    """The vocabulary with `fingerprint` in the directory of `filepath` or a parent.
+
+    Loaded vocabularies are cached, so loading a tree's documents reads the
+    table once.
+
+    Raises:
+        FileNotFoundError: if no parent directory holds the vocabulary.
+    """
+    filename = f"{VOCAB_PREFIX}{fingerprint}.npz"
+    for dirpath in Path(filepath).resolve().parents:
+        if (dirpath / filename).exists():
+            return _load_vocabulary(dirpath / filename)
+    raise FileNotFoundError(f"No {filename} in any parent directory of {filepath}")
+
+
+def intern_tree(
+    root: str | Path,
+    pattern: str = "**/*.npz",
+    compressed: bool = True,
+    logprobs_encoding: str | None = None,
+    ranks_encoding: str | None = None,
+) -> Vocabulary:
+    """Intern the decoded tokens of every LogProbs .npz under `root`.
+
+    Builds one vocabulary from all documents, saves it under `root`, and
+    rewrites each document without `decoded_tokens`. Vocabularies under `root`
+    from earlier runs are removed once no document refers to them. Files that
+    cannot be loaded (e.g. multi-model records) are logged and left alone.
+
+    Args:
+        root: Directory of the tree
+        pattern: Glob of the documents under `root`
+        compressed: Rewrite the documents compressed
+        logprobs_encoding: Encoding to rewrite logprobs in (see `LogProbs.save_npz`);
+            None keeps each document's own
+        ranks_encoding: Encoding to rewrite ranks in; None keeps each document's own
+
+    Returns:
+        Vocabulary: the tree's vocabulary
+    """
+    root = Path(root)
+    filepaths = sorted(
+        p for p in root.glob(pattern) if p.is_file() and not p.name.startswith((".", VOCAB_PREFIX))
+    )
+
+    def documents() -> Iterator[tuple[Path, LogProbs]]:
+        for filepath in filepaths:
+            try:
+                yield filepath, LogProbs.from_file(filepath)
+            except (KeyError, ValueError, OSError) as err:
+                logger.warning(f"Skipping {filepath}: {err!r}")
+
+    #   Two passes, so only one document is in memory at a time
+    vocab = Vocabulary.from_logprobs(logprobs for _, logprobs in documents())
+    vocab_filepath = vocab.save(root)
+    n_documents, bytes_before, bytes_after = 0, 0, 0
+    for filepath, logprobs in documents():
+        bytes_before += filepath.stat().st_size
+        with np.load(filepath) as z:
+            #   Re-encoding a 16-bit file as float32 / int32 would undo its savings
+            encodings = {
+                "logprobs_encoding": logprobs_encoding or stored_encoding(z, "token_probs"),
+                "ranks_encoding": ranks_encoding or stored_encoding(z, "token_ranks"),
+            }
+        logprobs.save_npz(filepath, compressed=compressed, vocab=vocab, **encodings)
+        bytes_after += filepath.stat().st_size
+        n_documents += 1
+    logger.info(
+        f"Interned {n_documents} documents against {len(vocab)} tokens : "
+        f"{bytes_before / 2**20:.1f} MB -> {bytes_after / 2**20:.1f} MB "
+        f"(+{vocab_filepath.stat().st_size / 2**20:.1f} MB vocabulary)"
+    )
+
+    for stale in root.glob(f"{VOCAB_PREFIX}*.npz"):
+        if stale != vocab_filepath:
+            logger.info(f"Removing stale vocabulary {stale}")
+            stale.unlink()
+    return vocab
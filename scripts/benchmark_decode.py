@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+"""
+benchmark_decode.py
+
+Compare the reference prompt_logprobs parsing path (json + parse_completions_response)
+against the fast decoder (decode_completions_response) on /v1/completions
+response payloads.
+
+By default, synthetic payloads shaped like vLLM responses are generated for a
+range of document lengths: roughly half of the positions carry only the prompt
+token (it was the top-1 prediction) and the rest also carry the top-1
+alternative, as with "prompt_logprobs": 1. A real response captured from a
+server can be benchmarked instead with --payload.
+
+Usage:
+    python scripts/benchmark_decode.py
+    python scripts/benchmark_decode.py -n 512 4096 32768 -r 50
+    curl -s localhost:9001/v1/completions -H 'Content-Type: application/json' \
+        -d @request.json > response.json
+    python scripts/benchmark_decode.py --payload response.json
+"""
+
+import argparse
+import json
+import logging
+import time
+
+import numpy as np
+
+from fingerprinting_llms.score.decode import decode_completions_response, orjson
+from fingerprinting_llms.score.extract import parse_completions_response
+
+logger = logging.getLogger(__name__)
+
+
+def get_cli_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark prompt_logprobs response decoding")
+    parser.add_argument(
+        "--num-tokens",
+        "-n",
+        type=int,
+        nargs="*",
+        default=[256, 1024, 4096, 16384],
+        help="Document lengths (tokens) of the synthetic payloads",
+    )
+    parser.add_argument(
+        "--payload",
+        type=str,
+        default=None,
+        help="/path/to/response.json captured from a server (replaces synthetic payloads)",
+    )
+    parser.add_argument(
+        "--repeats",
+        "-r",
+        type=int,
+        default=20,
+        help="Number of timed decodes per payload",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="Seed for the synthetic payloads",
+    )
+    return parser.parse_args()
+
+
+def synthetic_payload(n_tokens: int, rng: np.random.Generator) -> bytes:
+    """Build a vLLM-style /v1/completions response with `n_tokens` prompt tokens."""
+    prompt_logprobs: list[dict | None] = [None]
+    token_ids = rng.integers(0, 128_000, size=n_tokens)
+    top1 = rng.random(n_tokens) < 0.45
+    for token_id, is_top1 in zip(token_ids.tolist(), top1.tolist(), strict=True):
+        token = f" tok{token_id}"
+        if is_top1:
+            prompt_logprobs.append(
+                {
+                    str(token_id): {
+                        "logprob": -float(rng.exponential(0.3)),
+                        "rank": 1,
+                        "decoded_token": token,
+                    }
+                }
+            )
+        else:
+            alt_id = int(rng.integers(0, 128_000))
+            prompt_logprobs.append(
+                {
+                    str(token_id): {
+                        "logprob": -float(rng.exponential(4.0)) - 0.5,
+                        "rank": int(rng.geometric(0.05)) + 1,
+                        "decoded_token": token,
+                    },
+                    str(alt_id): {
+                        "logprob": -float(rng.exponential(0.5)),
+                        "rank": 1,
+                        "decoded_token": f" tok{alt_id}",
+                    },
+                }
+            )
+    response = {
+        "id": "cmpl-benchmark",
+        "object": "text_completion",
+        "model": "benchmark",
+        "choices": [
+            {
+                "index": 0,
+                "text": "",
+                "logprobs": None,
+                "finish_reason": "length",
+                "stop_reason": None,
+                "prompt_logprobs": prompt_logprobs,
+                "prompt_token_ids": [1] + token_ids.tolist(),
+            }
+        ],
+    }
+    return json.dumps(response).encode("utf-8")
+
+
+def reference_decode(raw: bytes):
+    return parse_completions_response(json.loads(raw))
+
+
+def time_decoder(decoder, raw: bytes, repeats: int) -> float:
+    """Median seconds per decode."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        decoder(raw)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def main(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(args.seed)
+    if args.payload is not None:
+        with open(args.payload, "rb") as f:
+            payloads = {args.payload: f.read()}
+    else:
+        payloads = {f"{n} tokens": synthetic_payload(n, rng) for n in args.num_tokens}
+
+    print(f"orjson available: {orjson is not None}")
+    print(
+        f"{'payload':>16} {'MB':>7} {'reference ms':>13} {'fast ms':>9} "
+        f"{'speedup':>8} {'fast tok/s':>12}"
+    )
+    for name, raw in payloads.items():
+        expected = reference_decode(raw)
+        actual = decode_completions_response(raw)
+        if expected is None or actual is None:
+            raise AssertionError(f"{name}: the payload is an error response")
+        for field in ("decoded_tokens", "token_ids", "token_ranks", "token_probs"):
+            if not np.array_equal(getattr(expected, field), getattr(actual, field)):
+                raise AssertionError(f"{name}: decoders disagree on {field}")
+
+        t_ref = time_decoder(reference_decode, raw, args.repeats)
+        t_fast = time_decoder(decode_completions_response, raw, args.repeats)
+        print(
+            f"{name:>16} {len(raw) / 2**20:>7.2f} {t_ref * 1e3:>13.2f} {t_fast * 1e3:>9.2f} "
+            f"{t_ref / t_fast:>7.2f}x {actual.size / t_fast:>12,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    args = get_cli_args()
+    #   Keep the reference path's per-document INFO logging out of the timings
+    logging.basicConfig(level=logging.WARNING)
+    main(args)
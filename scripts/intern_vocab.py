@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+"""
+intern_vocab.py
+
+Rewrite a tree of LogProbs .npz files (the output of score_corpus.py) to store
+token ids only, with the decoded tokens kept once in a vocabulary file at the
+root of the tree (see fingerprinting_llms.score.vocab). LogProbs.from_file
+rebuilds decoded_tokens transparently.
+
+Usage:
+    python scripts/intern_vocab.py -i data/tokens/human_llama-graded/hc3
+"""
+
+import argparse
+import logging
+import os
+
+from fingerprinting_llms.io.logger import setup_logger
+from fingerprinting_llms.score.encoding import LOGPROBS_ENCODINGS, RANKS_ENCODINGS
+from fingerprinting_llms.score.vocab import intern_tree
+
+logger = logging.getLogger(__name__)
+
+
+def get_cli_args() -> argparse.Namespace:
+    log_file = f"{os.path.splitext(__file__)[0]}.log"
+    parser = argparse.ArgumentParser(description="Intern the decoded tokens of an NPZ tree")
+    parser.add_argument(
+        "--inputdir",
+        "-i",
+        type=str,
+        required=True,
+        help="/path/to/npz-tree, rewritten in place",
+    )
+    parser.add_argument(
+        "--pattern",
+        "-p",
+        type=str,
+        default="**/*.npz",
+        help="Glob of the files to intern, relative to the input tree",
+    )
+    parser.add_argument(
+        "--uncompressed",
+        action="store_true",
+        help="Write uncompressed .npz files, which LogProbs.from_file(lazy=True) memory-maps",
+    )
+    parser.add_argument(
+        "--logprobs-encoding",
+        type=str,
+        choices=LOGPROBS_ENCODINGS,
+        default=None,
+        help="Rewrite logprobs in this storage encoding (default: keep each file's)",
+    )
+    parser.add_argument(
+        "--ranks-encoding",
+        type=str,
+        choices=RANKS_ENCODINGS,
+        default=None,
+        help="Rewrite ranks in this storage encoding (default: keep each file's)",
+    )
+    parser.add_argument(
+        "--verbose",
+        "-v",
+        action="store_true",
+        help="Enable verbose logging",
+    )
+    parser.add_argument(
+        "--logfile",
+        "-l",
+        default=log_file,
+        type=str,
+        help="Path to log file",
+    )
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    vocab = intern_tree(
+        args.inputdir,
+        pattern=args.pattern,
+        compressed=not args.uncompressed,
+        logprobs_encoding=args.logprobs_encoding,
+        ranks_encoding=args.ranks_encoding,
+    )
+    logger.info(f"Vocabulary {vocab.fingerprint} : {len(vocab)} tokens")
+
+
+if __name__ == "__main__":
+    args = get_cli_args()
+    log_level = logging.DEBUG if args.verbose else logging.INFO
+    setup_logger(log_file=args.logfile, log_level=log_level)
+    main(args)
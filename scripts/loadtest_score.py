@@ -0,0 +1,362 @@
+#! /usr/bin/env python
+"""
+loadtest_score.py
+
+Load-test the corpus scoring client (fingerprinting_llms.score.corpus) and
+report documents/s, tokens/s, per-document latency percentiles and how the
+client's time splits between requests, parsing, decoding and writing.
+
+By default, mock vLLM servers (fingerprinting_llms.score.mock) are started in
+subprocesses, so the client's throughput can be measured without a GPU. Pass
+--servers to load-test real servers instead. Synthetic documents are written to
+a temporary directory and scored through the same request, decode and write
+path as scripts/score_corpus.py.
+
+Usage:
+    python scripts/loadtest_score.py
+    python scripts/loadtest_score.py --mock-servers 4 --mock-profile flaky -n 2000 -c 32
+    python scripts/loadtest_score.py --doc-words 60 -n 5000 -b 4096
+    python scripts/loadtest_score.py --mock-profile short-context --doc-words 2000 -w 480 --overlap-tokens 128
+    python scripts/loadtest_score.py -s http://localhost:9001 -m /disk1/dma0523/models/llama3.1-8b-w4a16
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+import aiohttp
+import numpy as np
+import requests
+
+from fingerprinting_llms.io.logger import setup_logger
+from fingerprinting_llms.score.corpus import (
+    FAILED,
+    SCORED,
+    PromptBatcher,
+    ScoringJob,
+    build_jobs,
+    make_pool,
+    run_jobs,
+    score_text_async,
+)
+from fingerprinting_llms.score.extract import load_text_from_file
+from fingerprinting_llms.score.metrics import STAGE_WRITE, ScoringMetrics, timed
+from fingerprinting_llms.score.mock import PROFILES, get_profile, run_mock_server
+
+logger = logging.getLogger(__name__)
+
+WORDS = (
+    "the of and to in a is that for it as was with be by on not he this are or his from at which "
+    "but have an they you were her she there been one all we their has would when if so no will "
+    "market company shares percent government analysts said year billion million trading prices "
+    "model language attribution fingerprint probability surprisal token context corpus document"
+).split()
+
+
+def get_cli_args() -> argparse.Namespace:
+    log_file = f"{os.path.splitext(__file__)[0]}.log"
+    parser = argparse.ArgumentParser(description="Load-test the corpus scoring client")
+    parser.add_argument(
+        "--servers",
+        "-s",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Server URLs to load-test (default: start mock servers)",
+    )
+    parser.add_argument(
+        "--model",
+        "-m",
+        type=str,
+        default="mock",
+        help="Model name sent with each request",
+    )
+    parser.add_argument(
+        "--mock-servers",
+        type=int,
+        default=2,
+        help="Number of mock servers to start when --servers is not given",
+    )
+    parser.add_argument(
+        "--mock-profile",
+        type=str,
+        default="realistic",
+        choices=sorted(PROFILES),
+        help="Profile of the mock servers",
+    )
+    parser.add_argument(
+        "--mock-port",
+        type=int,
+        default=9100,
+        help="Port of the first mock server; the rest use the following ports",
+    )
+    parser.add_argument(
+        "--num-docs",
+        "-n",
+        type=int,
+        default=500,
+        help="Number of synthetic documents",
+    )
+    parser.add_argument(
+        "--doc-words",
+        type=int,
+        default=400,
+        help="Median document length in words (lengths are lognormal around it)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        "-c",
+        type=int,
+        default=16,
+        help="Number of requests to keep in flight per server",
+    )
+    parser.add_argument(
+        "--fixed-concurrency",
+        action="store_true",
+        help="Keep --concurrency requests in flight per server instead of adapting to its load",
+    )
+    parser.add_argument(
+        "--window-tokens",
+        "-w",
+        type=int,
+        default=None,
+        help="Score in overlapping windows of at most this many tokens",
+    )
+    parser.add_argument(
+        "--overlap-tokens",
+        type=int,
+        default=None,
+        help="Tokens of context shared by consecutive windows when --window-tokens is set "
+        "(default: a quarter of the window)",
+    )
+    parser.add_argument(
+        "--batch-tokens",
+        "-b",
+        type=int,
+        default=None,
+        help="Pack documents into multi-prompt requests of about this many tokens",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="Maximum documents per request when --batch-tokens is set",
+    )
+    parser.add_argument(
+        "--keep-outputs",
+        type=str,
+        default=None,
+        help="Write documents and outputs under this directory instead of a temporary one",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="Seed for the synthetic documents",
+    )
+    parser.add_argument(
+        "--verbose",
+        "-v",
+        action="store_true",
+        help="Enable verbose logging",
+    )
+    parser.add_argument(
+        "--logfile",
+        "-l",
+        default=log_file,
+        type=str,
+        help="Path to log file",
+    )
+    args = parser.parse_args()
+    if args.overlap_tokens is None:
+        args.overlap_tokens = args.window_tokens // 4 if args.window_tokens is not None else 0
+    elif args.window_tokens is not None and not 0 <= args.overlap_tokens < args.window_tokens:
+        parser.error("--overlap-tokens must be at least 0 and less than --window-tokens")
+    return args
+
+
+# -----------------------------------------------------------------------------
+# Setup
+# -----------------------------------------------------------------------------
+def write_synthetic_docs(inputdir: str, num_docs: int, doc_words: int, seed: int) -> list[str]:
+    """Write `num_docs` random-word documents to `inputdir` and return their paths."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(inputdir, exist_ok=True)
+    lengths = np.maximum(1, rng.lognormal(np.log(doc_words), 0.5, size=num_docs)).astype(int)
+    paths = []
+    for i, n_words in enumerate(lengths):
+        words = rng.choice(WORDS, size=n_words)
+        filepath = os.path.join(inputdir, f"doc{i:06d}.txt")
+        with open(filepath, "w", encoding="utf-8") as f:
+            f.write(" ".join(words).capitalize() + ".")
+        paths.append(filepath)
+    return paths
+
+
+def start_mock_servers(
+    n: int, profile_name: str, first_port: int
+) -> tuple[list[str], list[multiprocessing.Process]]:
+    """Start `n` mock servers in subprocesses and wait until they answer."""
+    profile = get_profile(profile_name)
+    servers, processes = [], []
+    for port in range(first_port, first_port + n):
+        process = multiprocessing.Process(
+            target=run_mock_server, args=(profile, "localhost", port), daemon=True
+        )
+        process.start()
+        servers.append(f"http://localhost:{port}")
+        processes.append(process)
+
+    deadline = time.monotonic() + 30
+    for server in servers:
+        while True:
+            try:
+                if requests.get(f"{server}/health", timeout=1).ok:
+                    break
+            except requests.ConnectionError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Mock server {server} did not start")
+            time.sleep(0.1)
+    logger.info(f"Started {n} mock servers with profile {profile_name}: {profile}")
+    return servers, processes
+
+
+# -----------------------------------------------------------------------------
+# Load test
+# -----------------------------------------------------------------------------
+async def load_test(
+    jobs: list[ScoringJob],
+    servers: list[str],
+    model: str,
+    concurrency: int,
+    window_tokens: int | None,
+    overlap_tokens: int,
+    batch_tokens: int | None = None,
+    batch_size: int = 32,
+    adaptive: bool = True,
+) -> dict:
+    """Score `jobs` and collect per-document latencies and token counts."""
+    pool = make_pool(servers, concurrency=concurrency, adaptive=adaptive)
+    metrics = ScoringMetrics()
+    batcher = None
+    n_workers = pool.max_in_flight * len(pool)
+    if batch_tokens is not None:
+        batcher = PromptBatcher(
+            pool, model, max_batch_tokens=batch_tokens, max_batch_size=batch_size, metrics=metrics
+        )
+        n_workers *= batch_size
+    latencies: list[float] = []
+    n_tokens = 0
+
+    async def score_job(session: aiohttp.ClientSession, job: ScoringJob) -> str:
+        nonlocal n_tokens
+        text = await asyncio.to_thread(load_text_from_file, job.input_filepath)
+        start = time.perf_counter()
+        if batcher is not None and batcher.fits(text):
+            logprobs = await batcher.score(session, text)
+        else:
+            logprobs = await score_text_async(
+                session=session,
+                pool=pool,
+                model=model,
+                text=text,
+                window_tokens=window_tokens,
+                overlap_tokens=overlap_tokens,
+                metrics=metrics,
+            )
+        if logprobs is None:
+            return FAILED
+        with timed(metrics, STAGE_WRITE):
+            await asyncio.to_thread(logprobs.save_npz, filepath=job.output_filepath)
+        latencies.append(time.perf_counter() - start)
+        n_tokens += logprobs.size
+        metrics.observe_tokens(logprobs.size)
+        return SCORED
+
+    start = time.perf_counter()
+    result = await run_jobs(
+        jobs,
+        score_job,
+        n_workers=n_workers,
+        connection_limit=pool.max_in_flight * len(pool),
+        metrics=metrics,
+    )
+    elapsed = time.perf_counter() - start
+    return {
+        "result": result,
+        "elapsed": elapsed,
+        "latencies": np.asarray(latencies),
+        "n_tokens": n_tokens,
+        "endpoints": pool.endpoints,
+        "metrics": metrics,
+    }
+
+
+def report(stats: dict) -> None:
+    result, elapsed, latencies = stats["result"], stats["elapsed"], stats["latencies"]
+    n_scored = len(result.scored)
+    print(f"documents     : {n_scored} scored, {len(result.failed)} failed in {elapsed:.2f}s")
+    print(
+        f"throughput    : {n_scored / elapsed:,.1f} docs/s, {stats['n_tokens'] / elapsed:,.0f} tokens/s"
+    )
+    if len(latencies):
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1e3
+        print(
+            f"latency (ms)  : p50 {p50:.1f}  p90 {p90:.1f}  p99 {p99:.1f}  "
+            f"max {latencies.max() * 1e3:.1f}"
+        )
+    for endpoint in stats["endpoints"]:
+        print(
+            f"{endpoint.server:>22} : completed={endpoint.completed} failed={endpoint.failed} "
+            f"limit={endpoint.limit:.1f}"
+        )
+    print(stats["metrics"].summary())
+
+
+def main(args: argparse.Namespace) -> None:
+    processes: list[multiprocessing.Process] = []
+    if args.servers is not None:
+        servers = args.servers
+    else:
+        servers, processes = start_mock_servers(
+            args.mock_servers, args.mock_profile, args.mock_port
+        )
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = args.keep_outputs or tmpdir
+        inputdir = os.path.join(workdir, "docs")
+        input_filepaths = write_synthetic_docs(inputdir, args.num_docs, args.doc_words, args.seed)
+        jobs = build_jobs(
+            input_filepaths, input_root=inputdir, outputdir=os.path.join(workdir, "tokens")
+        )
+        logger.info(f"Load-testing {servers} with {len(jobs)} documents")
+        try:
+            stats = asyncio.run(
+                load_test(
+                    jobs,
+                    servers=servers,
+                    model=args.model,
+                    concurrency=args.concurrency,
+                    window_tokens=args.window_tokens,
+                    overlap_tokens=args.overlap_tokens,
+                    batch_tokens=args.batch_tokens,
+                    batch_size=args.batch_size,
+                    adaptive=not args.fixed_concurrency,
+                )
+            )
+        finally:
+            for process in processes:
+                process.terminate()
+    report(stats)
+
+
+if __name__ == "__main__":
+    args = get_cli_args()
+    log_level = logging.DEBUG if args.verbose else logging.WARNING
+    setup_logger(log_file=args.logfile, log_level=log_level)
+    main(args)
@@ -0,0 +1,155 @@
+#! /usr/bin/env python
+"""
+pack_corpus.py
+
+Pack a tree of LogProbs .npz files (the output of score_corpus.py) into one
+columnar corpus store (see fingerprinting_llms.score.store.CorpusStore), or
+unpack a store back into a tree.
+
+Usage:
+    python scripts/pack_corpus.py \
+        -i data/tokens/human_llama-graded/hc3 \
+        -o data/stores/hc3_human_llama.npz \
+        --attr model=/disk2/dma0523/models/llama3.1-70b-w4a16
+    python scripts/pack_corpus.py --unpack \
+        -i data/stores/hc3_human_llama.npz \
+        -o data/tokens/human_llama-graded/hc3
+"""
+
+import argparse
+import logging
+import os
+
+import numpy as np
+
+from fingerprinting_llms.io.logger import setup_logger
+from fingerprinting_llms.score.encoding import LOGPROBS_ENCODINGS, RANKS_ENCODINGS
+from fingerprinting_llms.score.store import CorpusStore, pack_npz_tree, unpack_store
+
+logger = logging.getLogger(__name__)
+
+
+def get_cli_args() -> argparse.Namespace:
+    log_file = f"{os.path.splitext(__file__)[0]}.log"
+    parser = argparse.ArgumentParser(description="Pack an NPZ tree into a corpus store")
+    parser.add_argument(
+        "--input",
+        "-i",
+        type=str,
+        required=True,
+        help="/path/to/npz-tree, or /path/to/store.npz with --unpack",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        required=True,
+        help="/path/to/store.npz, or /path/to/outputdir with --unpack",
+    )
+    parser.add_argument(
+        "--pattern",
+        "-p",
+        type=str,
+        default="**/*.npz",
+        help="Glob of the files to pack, relative to the input tree",
+    )
+    parser.add_argument(
+        "--attr",
+        "-a",
+        type=str,
+        nargs="*",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Attributes to record in the store, e.g. model=... dataset=hc3",
+    )
+    parser.add_argument(
+        "--manifest",
+        "-m",
+        type=str,
+        default=None,
+        help="Run manifest of the scoring run, whose input file, model and content hash are "
+        "recorded per document (default: <input>/manifest.jsonl, if it exists)",
+    )
+    parser.add_argument(
+        "--logprobs-encoding",
+        type=str,
+        choices=LOGPROBS_ENCODINGS,
+        default="float32",
+        help="Storage encoding of logprobs: float16 and q16 halve their size, with a bounded "
+        "error (see fingerprinting_llms.score.encoding)",
+    )
+    parser.add_argument(
+        "--ranks-encoding",
+        type=str,
+        choices=RANKS_ENCODINGS,
+        default="int32",
+        help="Storage encoding of ranks: uint16 halves their size and is exact",
+    )
+    parser.add_argument(
+        "--unpack",
+        "-u",
+        action="store_true",
+        help="Write a store's documents back out as one .npz per document",
+    )
+    parser.add_argument(
+        "--uncompressed",
+        action="store_true",
+        help="With --unpack, write uncompressed .npz files, which LogProbs.from_file(lazy=True) "
+        "memory-maps",
+    )
+    parser.add_argument(
+        "--verbose",
+        "-v",
+        action="store_true",
+        help="Enable verbose logging",
+    )
+    parser.add_argument(
+        "--logfile",
+        "-l",
+        default=log_file,
+        type=str,
+        help="Path to log file",
+    )
+    args = parser.parse_args()
+
+    #   Validate
+    for attr in args.attr:
+        if "=" not in attr:
+            parser.error(f"--attr needs KEY=VALUE, got {attr}")
+
+    return args
+
+
+def main(args: argparse.Namespace) -> None:
+    if args.unpack:
+        store = CorpusStore.load(args.input)
+        logger.info(f"Unpacking {len(store)} documents to {args.output}")
+        unpack_store(
+            store,
+            args.output,
+            compressed=not args.uncompressed,
+            logprobs_encoding=args.logprobs_encoding,
+            ranks_encoding=args.ranks_encoding,
+        )
+    else:
+        attrs = dict(attr.split("=", 1) for attr in args.attr)
+        store = pack_npz_tree(args.input, pattern=args.pattern, attrs=attrs, manifest=args.manifest)
+        store.save(
+            args.output,
+            logprobs_encoding=args.logprobs_encoding,
+            ranks_encoding=args.ranks_encoding,
+        )
+        lengths = store.lengths()
+        if len(store):
+            logger.info(
+                f"{len(store)} documents, {store.n_tokens} tokens "
+                f"(min {lengths.min()}, median {int(np.median(lengths))}, max {lengths.max()})"
+            )
+    logger.info("Done")
+
+
+if __name__ == "__main__":
+    args = get_cli_args()
+    log_level = logging.DEBUG if args.verbose else logging.INFO
+    setup_logger(log_file=args.logfile, log_level=log_level)
+    main(args)
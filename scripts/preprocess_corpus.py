@@ -12,11 +12,13 @@ import argparse
 import logging
 import os
 
+from fingerprinting_llms.io.catalog import KIND_TEXT, Catalog, CatalogEntry, labels_for
 from fingerprinting_llms.io.logger import setup_logger
 from fingerprinting_llms.preprocess.text import (
     TextPreprocessor,
     TextPreprocessorConfig,
 )
+from fingerprinting_llms.score.manifest import hash_text
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +48,35 @@ def get_cli_args() -> argparse.Namespace:
         default=(".txt"),
         help="/path/to/outputdir",
     )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        default=None,
+        help="Path to a corpus catalog (SQLite) to record the outputs in",
+    )
+    parser.add_argument(
+        "--dataset",
+        type=str,
+        default=None,
+        help="Catalog: dataset name, e.g. hc3",
+    )
+    parser.add_argument(
+        "--label",
+        type=str,
+        default=None,
+        help="Catalog: label, e.g. human or llm",
+    )
+    parser.add_argument(
+        "--source-model",
+        type=str,
+        default=None,
+        help="Catalog: model that wrote the texts (omit for human text)",
+    )
+    parser.add_argument(
+        "--author-from-parent",
+        action="store_true",
+        help="Catalog: use each input file's directory name as its author (e.g. Reuters C50)",
+    )
     parser.add_argument(
         "--verbose",
         "-v",
@@ -88,6 +119,7 @@ def main(args: argparse.Namespace) -> None:
     os.makedirs(args.outputdir, exist_ok=True)
 
     # Process each text file
+    entries: list[CatalogEntry] = []
     for txt_file in txt_files:
         # Get relative path to maintain directory structure in output
         rel_path = os.path.relpath(txt_file, args.inputdir)
@@ -107,8 +139,35 @@ def main(args: argparse.Namespace) -> None:
         cleaned_document.save(output_file)
         logger.info(f"Saved {output_file}")
 
+        if args.catalog is not None:
+            entries.append(
+                CatalogEntry(
+                    path=output_file,
+                    kind=KIND_TEXT,
+                    source_path=txt_file,
+                    n_chars=cleaned_document.clean_len,
+                    content_hash=hash_text(cleaned_document.clean_text),
+                    stats={
+                        "original_len": cleaned_document.original_len,
+                        "spell_change_ratio": cleaned_document.spell_change_ratio,
+                    },
+                    **labels_for(
+                        txt_file,
+                        author_from_parent=args.author_from_parent,
+                        dataset=args.dataset,
+                        label=args.label,
+                        source_model=args.source_model,
+                    ),
+                )
+            )
+
     logger.info(f"All files processed and saved to {args.outputdir}")
 
+    if args.catalog is not None:
+        with Catalog(args.catalog) as catalog:
+            catalog.upsert(entries)
+        logger.info(f"Catalogued {len(entries)} documents in {args.catalog}")
+
     logger.info("Preprocessing complete")
 
 
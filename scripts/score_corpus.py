@@ -0,0 +1,340 @@
+#! /usr/bin/env python
+"""
+score_corpus.py
+
+Score every text file in a directory (or a file list) using a vLLM server from
+a single process, keeping several requests in flight over pooled connections.
+
+Output files mirror the input tree: <outputdir>/<path relative to input root>.npz
+
+Every outcome is recorded in a run manifest (default <outputdir>/manifest.jsonl),
+so rerunning the same command after a crash only scores the remaining files.
+
+With --cache-dir, texts already scored by the same model (in any output tree) are
+copied from the content-addressed cache instead of being sent to the server;
+--cache-only materializes an output tree purely from the cache.
+
+With --window-tokens, documents are scored in overlapping token windows that fit
+a small --max-model-len server, e.g. -w 4000 --overlap-tokens 1024 for 4096.
+
+Usage:
+    python scripts/score_corpus.py \
+        -i data/hc3/human_answers \
+        -o data/tokens/human_llama-graded/human_answers \
+        -m /disk2/dma0523/models/llama3.1-70b-w4a16 -p 9001 -c 32
+
+    for FILE in $(find data/hc3/chatgpt_answers/ -type f); do echo $FILE >> HC3_CHATGPT.txt; done
+    python scripts/score_corpus.py \
+        -f HC3_CHATGPT.txt --input-root data/hc3 \
+        -o data/tokens/chatgpt_llama-graded \
+        -m /disk2/dma0523/models/llama3.1-70b-w4a16 -p 9001
+
+    # Shard one corpus across every server hosting the same model
+    python scripts/score_corpus.py \
+        -f HC3_CHATGPT.txt --input-root data/hc3 \
+        -o data/tokens/chatgpt_llama-graded \
+        -m /disk2/dma0523/models/llama3.1-70b-w4a16 -p 9000 9001 9003
+"""
+
+import argparse
+import logging
+import os
+
+from fingerprinting_llms.io.catalog import Catalog, catalog_logprobs_outputs
+from fingerprinting_llms.io.logger import setup_logger
+from fingerprinting_llms.score.cache import LogProbsCache
+from fingerprinting_llms.score.corpus import (
+    build_jobs,
+    find_input_files,
+    make_pool,
+    read_file_list,
+    run_score_corpus,
+)
+from fingerprinting_llms.score.manifest import RunManifest
+from fingerprinting_llms.score.metrics import ScoringMetrics
+
+logger = logging.getLogger(__name__)
+
+
+def get_cli_args() -> argparse.Namespace:
+    log_file = f"{os.path.splitext(__file__)[0]}.log"
+    parser = argparse.ArgumentParser(description="Score a corpus of text files using a vLLM server")
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument(
+        "--inputdir",
+        "-i",
+        type=str,
+        help="/path/to/inputdir",
+    )
+    inputs.add_argument(
+        "--file-list",
+        "-f",
+        type=str,
+        help="/path/to/file-list with one input filepath per line",
+    )
+    parser.add_argument(
+        "--input-root",
+        type=str,
+        default=None,
+        help="Root that output paths are made relative to (default: inputdir, or the "
+        "common directory of the file list)",
+    )
+    parser.add_argument(
+        "--outputdir",
+        "-o",
+        type=str,
+        required=True,
+        help="/path/to/outputdir",
+    )
+    parser.add_argument(
+        "--extensions",
+        "-e",
+        type=str,
+        nargs="*",
+        default=[".txt"],
+        help="File extensions to score when using --inputdir",
+    )
+    parser.add_argument(
+        "--model",
+        "-m",
+        type=str,
+        required=True,
+        help="/path/to/model",
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="localhost",
+        help="Host of the vLLM server",
+    )
+    parser.add_argument(
+        "--port",
+        "-p",
+        type=int,
+        nargs="+",
+        default=[8000],
+        help="Port(s) of the vLLM server(s) on --host; several ports share the job",
+    )
+    parser.add_argument(
+        "--servers",
+        "-s",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Server URLs serving the same model, e.g. http://box1:9000 (overrides --host/--port)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        "-c",
+        type=int,
+        default=16,
+        help="Maximum number of requests to keep in flight per server",
+    )
+    parser.add_argument(
+        "--fixed-concurrency",
+        action="store_true",
+        help="Keep --concurrency requests in flight per server instead of adapting to its load",
+    )
+    parser.add_argument(
+        "--request-timeout",
+        type=float,
+        default=300.0,
+        help="Seconds before a single request is abandoned and retried",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=900.0,
+        help="Seconds before a request and all its retries are given up",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        help="Path to the run manifest (default: <outputdir>/manifest.jsonl)",
+    )
+    parser.add_argument(
+        "--no-manifest",
+        action="store_true",
+        help="Score every file, without reading or writing a run manifest",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        help="Path to write run metrics to; Prometheus text if it ends in .prom, else JSON "
+        "(default: <outputdir>/metrics.json)",
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        default=None,
+        help="Path to a corpus catalog (SQLite) to record the outputs in",
+    )
+    parser.add_argument(
+        "--dataset",
+        type=str,
+        default=None,
+        help="Catalog: dataset name, e.g. hc3",
+    )
+    parser.add_argument(
+        "--label",
+        type=str,
+        default=None,
+        help="Catalog: label, e.g. human or llm",
+    )
+    parser.add_argument(
+        "--source-model",
+        type=str,
+        default=None,
+        help="Catalog: model that wrote the texts (omit for human text)",
+    )
+    parser.add_argument(
+        "--grader",
+        type=str,
+        default=None,
+        help="Catalog: name of the scoring model (default: basename of --model)",
+    )
+    parser.add_argument(
+        "--author-from-parent",
+        action="store_true",
+        help="Catalog: use each input file's directory name as its author (e.g. Reuters C50)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Directory of the content-addressed logprob cache (disabled if not given)",
+    )
+    parser.add_argument(
+        "--cache-max-gb",
+        type=float,
+        default=None,
+        help="Size cap for the cache in GB; least recently used entries are evicted",
+    )
+    parser.add_argument(
+        "--cache-only",
+        action="store_true",
+        help="Only materialize outputs from the cache, without contacting any server",
+    )
+    parser.add_argument(
+        "--window-tokens",
+        "-w",
+        type=int,
+        default=None,
+        help="Score in overlapping windows of at most this many tokens (must be < max-model-len)",
+    )
+    parser.add_argument(
+        "--overlap-tokens",
+        type=int,
+        default=1024,
+        help="Tokens of context shared by consecutive windows when --window-tokens is set",
+    )
+    parser.add_argument(
+        "--top-k",
+        "-k",
+        type=int,
+        default=1,
+        help="Also store the top-k candidates of every position (for entropy and margin)",
+    )
+    parser.add_argument(
+        "--batch-tokens",
+        "-b",
+        type=int,
+        default=None,
+        help="Pack short documents into multi-prompt requests of about this many tokens",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="Maximum documents per request when --batch-tokens is set",
+    )
+    parser.add_argument(
+        "--verbose",
+        "-v",
+        action="store_true",
+        help="Enable verbose logging",
+    )
+    parser.add_argument(
+        "--logfile",
+        "-l",
+        default=log_file,
+        type=str,
+        help="Path to log file",
+    )
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    if args.inputdir is not None:
+        input_filepaths = find_input_files(args.inputdir, extensions=tuple(args.extensions))
+        input_root = args.input_root or args.inputdir
+    else:
+        input_filepaths = read_file_list(args.file_list)
+        input_root = args.input_root or os.path.commonpath(input_filepaths)
+    logger.info(f"Found {len(input_filepaths)} files to score")
+
+    jobs = build_jobs(input_filepaths, input_root=input_root, outputdir=args.outputdir)
+    servers = args.servers or [f"http://{args.host}:{port}" for port in args.port]
+    manifest = None
+    if not args.no_manifest:
+        manifest = RunManifest(args.manifest or os.path.join(args.outputdir, "manifest.jsonl"))
+    cache = None
+    if args.cache_dir is not None:
+        max_bytes = int(args.cache_max_gb * 2**30) if args.cache_max_gb is not None else None
+        cache = LogProbsCache(args.cache_dir, max_bytes=max_bytes)
+    elif args.cache_only:
+        raise ValueError("--cache-only requires --cache-dir")
+
+    metrics = ScoringMetrics()
+    result = run_score_corpus(
+        jobs,
+        server=make_pool(
+            servers,
+            concurrency=args.concurrency,
+            adaptive=not args.fixed_concurrency,
+            request_timeout=args.request_timeout,
+            deadline=args.deadline,
+        ),
+        model=args.model,
+        concurrency=args.concurrency,
+        manifest=manifest,
+        cache=cache,
+        cache_only=args.cache_only,
+        window_tokens=args.window_tokens,
+        overlap_tokens=args.overlap_tokens,
+        metrics=metrics,
+        batch_tokens=args.batch_tokens,
+        batch_size=args.batch_size,
+        top_k=args.top_k,
+    )
+    metrics.write(args.metrics or os.path.join(args.outputdir, "metrics.json"))
+    logger.info(f"Run metrics:\n{metrics.summary()}")
+    if cache is not None:
+        logger.info(f"Cache hits={cache.hits} misses={cache.misses}")
+
+    if args.catalog is not None:
+        outputs = {job.input_filepath: job.output_filepath for job in jobs}
+        done = result.scored + result.cached + result.skipped
+        with Catalog(args.catalog) as catalog:
+            catalog_logprobs_outputs(
+                catalog,
+                [(input_filepath, outputs[input_filepath]) for input_filepath in done],
+                author_from_parent=args.author_from_parent,
+                dataset=args.dataset,
+                label=args.label,
+                source_model=args.source_model,
+                grader=args.grader or os.path.basename(args.model.rstrip("/")),
+            )
+
+    for failed in result.failed:
+        logger.warning(f"FAILED : {failed}")
+    logger.info("Scoring complete")
+
+
+if __name__ == "__main__":
+    args = get_cli_args()
+    log_level = logging.DEBUG if args.verbose else logging.INFO
+    setup_logger(log_file=args.logfile, log_level=log_level)
+    main(args)
@@ -0,0 +1,240 @@
+#! /usr/bin/env python
+"""
+score_corpus_multi.py
+
+Score every text file in a directory (or a file list) with several models at
+once. Each document is read once, sent to every model concurrently, and written
+as a single record with one logprob series per model (see
+fingerprinting_llms.score.multi.MultiModelLogProbs).
+
+Each --target is: NAME MODEL SERVER [SERVER ...]
+
+Usage:
+    python scripts/score_corpus_multi.py \
+        -i data/rcv1-uc-irvine-subset/reuter5050/C50train_clean \
+        -o data/tokens/multi/reuter5050/C50train_clean \
+        --target llama70b /disk2/dma0523/models/llama3.1-70b-w4a16 \
+            http://localhost:9000 http://localhost:9003 \
+        --target llama8b /disk1/dma0523/models/llama3.1-8b-w4a16 http://localhost:9001 \
+        --target mixtral /proj/redline/team/mcg/models/Mixtral-8x7B-Instruct-v0.1 \
+            http://localhost:9002
+"""
+
+import argparse
+import logging
+import os
+
+from fingerprinting_llms.io.logger import setup_logger
+from fingerprinting_llms.score.cache import LogProbsCache
+from fingerprinting_llms.score.corpus import (
+    build_jobs,
+    find_input_files,
+    read_file_list,
+)
+from fingerprinting_llms.score.manifest import RunManifest
+from fingerprinting_llms.score.metrics import ScoringMetrics
+from fingerprinting_llms.score.multi import ModelTarget, run_score_corpus_multi
+
+logger = logging.getLogger(__name__)
+
+
+def get_cli_args() -> argparse.Namespace:
+    log_file = f"{os.path.splitext(__file__)[0]}.log"
+    parser = argparse.ArgumentParser(description="Score a corpus of text files with several models")
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument(
+        "--inputdir",
+        "-i",
+        type=str,
+        help="/path/to/inputdir",
+    )
+    inputs.add_argument(
+        "--file-list",
+        "-f",
+        type=str,
+        help="/path/to/file-list with one input filepath per line",
+    )
+    parser.add_argument(
+        "--input-root",
+        type=str,
+        default=None,
+        help="Root that output paths are made relative to (default: inputdir, or the "
+        "common directory of the file list)",
+    )
+    parser.add_argument(
+        "--outputdir",
+        "-o",
+        type=str,
+        required=True,
+        help="/path/to/outputdir",
+    )
+    parser.add_argument(
+        "--extensions",
+        "-e",
+        type=str,
+        nargs="*",
+        default=[".txt"],
+        help="File extensions to score when using --inputdir",
+    )
+    parser.add_argument(
+        "--target",
+        "-t",
+        type=str,
+        nargs="+",
+        action="append",
+        required=True,
+        metavar="NAME MODEL SERVER",
+        help="A model to score with: NAME MODEL SERVER [SERVER ...]; repeat per model",
+    )
+    parser.add_argument(
+        "--concurrency",
+        "-c",
+        type=int,
+        default=16,
+        help="Maximum number of requests to keep in flight per server",
+    )
+    parser.add_argument(
+        "--fixed-concurrency",
+        action="store_true",
+        help="Keep --concurrency requests in flight per server instead of adapting to its load",
+    )
+    parser.add_argument(
+        "--request-timeout",
+        type=float,
+        default=300.0,
+        help="Seconds before a single request is abandoned and retried",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=900.0,
+        help="Seconds before a request and all its retries are given up",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        help="Path to the run manifest (default: <outputdir>/manifest.jsonl)",
+    )
+    parser.add_argument(
+        "--no-manifest",
+        action="store_true",
+        help="Score every file, without reading or writing a run manifest",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        help="Path to write run metrics to; Prometheus text if it ends in .prom, else JSON "
+        "(default: <outputdir>/metrics.json)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Directory of the content-addressed logprob cache (disabled if not given)",
+    )
+    parser.add_argument(
+        "--cache-max-gb",
+        type=float,
+        default=None,
+        help="Size cap for the cache in GB; least recently used entries are evicted",
+    )
+    parser.add_argument(
+        "--window-tokens",
+        "-w",
+        type=int,
+        default=None,
+        help="Score in overlapping windows of at most this many tokens (must be < max-model-len)",
+    )
+    parser.add_argument(
+        "--overlap-tokens",
+        type=int,
+        default=1024,
+        help="Tokens of context shared by consecutive windows when --window-tokens is set",
+    )
+    parser.add_argument(
+        "--top-k",
+        "-k",
+        type=int,
+        default=1,
+        help="Also store the top-k candidates of every position (for entropy and margin)",
+    )
+    parser.add_argument(
+        "--verbose",
+        "-v",
+        action="store_true",
+        help="Enable verbose logging",
+    )
+    parser.add_argument(
+        "--logfile",
+        "-l",
+        default=log_file,
+        type=str,
+        help="Path to log file",
+    )
+    args = parser.parse_args()
+
+    #   Validate
+    for target in args.target:
+        if len(target) < 3:
+            parser.error(f"--target needs NAME MODEL SERVER [SERVER ...], got {target}")
+
+    return args
+
+
+def main(args: argparse.Namespace) -> None:
+    if args.inputdir is not None:
+        input_filepaths = find_input_files(args.inputdir, extensions=tuple(args.extensions))
+        input_root = args.input_root or args.inputdir
+    else:
+        input_filepaths = read_file_list(args.file_list)
+        input_root = args.input_root or os.path.commonpath(input_filepaths)
+    logger.info(f"Found {len(input_filepaths)} files to score")
+
+    targets = [
+        ModelTarget(name=name, model=model, servers=servers)
+        for name, model, *servers in args.target
+    ]
+    for target in targets:
+        logger.info(f"Target {target.name} : {target.model} on {target.servers}")
+
+    jobs = build_jobs(input_filepaths, input_root=input_root, outputdir=args.outputdir)
+    manifest = None
+    if not args.no_manifest:
+        manifest = RunManifest(args.manifest or os.path.join(args.outputdir, "manifest.jsonl"))
+    cache = None
+    if args.cache_dir is not None:
+        max_bytes = int(args.cache_max_gb * 2**30) if args.cache_max_gb is not None else None
+        cache = LogProbsCache(args.cache_dir, max_bytes=max_bytes)
+
+    metrics = ScoringMetrics()
+    result = run_score_corpus_multi(
+        jobs,
+        targets=targets,
+        concurrency=args.concurrency,
+        pool_options={
+            "adaptive": not args.fixed_concurrency,
+            "request_timeout": args.request_timeout,
+            "deadline": args.deadline,
+        },
+        manifest=manifest,
+        cache=cache,
+        window_tokens=args.window_tokens,
+        overlap_tokens=args.overlap_tokens,
+        metrics=metrics,
+        top_k=args.top_k,
+    )
+    metrics.write(args.metrics or os.path.join(args.outputdir, "metrics.json"))
+    logger.info(f"Run metrics:\n{metrics.summary()}")
+
+    for failed in result.failed:
+        logger.warning(f"FAILED : {failed}")
+    logger.info("Scoring complete")
+
+
+if __name__ == "__main__":
+    args = get_cli_args()
+    log_level = logging.DEBUG if args.verbose else logging.INFO
+    setup_logger(log_file=args.logfile, log_level=log_level)
+    main(args)
@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+"""
+serve_mock.py
+
+Serve a mock vLLM completions server (see fingerprinting_llms.score.mock) for
+exercising and load-testing the scoring client without a GPU.
+
+Usage:
+    python serving/serve_mock.py --port 9100
+    python serving/serve_mock.py --port 9100 --profile flaky
+    python serving/serve_mock.py --port 9100 --profile overloaded --max-num-seqs 4
+"""
+
+import argparse
+import logging
+
+from fingerprinting_llms.score.mock import PROFILES, get_profile, run_mock_server
+
+
+def get_cli_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve a mock vLLM completions server")
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="localhost",
+        help="Host to bind",
+    )
+    parser.add_argument(
+        "--port",
+        "-p",
+        type=int,
+        default=8000,
+        help="Port to bind",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default="realistic",
+        choices=sorted(PROFILES),
+        help="Latency, failure and payload-size profile",
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=None, help="Override fixed latency per request"
+    )
+    parser.add_argument(
+        "--per-token-ms", type=float, default=None, help="Override latency per prompt token"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=None, help="Override lognormal latency jitter"
+    )
+    parser.add_argument(
+        "--max-num-seqs", type=int, default=None, help="Override concurrent request slots"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=None, help="Override fraction of failed requests"
+    )
+    parser.add_argument(
+        "--max-model-len", type=int, default=None, help="Override maximum prompt length"
+    )
+    parser.add_argument(
+        "--extra-alternatives",
+        type=int,
+        default=None,
+        help="Override padding candidates per position",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Override seed of the synthetic logprobs"
+    )
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    profile = get_profile(
+        args.profile,
+        latency_ms=args.latency_ms,
+        per_token_ms=args.per_token_ms,
+        jitter=args.jitter,
+        max_num_seqs=args.max_num_seqs,
+        error_rate=args.error_rate,
+        max_model_len=args.max_model_len,
+        extra_alternatives=args.extra_alternatives,
+        seed=args.seed,
+    )
+    run_mock_server(profile, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    args = get_cli_args()
+    logging.basicConfig(level=logging.INFO)
+    main(args)
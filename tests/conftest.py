@@ -0,0 +1,103 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Sequence
+from typing import Any
+
+import aiohttp
+import numpy as np
+import pytest
+from aiohttp.test_utils import TestServer
+
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.extract import EndpointPool
+from fingerprinting_llms.score.mock import PROFILES, MockProfile, create_app
+
+MODEL = "mock"
+
+#   Long enough to need several windows, with repeated pieces so that the
+#   bigram-hashed mock logprobs of a token depend on its context
+TEXT = " ".join(f"word{i % 17} alpha beta, gamma {i * 7}." for i in range(120))
+
+
+def run_with_mock(
+    body: Callable[[aiohttp.ClientSession, EndpointPool], Awaitable[Any]],
+    profiles: Sequence[MockProfile] = (PROFILES["instant"],),
+    **pool_options: Any,
+) -> Any:
+    """Run `body(session, pool)` against one mock vLLM server per profile.
+
+    The servers listen on free local ports and are pooled, in order, into an
+    EndpointPool built with `pool_options`.
+    """
+
+    async def main() -> Any:
+        servers = [TestServer(create_app(profile)) for profile in profiles]
+        for server in servers:
+            await server.start_server()
+        try:
+            pool = EndpointPool(
+                [str(server.make_url("")).rstrip("/") for server in servers], **pool_options
+            )
+            async with aiohttp.ClientSession() as session:
+                return await body(session, pool)
+        finally:
+            for server in servers:
+                await server.close()
+
+    return asyncio.run(main())
+
+
+def assert_same_logprobs(actual: LogProbs, expected: LogProbs) -> None:
+    """Every column of `actual` equals `expected` exactly (full_context aside)."""
+    np.testing.assert_array_equal(actual.decoded_tokens, expected.decoded_tokens)
+    np.testing.assert_array_equal(actual.token_ids, expected.token_ids)
+    np.testing.assert_array_equal(actual.token_ranks, expected.token_ranks)
+    np.testing.assert_array_equal(actual.token_probs, expected.token_probs)
+    assert actual.has_topk == expected.has_topk
+    if expected.has_topk:
+        np.testing.assert_array_equal(actual.topk_offsets, expected.topk_offsets)
+        np.testing.assert_array_equal(actual.topk_ids, expected.topk_ids)
+        np.testing.assert_array_equal(actual.topk_logprobs, expected.topk_logprobs)
+
+
+def documents(logprobs: LogProbs, n: int = 3) -> list[LogProbs]:
+    """`n` documents of different lengths cut from `logprobs` (top-k included)."""
+    docs = []
+    for i in range(n):
+        end = len(logprobs.token_ids) - 7 * i
+        lo, hi = int(logprobs.topk_offsets[0]), int(logprobs.topk_offsets[end])
+        docs.append(
+            LogProbs(
+                decoded_tokens=logprobs.decoded_tokens[:end],
+                token_ids=logprobs.token_ids[:end],
+                token_ranks=logprobs.token_ranks[:end],
+                token_probs=logprobs.token_probs[:end],
+                topk_offsets=logprobs.topk_offsets[: end + 1],
+                topk_ids=logprobs.topk_ids[lo:hi],
+                topk_logprobs=logprobs.topk_logprobs[lo:hi],
+            )
+        )
+    return docs
+
+
+@pytest.fixture
+def logprobs() -> LogProbs:
+    """A small document with top-k candidates, non-ASCII tokens and tiny logprobs."""
+    rng = np.random.default_rng(0)
+    n = 64
+    token_ids = rng.integers(256, 400, n).astype(np.int32)
+    decoded_tokens = np.asarray([f" t{i}" for i in token_ids.tolist()], dtype=np.str_)
+    decoded_tokens[3] = "é"
+    token_probs = -rng.exponential(2.0, n).astype(np.float32)
+    token_probs[:3] = [-1e-7, -3e-8, -70.0]
+    counts = rng.integers(1, 4, n)
+    topk_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(counts, out=topk_offsets[1:])
+    return LogProbs(
+        decoded_tokens=decoded_tokens,
+        token_ids=token_ids,
+        token_ranks=rng.integers(1, 70_000, n).astype(np.int32),
+        token_probs=token_probs,
+        topk_offsets=topk_offsets,
+        topk_ids=rng.integers(256, 400, topk_offsets[-1]).astype(np.int32),
+        topk_logprobs=-rng.exponential(1.0, topk_offsets[-1]).astype(np.float32),
+    )
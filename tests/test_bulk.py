@@ -0,0 +1,62 @@
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+import pytest
+from conftest import documents
+
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.bulk import RaggedArray, load_many
+from fingerprinting_llms.score.store import CorpusStore, pack_npz_tree
+
+COLUMNS = ("token_probs", "token_ranks", "decoded_tokens", "topk_offsets", "topk_ids")
+
+
+@pytest.fixture
+def tree(tmp_path: Path, logprobs: LogProbs) -> Path:
+    """Three documents in a tree under tmp_path / "tokens", packed into tmp_path / "store.npz"."""
+    root = tmp_path / "tokens"
+    for i, doc in enumerate(documents(logprobs)):
+        doc.save_npz(root / f"d{i % 2}" / f"doc{i}.npz", compressed=i % 2 == 0)
+    pack_npz_tree(root, tmp_path / "store.npz")
+    return root
+
+
+def test_load_many_tree_and_store_agree(tree: Path, logprobs: LogProbs):
+    docs = documents(logprobs)
+    from_tree, paths = load_many(tree, columns=COLUMNS, workers=2, return_paths=True)
+    from_store = load_many(tree.parent / "store.npz", columns=COLUMNS)
+    assert paths == [str(tree / f"d{i % 2}" / f"doc{i}.npz") for i in (0, 2, 1)]
+    for column in COLUMNS:
+        expected = [getattr(docs[i], column) for i in (0, 2, 1)]
+        for loaded in (from_tree[column], from_store[column]):
+            assert len(loaded) == len(expected)
+            for actual, array in zip(loaded, expected, strict=True):
+                np.testing.assert_array_equal(actual, array)
+
+
+def test_load_many_ragged_with_length_filter(tree: Path, logprobs: LogProbs):
+    docs = documents(logprobs)
+    lengths = sorted(doc.size for doc in docs)
+    for root in (tree, tree.parent / "store.npz"):
+        ragged = load_many(root, ragged=True, min_length=lengths[1], dtype=np.float64)
+        assert isinstance(ragged, RaggedArray)
+        assert ragged.values.dtype == np.float64
+        assert sorted(ragged.lengths().tolist()) == lengths[1:]
+        assert [Path(p).name for p in ragged.paths] == ["doc0.npz", "doc1.npz"]
+
+
+def test_load_many_skips_unreadable_files(tree: Path):
+    (tree / "broken.npz").write_bytes(b"not a zip file")
+    np.savez(tree / "other.npz", values=np.arange(3))
+    assert len(load_many(tree)) == 3
+
+
+def test_load_many_rejects_columns_missing_from_a_store(tmp_path: Path, logprobs: LogProbs):
+    without_topk = replace(logprobs, topk_offsets=None, topk_ids=None, topk_logprobs=None)
+    CorpusStore.from_logprobs([("doc", without_topk)]).save(tmp_path / "store.npz")
+    for column in ("full_context", "topk_ids"):
+        with pytest.raises(ValueError, match=column):
+            load_many(tmp_path / "store.npz", columns=column)
+    with pytest.raises(ValueError, match="Unknown column"):
+        load_many(tmp_path / "store.npz", columns="paths")
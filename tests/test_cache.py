@@ -0,0 +1,96 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from conftest import MODEL, assert_same_logprobs, run_with_mock
+
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.cache import LogProbsCache
+from fingerprinting_llms.score.corpus import build_jobs, score_corpus
+
+
+def test_put_get_and_materialize(tmp_path: Path, logprobs: LogProbs):
+    cache = LogProbsCache(tmp_path / "cache")
+    assert cache.get("model", "text") is None
+    path = cache.put("model", "text", logprobs)
+    assert path.parent.parent == cache.cachedir
+    assert cache.total_bytes == path.stat().st_size
+
+    assert_same_logprobs(cache.get("model", "text"), logprobs)
+    #   The key covers the model and the exact text
+    assert cache.get("other", "text") is None
+    assert cache.get("model", "text ") is None
+
+    output_filepath = tmp_path / "tokens" / "doc.npz"
+    assert not cache.materialize("model", "other text", output_filepath)
+    assert cache.materialize("model", "text", output_filepath)
+    assert_same_logprobs(LogProbs.from_file(output_filepath), logprobs)
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_evict_removes_least_recently_used_entries(tmp_path: Path, logprobs: LogProbs):
+    cache = LogProbsCache(tmp_path / "cache")
+    paths = [cache.put("model", f"text {i}", logprobs) for i in range(4)]
+    for i, path in enumerate(paths):
+        os.utime(path, (1000 + i, 1000 + i))
+    #   A hit makes the oldest entry the most recently used
+    cache.lookup("model", "text 0")
+
+    size = paths[0].stat().st_size
+    cache.max_bytes = int(2.5 * size)
+    cache.low_watermark = 1.0
+    assert cache.evict() == 2
+    assert [path.exists() for path in paths] == [True, False, False, True]
+    assert cache.total_bytes == 2 * size
+
+    #   A put over the cap evicts down to the low watermark
+    cache.put("model", "text 4", logprobs)
+    assert cache.total_bytes <= cache.max_bytes
+    assert not paths[3].exists() and cache.path_for("model", "text 4").exists()
+
+
+def test_concurrent_put_file_of_one_key(tmp_path: Path, logprobs: LogProbs):
+    filepath = tmp_path / "doc.npz"
+    logprobs.save_npz(filepath)
+    cache = LogProbsCache(tmp_path / "cache")
+    with ThreadPoolExecutor(8) as executor:
+        paths = set(executor.map(lambda _: cache.put_file("model", "text", filepath), range(32)))
+    assert paths == {cache.path_for("model", "text")}
+    assert [p.name for p in cache.path_for("model", "text").parent.iterdir()] == [
+        cache.path_for("model", "text").name
+    ]
+    assert_same_logprobs(cache.get("model", "text"), logprobs)
+
+
+@pytest.mark.parametrize("broken", [False, True])
+def test_score_corpus_fills_and_reuses_the_cache(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, broken: bool
+):
+    inputdir = tmp_path / "texts"
+    inputdir.mkdir()
+    for i in range(3):
+        (inputdir / f"doc{i}.txt").write_text(f"Document number {i}.")
+    inputs = sorted(str(p) for p in inputdir.iterdir())
+    cache = LogProbsCache(tmp_path / "cache")
+
+    def unreadable(*args):
+        raise PermissionError("unreadable cache entry")
+
+    async def body(session, pool):
+        first = await score_corpus(
+            build_jobs(inputs, str(inputdir), str(tmp_path / "first")), pool, MODEL, cache=cache
+        )
+        if broken:
+            monkeypatch.setattr(cache, "materialize", unreadable)
+        second = await score_corpus(
+            build_jobs(inputs, str(inputdir), str(tmp_path / "second")), pool, MODEL, cache=cache
+        )
+        return first, second
+
+    first, second = run_with_mock(body)
+    assert len(first.scored) == 3
+    #   A cache that cannot be read is a miss: the documents are scored again
+    assert len(second.scored if broken else second.cached) == 3
+    assert not second.failed
+    assert len(list((tmp_path / "second").glob("*.npz"))) == 3
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from conftest import MODEL, TEXT, assert_same_logprobs, run_with_mock
+
+from fingerprinting_llms.score.chunked import plan_windows
+from fingerprinting_llms.score.corpus import score_text_async
+
+
+@pytest.mark.parametrize("n_tokens", [0, 1, 7, 8, 9, 100, 257])
+@pytest.mark.parametrize(
+    ("window_tokens", "overlap_tokens", "prefix_tokens"),
+    [(8, 0, 0), (8, 3, 0), (8, 3, 1), (16, 14, 1)],
+)
+def test_plan_windows_covers_every_token_once(
+    n_tokens, window_tokens, overlap_tokens, prefix_tokens
+):
+    windows = plan_windows(n_tokens, window_tokens, overlap_tokens, prefix_tokens)
+    kept = []
+    for i, window in enumerate(windows):
+        limit = window_tokens if i == 0 else window_tokens - prefix_tokens
+        assert 0 <= window.start <= window.keep_from <= window.end <= n_tokens
+        assert window.size <= limit
+        if i > 0:
+            #   Every kept token of a later window has at least `overlap` tokens of context
+            assert window.keep_from - window.start >= overlap_tokens
+            assert window.keep_from == windows[i - 1].end
+        kept.extend(range(window.keep_from, window.end))
+    assert kept == list(range(n_tokens))
+
+
+@pytest.mark.parametrize(
+    ("window_tokens", "overlap_tokens", "prefix_tokens"),
+    [(8, 8, 0), (8, 9, 0), (8, -1, 0), (8, 7, 1)],
+)
+def test_plan_windows_rejects_windows_without_new_tokens(
+    window_tokens, overlap_tokens, prefix_tokens
+):
+    with pytest.raises(ValueError):
+        plan_windows(100, window_tokens, overlap_tokens, prefix_tokens)
+
+
+@pytest.mark.parametrize(("window_tokens", "overlap_tokens"), [(200, 50), (128, 1), (64, 10)])
+@pytest.mark.parametrize("top_k", [1, 3])
+def test_chunked_scoring_matches_unchunked(window_tokens, overlap_tokens, top_k):
+    """The mock's logprobs only depend on the previous token, so windows that
+    overlap by at least one token (plus BOS in front) reproduce the whole document."""
+
+    async def body(session, pool):
+        whole = await score_text_async(session, pool, MODEL, TEXT, top_k=top_k)
+        chunked = await score_text_async(
+            session,
+            pool,
+            MODEL,
+            TEXT,
+            window_tokens=window_tokens,
+            overlap_tokens=overlap_tokens,
+            top_k=top_k,
+        )
+        return whole, chunked
+
+    whole, chunked = run_with_mock(body)
+    assert whole.size > window_tokens
+    assert_same_logprobs(chunked, whole)
+    assert chunked.full_context is not None
+    #   Only the first window's tokens saw the whole document prefix
+    assert chunked.full_context.sum() == window_tokens - 1
+    assert not chunked.full_context[window_tokens - 1 :].any()
+
+
+def test_chunked_scoring_without_overlap_keeps_every_token():
+    async def body(session, pool):
+        whole = await score_text_async(session, pool, MODEL, TEXT)
+        chunked = await score_text_async(
+            session, pool, MODEL, TEXT, window_tokens=64, overlap_tokens=0
+        )
+        return whole, chunked
+
+    whole, chunked = run_with_mock(body)
+    assert chunked.size == whole.size
+    np.testing.assert_array_equal(chunked.token_ids, whole.token_ids)
+    np.testing.assert_array_equal(chunked.decoded_tokens, whole.decoded_tokens)
@@ -0,0 +1,182 @@
+import time
+from pathlib import Path
+
+import pytest
+from conftest import MODEL, TEXT, assert_same_logprobs, run_with_mock
+
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.corpus import (
+    build_jobs,
+    post_json_async,
+    score_corpus,
+    score_text_async,
+)
+from fingerprinting_llms.score.extract import COMPLETIONS_ROUTE, build_completions_request
+from fingerprinting_llms.score.manifest import RunManifest
+from fingerprinting_llms.score.mock import PROFILES, get_profile
+
+#   Answers every request with an HTTP 500
+FAILING = get_profile("instant", error_rate=1.0)
+#   Answers every request after 1.5 s
+SLOW = get_profile("instant", latency_ms=1500.0)
+
+BODY = build_completions_request(model=MODEL, text="Hello world")
+
+
+def write_texts(inputdir: Path, n: int = 4) -> dict[str, str]:
+    """Write `n` texts of different lengths under `inputdir`; returns {filename: text}."""
+    inputdir.mkdir(parents=True)
+    texts = {f"doc{i}.txt": TEXT[: 200 + 150 * i] for i in range(n)}
+    for name, text in texts.items():
+        (inputdir / name).write_text(text)
+    return texts
+
+
+# -----------------------------------------------------------------------------
+# post_json_async
+# -----------------------------------------------------------------------------
+def test_post_json_async_returns_the_response():
+    async def body(session, pool):
+        return await post_json_async(session, pool, COMPLETIONS_ROUTE, BODY), pool
+
+    data, pool = run_with_mock(body)
+    assert data["choices"][0]["prompt_logprobs"][0] is None
+    assert pool.endpoints[0].completed == 1 and pool.endpoints[0].failed == 0
+
+
+def test_post_json_async_retries_transient_errors_on_another_endpoint():
+    async def body(session, pool):
+        return await post_json_async(session, pool, COMPLETIONS_ROUTE, BODY), pool
+
+    data, pool = run_with_mock(
+        body, profiles=(FAILING, PROFILES["instant"]), max_failures=1, backoff_base=0.01
+    )
+    assert "choices" in data
+    failing, healthy = pool.endpoints
+    assert (failing.failed, failing.completed) == (1, 0)
+    assert (healthy.failed, healthy.completed) == (0, 1)
+
+
+def test_post_json_async_gives_up_after_max_attempts():
+    async def body(session, pool):
+        with pytest.raises(ConnectionError, match="3 attempts"):
+            await post_json_async(session, pool, COMPLETIONS_ROUTE, BODY, max_attempts=3)
+        return pool
+
+    pool = run_with_mock(body, profiles=(FAILING,), max_failures=10, backoff_base=0.01)
+    assert pool.endpoints[0].failed == 3
+
+
+def test_post_json_async_times_out_slow_requests():
+    async def body(session, pool):
+        start = time.monotonic()
+        with pytest.raises(ConnectionError, match="TimeoutError"):
+            await post_json_async(session, pool, COMPLETIONS_ROUTE, BODY, max_attempts=2)
+        return time.monotonic() - start, pool
+
+    elapsed, pool = run_with_mock(
+        body, profiles=(SLOW,), request_timeout=0.1, max_failures=10, backoff_base=0.01
+    )
+    assert elapsed < 1.0
+    assert pool.endpoints[0].failed == 2
+
+
+def test_post_json_async_returns_non_transient_errors_without_retrying():
+    long_body = build_completions_request(model=MODEL, text=TEXT)
+
+    async def body(session, pool):
+        return await post_json_async(session, pool, COMPLETIONS_ROUTE, long_body), pool
+
+    data, pool = run_with_mock(body, profiles=(PROFILES["short-context"],))
+    assert data["code"] == 400
+    assert pool.endpoints[0].completed == 1 and pool.endpoints[0].failed == 0
+
+
+# -----------------------------------------------------------------------------
+# score_corpus
+# -----------------------------------------------------------------------------
+def test_score_corpus_writes_one_output_per_input(tmp_path: Path):
+    texts = write_texts(tmp_path / "texts")
+    jobs = build_jobs(
+        sorted(str(tmp_path / "texts" / name) for name in texts),
+        str(tmp_path / "texts"),
+        str(tmp_path / "tokens"),
+    )
+
+    async def body(session, pool):
+        result = await score_corpus(jobs, pool, MODEL)
+        expected = {
+            name: await score_text_async(session, pool, MODEL, t) for name, t in texts.items()
+        }
+        return result, expected
+
+    result, expected = run_with_mock(body)
+    assert sorted(result.scored) == sorted(job.input_filepath for job in jobs)
+    assert not result.failed
+    for name, logprobs in expected.items():
+        assert_same_logprobs(LogProbs.from_file(tmp_path / "tokens" / f"{name}.npz"), logprobs)
+
+
+def test_score_corpus_records_failed_documents(tmp_path: Path):
+    texts = write_texts(tmp_path / "texts", n=2)
+    jobs = build_jobs(
+        sorted(str(tmp_path / "texts" / name) for name in texts),
+        str(tmp_path / "texts"),
+        str(tmp_path / "tokens"),
+    )
+
+    async def body(session, pool):
+        return await score_corpus(jobs, pool, MODEL)
+
+    result = run_with_mock(body, profiles=(FAILING,), max_failures=100, backoff_base=0.01)
+    assert sorted(result.failed) == sorted(job.input_filepath for job in jobs)
+    assert not (tmp_path / "tokens").exists() or not list((tmp_path / "tokens").iterdir())
+
+
+def test_score_corpus_resumes_from_the_manifest(tmp_path: Path):
+    texts = write_texts(tmp_path / "texts")
+    jobs = build_jobs(
+        sorted(str(tmp_path / "texts" / name) for name in texts),
+        str(tmp_path / "texts"),
+        str(tmp_path / "tokens"),
+    )
+    manifest = RunManifest(tmp_path / "tokens" / "manifest.jsonl")
+
+    async def body(session, pool):
+        first = await score_corpus(jobs, pool, MODEL, manifest=manifest)
+        second = await score_corpus(jobs, pool, MODEL, manifest=manifest)
+        #   A changed text is scored again, the others are still skipped
+        (tmp_path / "texts" / "doc0.txt").write_text(TEXT[:100])
+        third = await score_corpus(jobs, pool, MODEL, manifest=RunManifest(manifest.filepath))
+        return first, second, third
+
+    first, second, third = run_with_mock(body)
+    assert len(first.scored) == len(jobs) and not first.failed
+    assert len(second.skipped) == len(jobs) and not second.scored
+    assert third.scored == [jobs[0].input_filepath]
+    assert len(third.skipped) == len(jobs) - 1
+
+
+@pytest.mark.parametrize("top_k", [1, 3])
+def test_batched_scoring_matches_single_requests(tmp_path: Path, top_k: int):
+    texts = write_texts(tmp_path / "texts", n=6)
+    jobs = build_jobs(
+        sorted(str(tmp_path / "texts" / name) for name in texts),
+        str(tmp_path / "texts"),
+        str(tmp_path / "tokens"),
+    )
+
+    async def body(session, pool):
+        result = await score_corpus(jobs, pool, MODEL, batch_tokens=4096, top_k=top_k)
+        expected = {
+            name: await score_text_async(session, pool, MODEL, t, top_k=top_k)
+            for name, t in texts.items()
+        }
+        return result, expected, pool.endpoints[0].completed
+
+    result, expected, n_requests = run_with_mock(body)
+    assert len(result.scored) == len(jobs)
+    #   Fewer requests than documents for the batched run
+    assert n_requests - len(jobs) < len(jobs)
+    for name, logprobs in expected.items():
+        assert_same_logprobs(LogProbs.from_file(tmp_path / "tokens" / f"{name}.npz"), logprobs)
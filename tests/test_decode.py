@@ -0,0 +1,80 @@
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from conftest import MODEL, TEXT, assert_same_logprobs, run_with_mock
+
+from fingerprinting_llms.score.corpus import post_json_async
+from fingerprinting_llms.score.decode import (
+    decode_completions_batch,
+    decode_completions_data,
+    decode_completions_response,
+)
+from fingerprinting_llms.score.extract import (
+    COMPLETIONS_ROUTE,
+    EndpointPool,
+    build_completions_request,
+    extract_prompt_logprobs,
+    parse_completions_response,
+)
+
+
+def mock_response(text: str = TEXT, top_k: int = 1) -> dict:
+    """A /v1/completions response of the instant mock server."""
+
+    async def body(session, pool):
+        request = build_completions_request(model=MODEL, text=text, top_k=top_k)
+        return await post_json_async(session, pool, COMPLETIONS_ROUTE, request)
+
+    return run_with_mock(body)
+
+
+class ScriptedSession:
+    """A requests.Session stand-in that answers POSTs with the given bodies, in order."""
+
+    def __init__(self, *bodies: bytes):
+        self.bodies = list(bodies)
+
+    def post(self, url, json, timeout):
+        content = self.bodies.pop(0)
+        return SimpleNamespace(status_code=200, content=content, text=content.decode())
+
+
+def test_decode_matches_the_reference_parser():
+    data = mock_response()
+    expected = parse_completions_response(data)
+    assert_same_logprobs(decode_completions_data(data), expected)
+    assert_same_logprobs(decode_completions_response(json.dumps(data).encode()), expected)
+
+
+def test_decode_keeps_the_prompt_token_with_top_k():
+    data = mock_response(top_k=3)
+    logprobs = decode_completions_data(data, top_k=3)
+    np.testing.assert_array_equal(logprobs.token_ids, data["choices"][0]["prompt_token_ids"][1:])
+    assert logprobs.has_topk
+    assert (np.diff(logprobs.topk_offsets) <= 3).all()
+
+
+@pytest.mark.parametrize("data", [{}, {"choices": []}, {"choices": None}])
+def test_decode_rejects_responses_without_choices(data):
+    with pytest.raises(ValueError, match="no choices"):
+        decode_completions_data(data)
+    with pytest.raises(ValueError, match="no choices"):
+        decode_completions_batch(data)
+
+
+def test_decode_returns_none_for_error_responses():
+    data = {"object": "error", "message": "too long", "code": 400}
+    assert decode_completions_data(data) is None
+    assert decode_completions_batch(data) is None
+
+
+def test_extract_prompt_logprobs_retries_responses_without_choices():
+    data = mock_response()
+    session = ScriptedSession(b'{"choices": []}', json.dumps(data).encode())
+    pool = EndpointPool(["http://mock"], backoff_base=0.01)
+    logprobs = extract_prompt_logprobs(pool, MODEL, TEXT, session=session)
+    assert_same_logprobs(logprobs, parse_completions_response(data))
+    assert (pool.endpoints[0].failed, pool.endpoints[0].completed) == (1, 1)
+    assert not session.bodies
@@ -0,0 +1,86 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.encoding import (
+    Q16_STEP,
+    encode_logprobs,
+    encode_ranks,
+    read_column,
+    stored_encoding,
+)
+
+
+def decode(arrays: dict[str, np.ndarray], name: str) -> np.ndarray:
+    class Columns(dict):
+        files = property(lambda self: list(self))
+
+    return read_column(Columns(arrays), name)
+
+
+def test_float16_error_bounds():
+    values = -np.logspace(-12, 3, 100_001).astype(np.float32)
+    error = np.abs(decode(encode_logprobs("x", values, "float16"), "x") - values)
+    normal = np.abs(values) >= 2**-14
+    assert (error[normal] <= 2**-11 * np.abs(values[normal])).all()
+    assert (error[~normal] <= 2**-25).all()
+
+
+def test_q16_error_bound_and_escapes():
+    values = np.r_[-np.linspace(0, 63.9, 10_001), -64.5, -1e4, 0.5, np.nan, -np.inf]
+    values = values.astype(np.float32)
+    arrays = encode_logprobs("x", values, "q16")
+    assert arrays["x"].dtype == np.uint16
+    decoded = decode(arrays, "x")
+    assert np.abs(decoded[:10_001] - values[:10_001]).max() <= Q16_STEP / 2 + 1e-6
+    #   Out-of-range, positive and non-finite values are stored exactly
+    np.testing.assert_array_equal(decoded[10_001:], values[10_001:])
+
+
+def test_uint16_ranks_are_exact():
+    ranks = np.array([1, 2, 65_534, 65_535, 70_000, 2**31 - 1], dtype=np.int32)
+    arrays = encode_ranks("r", ranks, "uint16")
+    assert arrays["r"].dtype == np.uint16
+    np.testing.assert_array_equal(decode(arrays, "r"), ranks)
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+@pytest.mark.parametrize("logprobs_encoding", ["float16", "q16"])
+def test_save_load_with_16_bit_encodings(
+    tmp_path: Path, logprobs: LogProbs, lazy: bool, logprobs_encoding: str
+):
+    logprobs.save_npz(
+        tmp_path / "doc.npz",
+        compressed=False,
+        logprobs_encoding=logprobs_encoding,
+        ranks_encoding="uint16",
+    )
+    loaded = LogProbs.from_file(tmp_path / "doc.npz", lazy=lazy)
+    np.testing.assert_array_equal(loaded.token_ranks, logprobs.token_ranks)
+    np.testing.assert_allclose(loaded.token_probs, logprobs.token_probs, rtol=2**-11, atol=5e-4)
+    np.testing.assert_allclose(loaded.topk_logprobs, logprobs.topk_logprobs, rtol=2**-11, atol=5e-4)
+
+
+@pytest.mark.parametrize(
+    ("logprobs_encoding", "ranks_encoding"),
+    [("float32", "int32"), ("float16", "uint16"), ("q16", "int32")],
+)
+def test_stored_encoding_is_detected(
+    tmp_path: Path, logprobs: LogProbs, logprobs_encoding: str, ranks_encoding: str
+):
+    logprobs.save_npz(
+        tmp_path / "doc.npz", logprobs_encoding=logprobs_encoding, ranks_encoding=ranks_encoding
+    )
+    with np.load(tmp_path / "doc.npz") as z:
+        assert stored_encoding(z, "token_probs") == logprobs_encoding
+        assert stored_encoding(z, "topk_logprobs") == logprobs_encoding
+        assert stored_encoding(z, "token_ranks") == ranks_encoding
+
+
+def test_unknown_encodings_are_rejected():
+    with pytest.raises(ValueError, match="Unknown logprobs encoding"):
+        encode_logprobs("x", [-1.0], "bfloat16")
+    with pytest.raises(ValueError, match="Unknown ranks encoding"):
+        encode_ranks("r", [1], "uint8")
@@ -0,0 +1,166 @@
+import asyncio
+import time
+
+import pytest
+from conftest import MODEL, run_with_mock
+
+from fingerprinting_llms.score.corpus import post_json_async
+from fingerprinting_llms.score.extract import (
+    COMPLETIONS_ROUTE,
+    EndpointPool,
+    backoff_delay,
+    build_completions_request,
+    extract_prompt_logprobs,
+)
+from fingerprinting_llms.score.mock import PROFILES, get_profile
+
+BODY = build_completions_request(model=MODEL, text="Hello world")
+
+
+# -----------------------------------------------------------------------------
+# Concurrency limits
+# -----------------------------------------------------------------------------
+def test_successes_raise_the_limit_up_to_max_in_flight():
+    pool = EndpointPool(["a"], max_in_flight=4, initial_in_flight=1)
+    (endpoint,) = pool.endpoints
+    limits = []
+    for _ in range(20):
+        assert pool.acquire() is endpoint
+        pool.release(endpoint, latency=0.1, ok=True)
+        limits.append(endpoint.limit)
+    #   About one more request per round of `limit` requests
+    assert limits[:3] == [2.0, 2.5, 2.9]
+    assert limits == sorted(limits) and limits[-1] == 4.0
+
+
+def test_failures_halve_the_limit_once_per_latency():
+    pool = EndpointPool(["a"], max_in_flight=16, initial_in_flight=8, max_failures=10)
+    (endpoint,) = pool.endpoints
+    endpoint.latency_ewma = 60.0
+    pool.release(endpoint, latency=None, ok=False)
+    assert endpoint.limit == 4.0
+    #   A burst of failures within one observed latency counts once
+    pool.release(endpoint, latency=None, ok=False)
+    assert endpoint.limit == 4.0
+    endpoint.latency_ewma = 0.0
+    for _ in range(4):
+        pool.release(endpoint, latency=None, ok=False)
+    assert endpoint.limit == pool.min_in_flight
+    assert endpoint.failed == 6 and endpoint.consecutive_failures == 6
+
+
+def test_rising_latency_cuts_the_limit():
+    pool = EndpointPool(["a"], max_in_flight=16, initial_in_flight=8, ewma_alpha=1.0)
+    (endpoint,) = pool.endpoints
+    pool.release(endpoint, latency=0.01, ok=True)
+    limit = endpoint.limit
+    #   Requests are queueing: the latency is far above the baseline
+    pool.release(endpoint, latency=0.1, ok=True)
+    assert endpoint.limit == pytest.approx(0.9 * limit)
+    assert endpoint.latency_baseline < 0.02
+
+
+def test_fixed_concurrency_keeps_max_in_flight():
+    pool = EndpointPool(["a"], max_in_flight=8, adaptive=False)
+    (endpoint,) = pool.endpoints
+    pool.release(endpoint, latency=None, ok=False)
+    pool.release(endpoint, latency=0.1, ok=True)
+    assert endpoint.limit == 8.0
+    assert [pool.acquire() for _ in range(9)].count(endpoint) == 8
+
+
+def test_acquire_prefers_the_smallest_expected_wait():
+    pool = EndpointPool(["a", "b"], max_in_flight=4, initial_in_flight=4, slow_factor=100)
+    a, b = pool.endpoints
+    pool.release(a, latency=0.3, ok=True)
+    pool.release(b, latency=0.1, ok=True)
+    #   Expected waits: b 0.1, 0.2, 0.3, ... and a 0.3, 0.6, ...; ties go to the first endpoint
+    assert [pool.acquire().server for _ in range(4)] == ["b", "b", "a", "b"]
+
+
+def test_failing_endpoint_is_drained_and_readmitted():
+    pool = EndpointPool(["a", "b"], max_failures=2, drain_seconds=0.2)
+    a, b = pool.endpoints
+    for _ in range(2):
+        assert pool.acquire() is a
+        pool.release(a, latency=None, ok=False)
+    assert pool.available() == [b]
+    assert pool.acquire() is b
+    pool.release(b, latency=None, ok=False)
+    pool.release(b, latency=None, ok=False)
+    assert pool.acquire() is None
+    assert 0.0 < pool.seconds_until_available() <= 0.2
+    time.sleep(0.2)
+    assert pool.acquire() is a
+
+
+def test_backoff_delay_is_capped_exponential_with_jitter():
+    for attempt in range(8):
+        delays = [backoff_delay(attempt, base=0.5, cap=10.0) for _ in range(200)]
+        assert 0.0 <= min(delays) and max(delays) <= min(10.0, 0.5 * 2**attempt)
+
+
+# -----------------------------------------------------------------------------
+# Against the mock server
+# -----------------------------------------------------------------------------
+def test_slow_endpoint_is_drained():
+    slow = get_profile("instant", latency_ms=200.0)
+
+    async def body(session, pool):
+        await asyncio.gather(
+            *(post_json_async(session, pool, COMPLETIONS_ROUTE, BODY) for _ in range(2))
+        )
+        #   Everything after the slow answer goes to the fast server
+        for _ in range(5):
+            await post_json_async(session, pool, COMPLETIONS_ROUTE, BODY)
+        return pool
+
+    pool = run_with_mock(body, profiles=(slow, PROFILES["instant"]), initial_in_flight=1)
+    slow_endpoint, fast_endpoint = pool.endpoints
+    assert slow_endpoint.drained_until > time.monotonic()
+    assert (slow_endpoint.completed, fast_endpoint.completed) == (1, 6)
+
+
+def test_deadline_stops_waiting_for_drained_endpoints():
+    failing = get_profile("instant", error_rate=1.0)
+
+    async def body(session, pool):
+        start = time.monotonic()
+        with pytest.raises(ConnectionError, match="HTTP 500"):
+            await post_json_async(session, pool, COMPLETIONS_ROUTE, BODY, max_attempts=5)
+        return time.monotonic() - start, pool
+
+    elapsed, pool = run_with_mock(
+        body, profiles=(failing,), max_failures=1, drain_seconds=60, deadline=0.5
+    )
+    assert 0.5 <= elapsed < 2.0
+    assert pool.endpoints[0].failed == 1
+
+
+def test_flaky_server_is_retried_until_it_answers():
+    flaky = get_profile("flaky", error_rate=0.5, latency_ms=0.0, jitter=0.0)
+
+    async def body(session, pool):
+        return (
+            await asyncio.gather(
+                *(
+                    post_json_async(session, pool, COMPLETIONS_ROUTE, BODY, max_attempts=20)
+                    for _ in range(20)
+                )
+            ),
+            pool,
+        )
+
+    responses, pool = run_with_mock(body, profiles=(flaky,), max_failures=100, backoff_base=0.01)
+    assert all("choices" in response for response in responses)
+    assert pool.endpoints[0].completed == 20 and pool.endpoints[0].failed > 0
+
+
+def test_max_attempts_must_be_positive():
+    async def body(session, pool):
+        with pytest.raises(ValueError, match="max_attempts"):
+            await post_json_async(session, pool, COMPLETIONS_ROUTE, BODY, max_attempts=0)
+
+    run_with_mock(body)
+    with pytest.raises(ValueError, match="max_attempts"):
+        extract_prompt_logprobs("http://localhost:1", MODEL, "text", max_attempts=0)
@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from conftest import assert_same_logprobs
+
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.lazy import LazyLogProbs
+
+
+@pytest.mark.parametrize("compressed", [True, False])
+@pytest.mark.parametrize("lazy", [False, True])
+def test_save_load_roundtrip(tmp_path: Path, logprobs: LogProbs, compressed: bool, lazy: bool):
+    filepath = tmp_path / "a" / "doc.txt.npz"
+    logprobs.save_npz(filepath, compressed=compressed)
+    loaded = LogProbs.from_file(filepath, lazy=lazy)
+    assert isinstance(loaded, LazyLogProbs) == lazy
+    assert_same_logprobs(loaded, logprobs)
+    assert loaded.size == logprobs.size
+    #   No temporary files are left next to the output
+    assert [p.name for p in filepath.parent.iterdir()] == ["doc.txt.npz"]
+
+
+def test_lazy_loading_memory_maps_uncompressed_columns(tmp_path: Path, logprobs: LogProbs):
+    logprobs.save_npz(tmp_path / "doc.npz", compressed=False)
+    lazy = LogProbs.from_file(tmp_path / "doc.npz", lazy=True)
+    assert isinstance(lazy.token_probs, np.memmap)
+    np.testing.assert_array_equal(lazy.token_probs, logprobs.token_probs)
+
+
+@pytest.mark.parametrize("compressed", [True, False])
+def test_lazy_loading_reads_only_the_columns_used(
+    tmp_path: Path, logprobs: LogProbs, compressed: bool
+):
+    logprobs.save_npz(tmp_path / "doc.npz", compressed=compressed)
+    lazy = LogProbs.from_file(tmp_path / "doc.npz", lazy=True)
+    assert lazy.size == logprobs.size and lazy.has_topk
+    assert lazy.loaded == []
+    np.testing.assert_array_equal(lazy.token_ranks, logprobs.token_ranks)
+    assert lazy.loaded == ["token_ranks"]
+    assert lazy.full_context is None
+
+
+def test_lazy_loading_rejects_files_without_required_columns(tmp_path: Path):
+    np.savez(tmp_path / "doc.npz", token_ids=np.arange(3))
+    with pytest.raises(KeyError, match="Missing array"):
+        LogProbs.from_file(tmp_path / "doc.npz", lazy=True)
@@ -0,0 +1,38 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from fingerprinting_llms.io.atomic import atomic_write
+from fingerprinting_llms.score.manifest import STATUS_DONE, STATUS_FAILED, RunManifest, hash_text
+
+
+def test_manifest_last_record_wins_and_skips_truncated_lines(tmp_path: Path):
+    output_filepath = tmp_path / "doc.npz"
+    output_filepath.write_bytes(b"")
+    manifest = RunManifest(tmp_path / "manifest.jsonl")
+    args = ("doc.txt", str(output_filepath), hash_text("text"), "model")
+    manifest.record(*args, status=STATUS_FAILED)
+    manifest.record(*args, status=STATUS_DONE)
+    #   A run killed halfway through writing a record
+    with open(manifest.filepath, "a") as f:
+        f.write(json.dumps({"input_filepath": "other.txt"})[:20])
+
+    reloaded = RunManifest(manifest.filepath)
+    assert list(reloaded.entries) == ["doc.txt"]
+    assert reloaded.is_done(*args)
+    assert not reloaded.is_done(*args[:2], hash_text("changed"), "model")
+    assert reloaded.by_output(output_filepath) == reloaded.entries["doc.txt"]
+    output_filepath.unlink()
+    assert not reloaded.is_done(*args)
+
+
+def test_atomic_write_keeps_the_old_file_on_error(tmp_path: Path):
+    filepath = tmp_path / "sub" / "doc.txt"
+    with atomic_write(filepath, "w") as f:
+        f.write("old")
+    with pytest.raises(RuntimeError), atomic_write(filepath, "w") as f:
+        f.write("new")
+        raise RuntimeError
+    assert filepath.read_text() == "old"
+    assert [p.name for p in filepath.parent.iterdir()] == ["doc.txt"]
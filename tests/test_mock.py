@@ -0,0 +1,43 @@
+import numpy as np
+from conftest import MODEL, TEXT, assert_same_logprobs, run_with_mock
+
+from fingerprinting_llms.score.corpus import score_text_async
+from fingerprinting_llms.score.mock import MockTokenizer, get_profile
+
+
+def test_score_text_matches_mock_tokenizer():
+    async def body(session, pool):
+        return await score_text_async(session, pool, MODEL, TEXT)
+
+    logprobs = run_with_mock(body)
+    #   Every token but BOS gets a logprob
+    expected_ids = MockTokenizer(vocab_size=128_000).encode(TEXT)[1:]
+    assert logprobs.size == len(expected_ids)
+    np.testing.assert_array_equal(logprobs.token_ids, expected_ids)
+    assert "".join(logprobs.decoded_tokens.tolist()) == TEXT
+    assert (logprobs.token_ranks >= 1).all()
+    assert (logprobs.token_probs < 0).all()
+
+
+def test_score_text_is_deterministic_and_keeps_top_k():
+    async def body(session, pool):
+        first = await score_text_async(session, pool, MODEL, TEXT, top_k=3)
+        second = await score_text_async(session, pool, MODEL, TEXT, top_k=3)
+        return first, second
+
+    first, second = run_with_mock(body)
+    assert_same_logprobs(first, second)
+    assert first.has_topk
+    #   Candidates come in rank order, so the first of each position is the most likely
+    top1 = first.top1_logprobs()
+    assert (top1[np.isfinite(top1)] >= first.token_probs[np.isfinite(top1)]).all()
+
+
+def test_mock_rejects_prompts_longer_than_max_model_len():
+    async def body(session, pool):
+        short = await score_text_async(session, pool, MODEL, TEXT[:200])
+        long = await score_text_async(session, pool, MODEL, TEXT)
+        return short, long
+
+    short, long = run_with_mock(body, profiles=(get_profile("short-context", max_model_len=64),))
+    assert short is not None and long is None
@@ -0,0 +1,89 @@
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from fingerprinting_llms.features import registry
+from fingerprinting_llms.features.acf import acf_features
+from fingerprinting_llms.features.events import event_features
+from fingerprinting_llms.features.registry import FEATURE_SETS, FeatureGraph, compute_features
+from fingerprinting_llms.features.rolling import (
+    rolling_cv_features,
+    rolling_sign_change_features,
+)
+from fingerprinting_llms.features.spectral import spectral_features, windowed_spectral_features
+from fingerprinting_llms.features.wavelet import WAVELETS_TO_TRY, wavelet_features
+
+
+def corpus() -> list[np.ndarray]:
+    """Ragged float32 logprob series, with very short and constant documents."""
+    rng = np.random.default_rng(5)
+    lengths = [*rng.integers(0, 400, 40), 0, 1, 2, 3, 64, 128]
+    series = [-rng.exponential(2.0, n).astype(np.float32) for n in lengths]
+    return [s.astype(np.float64) for s in series] + [np.full(100, -1.5)]
+
+
+@pytest.fixture
+def evaluations(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Names of the intermediates computed, one entry per evaluation, outermost first."""
+    calls: list[str] = []
+    for name, intermediate in list(registry.INTERMEDIATES.items()):
+
+        def counted(graph, _name=name, _compute=intermediate.compute, **params):
+            calls.append(_name)
+            return _compute(graph, **params)
+
+        monkeypatch.setitem(registry.INTERMEDIATES, name, replace(intermediate, compute=counted))
+    return calls
+
+
+def test_compute_features_matches_the_standalone_functions(evaluations: list[str]):
+    series = corpus()
+    graph = FeatureGraph(series)
+    features = compute_features(graph, tuple(FEATURE_SETS))
+
+    expected = (
+        spectral_features(series)
+        | windowed_spectral_features(series)
+        | wavelet_features(series, workers=1)
+        | rolling_cv_features(series)
+        | rolling_sign_change_features(series)
+        | acf_features(series)
+        | event_features(series)
+    )
+    assert list(features) == list(expected)
+    for name, values in expected.items():
+        np.testing.assert_array_equal(features[name], values, err_msg=name)
+
+    #   Every intermediate is computed once, wavelet coefficients once per wavelet
+    assert sorted(evaluations) == sorted(
+        ["centered", "power_spectrum", "surprisal", "rolling_prefix", "acf"]
+        + ["wavelet_coefficients"] * len(WAVELETS_TO_TRY)
+    )
+    assert sorted(graph.timings) == sorted(
+        ["centered()", "power_spectrum()", "surprisal()", "rolling_prefix()"]
+        + ["acf(max_lag=64, method=auto)"]
+        + [
+            f"wavelet_coefficients(max_levels=5, mode=symmetric, wavelet={wavelet})"
+            for wavelet in WAVELETS_TO_TRY
+        ]
+    )
+
+
+def test_graph_reuses_intermediates_across_calls(evaluations: list[str]):
+    graph = FeatureGraph(corpus())
+    first = compute_features(graph, ("spectral", "acf"))
+    again = compute_features(graph, ("acf", "spectral"))
+    assert evaluations == ["power_spectrum", "centered", "acf"]
+    for name, values in first.items():
+        np.testing.assert_array_equal(again[name], values)
+    #   New parameters compute a new intermediate, from the cached inputs
+    compute_features(graph, ("acf",), params={"acf": {"max_lags": (16,), "summary_lags": ()}})
+    assert evaluations == ["power_spectrum", "centered", "acf", "acf"]
+
+
+def test_compute_features_rejects_unknown_feature_sets():
+    with pytest.raises(ValueError, match="Unknown feature sets"):
+        compute_features(corpus(), ("spectral", "nope"))
+    with pytest.raises(ValueError, match="Unknown feature sets"):
+        compute_features(corpus(), ("spectral",), params={"nope": {}})
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+from fingerprinting_llms.features.rolling import (
+    RollingPrefix,
+    rolling_cv_features,
+    rolling_sign_change_features,
+)
+
+
+# -----------------------------------------------------------------------------
+# Reference implementations from Burstiness-StatsDeepDive-v2, except that p75
+# is the 75th percentile (the notebook computed the 25th twice)
+# -----------------------------------------------------------------------------
+def rolling_windows(a: np.ndarray, window: int, step: int = 1) -> np.ndarray:
+    if window < 2 or a.size < window:
+        return np.empty((0, window), dtype=a.dtype)
+    n = 1 + (a.size - window) // step
+    strides = (a.strides[0] * step, a.strides[0])
+    return np.lib.stride_tricks.as_strided(a, shape=(n, window), strides=strides)
+
+
+def windowed_cv_features(x, window_sizes=(32, 64, 128), step_fraction=0.25) -> dict[str, float]:
+    feats: dict[str, float] = {}
+    x = np.asarray(x, dtype=np.float64)
+    for w in window_sizes:
+        rw = rolling_windows(x, w, step=max(1, int(w * step_fraction)))
+        names = [f"cv_local_{stat}_w{w}" for stat in ("mean", "p5", "p25", "p75")]
+        if rw.size == 0:
+            feats |= dict.fromkeys(names, np.nan)
+            continue
+        cv = rw.std(axis=1, ddof=1) / np.maximum(np.abs(rw.mean(axis=1)), 1e-8)
+        cv = cv[np.isfinite(cv)]
+        if cv.size == 0:
+            feats |= dict.fromkeys(names, np.nan)
+            continue
+        feats[names[0]] = float(np.nanmean(cv))
+        for name, q in zip(names[1:], (5, 25, 75), strict=True):
+            feats[name] = float(np.nanpercentile(cv, q))
+    return feats
+
+
+def sign_change_rate_1d(x: np.ndarray) -> float:
+    x = np.asarray(x, dtype=np.float64)
+    if x.size < 3:
+        return np.nan
+    s = np.sign(np.diff(x))
+    s = s[s != 0]
+    if s.size < 2:
+        return np.nan
+    return float(np.sum(s[1:] * s[:-1] < 0) / (s.size - 1))
+
+
+def windowed_sign_change_rate_features(
+    x, window_sizes=(4, 16, 64), step_fraction: float = 0.25
+) -> dict[str, float]:
+    feats: dict[str, float] = {}
+    x = np.asarray(x, dtype=np.float64)
+    for w in window_sizes:
+        rw = rolling_windows(x, w, step=max(1, int(w * step_fraction)))
+        rates = [rate for rate in map(sign_change_rate_1d, rw) if np.isfinite(rate)]
+        if not rates:
+            feats[f"scr_local_mean_w{w}"] = np.nan
+            feats[f"scr_local_std_w{w}"] = np.nan
+            continue
+        feats[f"scr_local_mean_w{w}"] = float(np.mean(rates))
+        feats[f"scr_local_std_w{w}"] = float(np.std(rates, ddof=1)) if len(rates) > 1 else np.nan
+    return feats
+
+
+# -----------------------------------------------------------------------------
+# Tests
+# -----------------------------------------------------------------------------
+def corpus() -> list[np.ndarray]:
+    """Ragged documents, some shorter than every window, some with constant stretches."""
+    rng = np.random.default_rng(2)
+    lengths = [*rng.integers(0, 700, 60), 0, 1, 2, 3, 4, 5, 16, 17]
+    #   Rounding leaves runs of equal values, i.e. zero diffs
+    series = [np.round(-rng.exponential(2.0, n), 1) for n in lengths]
+    constant_run = np.round(-rng.exponential(2.0, 500), 1)
+    constant_run[100:300] = -2.5
+    return series + [
+        np.zeros(40),
+        np.full(40, -3.0),
+        np.tile([1.0, 2.0, 2.0, 1.0], 10),
+        constant_run,
+    ]
+
+
+def assert_matches_reference(features: dict[str, np.ndarray], reference: list[dict[str, float]]):
+    assert set(features) == set(reference[0])
+    for name, values in features.items():
+        expected = np.array([r[name] for r in reference])
+        np.testing.assert_allclose(values, expected, rtol=1e-7, atol=1e-9, err_msg=name)
+
+
+def test_cv_features_match_the_notebook():
+    series = corpus()
+    window_sizes = (16, 32, 64, 128)
+    features = rolling_cv_features(series, window_sizes=window_sizes)
+    assert_matches_reference(
+        features, [windowed_cv_features(x, window_sizes=window_sizes) for x in series]
+    )
+    #   Constant windows have a CV of exactly 0
+    assert features["cv_local_p5_w16"][-4] == 0.0 and features["cv_local_p5_w16"][-3] == 0.0
+
+
+def test_sign_change_features_match_the_notebook():
+    series = corpus()
+    window_sizes = (4, 16, 64)
+    features = rolling_sign_change_features(series, window_sizes=window_sizes)
+    assert_matches_reference(
+        features,
+        [windowed_sign_change_rate_features(x, window_sizes=window_sizes) for x in series],
+    )
+
+
+@pytest.mark.parametrize("step_fraction", [0.25, 0.5, 1.0])
+def test_prefix_is_reusable_across_window_sizes(step_fraction: float):
+    series = corpus()
+    prefix = RollingPrefix.from_series(series)
+    assert len(prefix) == len(series)
+    for window in (8, 48):
+        np.testing.assert_array_equal(
+            rolling_cv_features(prefix, window_sizes=(window,), step_fraction=step_fraction)[
+                f"cv_local_mean_w{window}"
+            ],
+            rolling_cv_features(series, window_sizes=(window,), step_fraction=step_fraction)[
+                f"cv_local_mean_w{window}"
+            ],
+        )
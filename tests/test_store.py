@@ -0,0 +1,53 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from conftest import assert_same_logprobs, documents
+
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.manifest import RunManifest, hash_text
+from fingerprinting_llms.score.store import CorpusStore, pack_npz_tree, unpack_store
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_store_roundtrip(tmp_path: Path, logprobs: LogProbs, mmap: bool):
+    docs = documents(logprobs)
+    store = CorpusStore.from_logprobs(
+        [(f"doc{i}", doc) for i, doc in enumerate(docs)], attrs={"model": "mock"}
+    )
+    store.save(tmp_path / "store.npz")
+    loaded = CorpusStore.load(tmp_path / "store.npz", mmap=mmap)
+    assert len(loaded) == len(docs)
+    assert loaded.attrs["model"] == "mock"
+    np.testing.assert_array_equal(loaded.lengths(), [doc.size for doc in docs])
+    for i, doc in enumerate(docs):
+        assert_same_logprobs(loaded[f"doc{i}"], doc)
+    for series, doc in zip(loaded.split("token_probs"), docs, strict=True):
+        np.testing.assert_array_equal(series, doc.token_probs)
+
+
+def test_pack_and_unpack_tree(tmp_path: Path, logprobs: LogProbs):
+    root = tmp_path / "tokens"
+    docs = documents(logprobs)
+    manifest = RunManifest(root / "manifest.jsonl")
+    for i, doc in enumerate(docs):
+        output_filepath = root / "hc3" / f"doc{i}.txt.npz"
+        doc.save_npz(output_filepath)
+        manifest.record(
+            f"texts/doc{i}.txt", str(output_filepath), hash_text(str(i)), "mock", "done"
+        )
+
+    store = pack_npz_tree(root, tmp_path / "store.npz")
+    loaded = CorpusStore.load(tmp_path / "store.npz")
+    assert loaded.paths.tolist() == [f"hc3/doc{i}.txt.npz" for i in range(len(docs))]
+    assert [m["input_filepath"] for m in loaded.metadata] == [
+        f"texts/doc{i}.txt" for i in range(len(docs))
+    ]
+    assert json.loads(json.dumps(store.metadata)) == loaded.metadata
+
+    unpack_store(loaded, tmp_path / "unpacked")
+    for i, doc in enumerate(docs):
+        assert_same_logprobs(
+            LogProbs.from_file(tmp_path / "unpacked" / "hc3" / f"doc{i}.txt.npz"), doc
+        )
@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from conftest import assert_same_logprobs, documents
+
+from fingerprinting_llms.score import LogProbs
+from fingerprinting_llms.score.vocab import Vocabulary, intern_tree
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_vocabulary_roundtrip(tmp_path: Path, logprobs: LogProbs, lazy: bool):
+    #   The same id decoded differently in context, as with byte-fallback pieces
+    logprobs.decoded_tokens[10] = "�"
+    vocab = Vocabulary.from_logprobs([logprobs])
+    vocab.save(tmp_path)
+    logprobs.save_npz(tmp_path / "sub" / "doc.npz", vocab=vocab)
+    with np.load(tmp_path / "sub" / "doc.npz") as z:
+        assert "decoded_tokens" not in z.files
+        assert z["vocab_hash"].item() == vocab.fingerprint
+    #   The vocabulary is found in a parent directory
+    loaded = LogProbs.from_file(tmp_path / "sub" / "doc.npz", lazy=lazy)
+    assert_same_logprobs(loaded, logprobs)
+
+
+def test_intern_tree_rewrites_documents(tmp_path: Path, logprobs: LogProbs):
+    docs = documents(logprobs)
+    for i, doc in enumerate(docs):
+        doc.save_npz(tmp_path / f"d{i % 2}" / f"doc{i}.npz")
+    vocab = intern_tree(tmp_path)
+    assert [p.name for p in tmp_path.glob("vocab-*.npz")] == [vocab.filename]
+    for i, doc in enumerate(docs):
+        assert_same_logprobs(LogProbs.from_file(tmp_path / f"d{i % 2}" / f"doc{i}.npz"), doc)
+
+
+def test_intern_tree_keeps_each_documents_encodings(tmp_path: Path, logprobs: LogProbs):
+    docs = documents(logprobs)
+    encodings = [("float32", "int32"), ("float16", "uint16"), ("q16", "uint16")]
+    for doc, (logprobs_encoding, ranks_encoding) in zip(docs, encodings, strict=True):
+        doc.save_npz(
+            tmp_path / f"{logprobs_encoding}.npz",
+            logprobs_encoding=logprobs_encoding,
+            ranks_encoding=ranks_encoding,
+        )
+    before = {p.name: LogProbs.from_file(p) for p in tmp_path.glob("*.npz")}
+    stored = {p.name: np.load(p) for p in tmp_path.glob("*.npz")}
+    dtypes = {name: {column: z[column].dtype for column in z.files} for name, z in stored.items()}
+
+    intern_tree(tmp_path)
+    for name, expected in before.items():
+        assert_same_logprobs(LogProbs.from_file(tmp_path / name), expected)
+        with np.load(tmp_path / name) as z:
+            assert "decoded_tokens" not in z.files
+            #   Same columns, 16-bit steps and escapes, in the same dtypes
+            assert {column: z[column].dtype for column in z.files if column in dtypes[name]} == {
+                column: dtype
+                for column, dtype in dtypes[name].items()
+                if column != "decoded_tokens"
+            }
+
+
+def test_intern_tree_can_change_encodings(tmp_path: Path, logprobs: LogProbs):
+    logprobs.save_npz(tmp_path / "doc.npz", logprobs_encoding="float16")
+    intern_tree(tmp_path, logprobs_encoding="q16", ranks_encoding="uint16")
+    with np.load(tmp_path / "doc.npz") as z:
+        assert z["token_probs"].dtype == np.uint16 and "token_probs_step" in z.files
+        assert z["token_ranks"].dtype == np.uint16